@@ -1,16 +1,25 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from supabase import create_client, Client
+from typing import TYPE_CHECKING, Optional
+import asyncio
+import hmac
 import os
 from dotenv import load_dotenv
 
+from app.startup import timings
+from app.services.executors import auth_executor, ExecutorSaturatedError
+
+if TYPE_CHECKING:
+    from supabase import Client
+
 load_dotenv()
 
 security = HTTPBearer(auto_error=False)
 
-def get_supabase_client() -> Client:
+def get_supabase_client() -> "Client":
     """
     Create and return a Supabase client using environment variables.
+    The supabase SDK is imported on first call to keep it off the cold-start path.
     
     Returns:
         Client: Supabase client instance
@@ -26,12 +35,32 @@ def get_supabase_client() -> Client:
             "SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set in environment variables"
         )
     
+    if "import supabase" not in timings.timings:
+        with timings.measure("import supabase"):
+            import supabase  # noqa: F401 - the first import is the expensive one
+    from supabase import create_client
+    
     return create_client(url, key)
 
 
+_shared_client: Optional["Client"] = None
+
+def get_shared_supabase_client() -> "Client":
+    """
+    Process-wide Supabase client for stateless calls such as token verification.
+    Flows that store a session on the client (login, signup, refresh) should
+    keep using get_supabase_client() so sessions never leak between users.
+    """
+    global _shared_client
+    if _shared_client is None:
+        with timings.measure("supabase client init"):
+            _shared_client = get_supabase_client()
+    return _shared_client
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    supabase: Client = Depends(get_supabase_client)
+    supabase=Depends(get_shared_supabase_client)
 ) -> dict:
     """
     Validate Supabase JWT token and return user data.
@@ -56,8 +85,8 @@ async def get_current_user(
     token = credentials.credentials
     
     try:
-        # Verify token with Supabase
-        user_response = supabase.auth.get_user(token)
+        # Verify token with Supabase (a blocking HTTP call, run on the auth pool)
+        user_response = await auth_executor.run(supabase.auth.get_user, token)
         
         if not user_response or not user_response.user:
             raise HTTPException(
@@ -71,6 +100,11 @@ async def get_current_user(
             "created_at": str(user_response.user.created_at) if user_response.user.created_at else None
         }
         
+    except (asyncio.TimeoutError, ExecutorSaturatedError):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, please retry"
+        )
     except Exception as e:
         # Handle Supabase-specific errors
         error_message = str(e)
@@ -88,7 +122,7 @@ async def get_current_user(
 
 async def get_optional_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    supabase: Client = Depends(get_supabase_client)
+    supabase=Depends(get_shared_supabase_client)
 ) -> dict | None:
     """
     Optional authentication - returns None if not authenticated.
@@ -108,3 +142,16 @@ async def get_optional_user(
         return await get_current_user(credentials, supabase)
     except HTTPException:
         return None
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    Guard for operational endpoints (/admin/*).
+    Requires the X-Admin-Token header to match ADMIN_TOKEN; disabled when ADMIN_TOKEN is unset.
+    """
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected or not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin token required"
+        )
@@ -1,6 +1,11 @@
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+import atexit
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,22 +13,100 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 if not DATABASE_URL:
-    # Fallback to sqlite for ease of development if no URL provided yet, or just warn
-    # For now, we'll try to use the env var, and if missing, it might crash or we can default to a local sqlite
+    # No silent fallback: set DATABASE_URL to Postgres, or to sqlite+aiosqlite:///./leetcode.db
+    # for a single-node deployment (sqlite+aiosqlite:///:memory: for a throwaway test database)
     print("WARNING: DATABASE_URL not found in .env. Using defaults or failing.")
-    # Defaulting to sqlite for safety if they haven't set it up yet, so the app doesn't crash immediately
-    # DATABASE_URL = "sqlite+aiosqlite:///./sql_app.db" # Optional fallback
-    pass
 
 # Handle supabase weirdness with 'postgres://' vs 'postgresql://' if needed
-# Ensure we use an async driver (asyncpg)
-if DATABASE_URL:
-    if DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+asyncpg://", 1)
-    elif DATABASE_URL.startswith("postgresql://") and not "asyncpg" in DATABASE_URL:
-         DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+# Ensure we use an async driver (asyncpg / aiosqlite)
+def _async_url(url):
+    if url:
+        if url.startswith("postgres://"):
+            url = url.replace("postgres://", "postgresql+asyncpg://", 1)
+        elif url.startswith("postgresql://") and not "asyncpg" in url:
+            url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+        elif url.startswith("sqlite://"):
+            url = url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
 
-engine = create_async_engine(DATABASE_URL, echo=True) if DATABASE_URL else None
+DATABASE_URL = _async_url(DATABASE_URL)
+IS_SQLITE = bool(DATABASE_URL) and DATABASE_URL.startswith("sqlite")
+
+# Per-connection tuning for the embedded backend: WAL lets readers run alongside the
+# single writer, NORMAL sync is durable at checkpoints, busy_timeout queues writers
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),  # KiB when negative (64 MB)
+    "temp_store": "MEMORY",
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", "268435456"),
+}
+
+# Compiled SQL kept per engine (shared by all statements, incl. app/queries.py)
+QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "500"))
+# asyncpg prepares every statement; repeated SQL reuses the server-side parse and plan
+# from this per-connection LRU. Set 0 behind PgBouncer in transaction pooling mode.
+PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "256"))
+
+def _throwaway_sqlite_file():
+    fd, path = tempfile.mkstemp(prefix="leetcode-companion-", suffix=".db")
+    os.close(fd)
+
+    @atexit.register
+    def _remove():
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(path + suffix)
+            except OSError:
+                pass
+
+    return path
+
+def _create_engine(url, prepared_statement_cache_size=PREPARED_STATEMENT_CACHE_SIZE):
+    if not url.startswith("sqlite"):
+        return create_async_engine(url, echo=True, query_cache_size=QUERY_CACHE_SIZE, connect_args={
+            "prepared_statement_cache_size": prepared_statement_cache_size,  # SQLAlchemy's adapter
+            "statement_cache_size": prepared_statement_cache_size,  # asyncpg's own
+        })
+
+    if ":memory:" in url:
+        # Sessions need their own connections: on one shared in-memory connection,
+        # background sessions (outbox consumer, maintenance) would commit or roll back
+        # a request's transaction. A throwaway file still starts empty on every run.
+        url = url.replace(":memory:", _throwaway_sqlite_file())
+    sqlite_engine = create_async_engine(
+        url, echo=True, query_cache_size=QUERY_CACHE_SIZE, connect_args={"check_same_thread": False}
+    )
+
+    @event.listens_for(sqlite_engine.sync_engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+    return sqlite_engine
+
+engine = _create_engine(DATABASE_URL) if DATABASE_URL else None
+
+def dialect_insert(model):
+    """INSERT with on_conflict_do_update/do_nothing for the configured backend (Postgres or SQLite)."""
+    return sqlite_insert(model) if IS_SQLITE else pg_insert(model)
+
+# Optional read replica for read-only endpoints; without it reads use the primary
+REPLICA_DATABASE_URL = _async_url(os.getenv("REPLICA_DATABASE_URL"))
+replica_engine = _create_engine(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL else None
+
+# Statements slower than SLOW_QUERY_MS are aggregated (and sampled for EXPLAIN) at /admin/slow-queries
+from app.services.slow_queries import slow_query_log
+for _engine in (engine, replica_engine):
+    if _engine is not None:
+        slow_query_log.install(_engine)
+
+# Requests from a user who wrote within this window read from the primary (read-your-writes)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
 
 # Async Session Factory
 AsyncSessionLocal = sessionmaker(
@@ -34,8 +117,19 @@ AsyncSessionLocal = sessionmaker(
     autoflush=False
 )
 
+ReplicaSessionLocal = sessionmaker(
+    bind=replica_engine or engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False
+)
+
 Base = declarative_base()
 
+# Bump together with a new file in migrations/ whenever the schema changes
+SCHEMA_VERSION = 14
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
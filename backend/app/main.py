@@ -1,35 +1,101 @@
+from app.startup import timings, ensure_schema
+
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Request, Response, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, FileResponse
 from pydantic import BaseModel, EmailStr
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta, date, timezone
+import asyncio
+import csv
+import io
 import os
+import uuid
 
 # Import your local files
-from app.database import engine, Base, get_db
-from app.models import User, Problem, UserProblemProgress, ReviewSession, DailyStats
-from app.services.gemini_service import GeminiService
+from app.database import engine, replica_engine, Base, get_db, AsyncSessionLocal, ReplicaSessionLocal, READ_YOUR_WRITES_SECONDS
+from app.models import User, Problem, ProblemPattern, UserProblemProgress, ReviewSession, DailyStats
+from app import queries
+from app.services.gemini_service import get_gemini_service, usage_log, breaker as gemini_breaker, quota as gemini_quota
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.executors import EXECUTORS, auth_executor, cancel_on_disconnect, ExecutorSaturatedError, ClientDisconnectedError
+from app.services.analysis_fallback import fallback_analysis, similar_cached_problem
+from app.services.analysis_cache import store_analysis, is_stale, analysis_refresher
+from app.services.problem_identity import find_problem, get_or_create_problem
+from app.services.idempotency import idempotency, request_hash, REPLAYED_HEADER
+from app.services.search import search_problems, ensure_search_index
+from app.services.sync import changes_since
+from app.services.similarity_index import similarity_index, signature, rebuild as rebuild_similarity_index
 from app.services.spaced_repetition import SpacedRepetitionService
-from app.auth import get_current_user as get_authenticated_user, get_supabase_client
+from app.services.streaks import advance, current_streak, local_date, is_valid_timezone
+from app.services.history_import import HistoryImporter, iter_records, format_from_filename
+from app.services.history_export import stream_user_history
+from app.services.pattern_catalog import catalog_pattern_totals
+from app.services.problem_patterns import run_backfill as backfill_problem_patterns, AUTO_BACKFILL as PROBLEM_PATTERNS_AUTO_BACKFILL
+from app.services.session_rollups import user_review_totals, run_forever as run_session_maintenance, MAINTENANCE_INTERVAL_HOURS
+from app.services.profiler import ProfilingMiddleware, profile_store
+from app.services.slow_queries import RouteContextMiddleware, slow_query_log
+from app.services.outbox import outbox_consumer, enqueue as enqueue_outbox_event, SOLVE_RECORDED, OUTBOX_CONSUMER
+from app.auth import get_current_user as get_authenticated_user, get_supabase_client, require_admin
+
+timings.mark_since_boot("import app modules")
 
 # 1. Modern Lifespan Handler (Handles Startup/Shutdown)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # STARTUP: Create Tables
-    print("🚀 Connecting to Supabase and creating tables...")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    print("✅ Tables ready!")
+    # STARTUP: one schema-version query instead of create_all's per-table checks
+    print("🚀 Connecting to Supabase and checking schema...")
+    with timings.measure("schema check"):
+        outcome = await ensure_schema(engine, Base.metadata)
+    print(f"✅ Tables ready! ({outcome})")
+    
+    # Full-text search: tsvector columns on Postgres; FTS5 tables + triggers on SQLite
+    with timings.measure("search index"):
+        search_outcome = await ensure_search_index(engine)
+    print(f"🔎 Search ready ({search_outcome})")
+    
+    # Similarity index: memory-mapped, so loading is cheap; problems it is missing (a new index,
+    # or seeded by another process) are indexed in the background by one worker
+    with timings.measure("similarity index load"):
+        similarity_index.load()
+    if os.getenv("SIMILARITY_AUTO_REBUILD", "true").lower() == "true":
+        asyncio.create_task(rebuild_similarity_index(missing_only=True))
+    
+    # Pattern rows for problems analyzed before problem_patterns existed (no-op once filled)
+    if PROBLEM_PATTERNS_AUTO_BACKFILL:
+        asyncio.create_task(backfill_problem_patterns())
+    
+    # Review session partitions, monthly rollups and retention
+    maintenance_task = None
+    if MAINTENANCE_INTERVAL_HOURS > 0:
+        maintenance_task = asyncio.create_task(run_session_maintenance())
     
-    # Initialize Global Gemini Service
-    global gemini_service
-    gemini_service = GeminiService()
+    # Derived data for /solve (sessions, daily stats, streaks, pattern mastery)
+    outbox_task = None
+    if OUTBOX_CONSUMER == "inprocess":
+        outbox_task = asyncio.create_task(outbox_consumer.run_forever())
+    
+    # Re-analyze entries cached under an older model or prompt, most-tracked first
+    refresher_task = None
+    if analysis_refresher.daily_budget > 0:
+        refresher_task = asyncio.create_task(analysis_refresher.run_forever())
+    
+    # Gemini and Supabase SDKs are imported lazily on first use
+    timings.mark_since_boot("startup complete")
+    print(f"⏱️  Startup timings (ms): {timings.report()}")
     
     yield
     # SHUTDOWN
+    for task in (refresher_task, maintenance_task, outbox_task):
+        if task:
+            task.cancel()
+    for executor in EXECUTORS.values():
+        executor.shutdown()
     await engine.dispose()
+    if replica_engine:
+        await replica_engine.dispose()
 
 app = FastAPI(title="LeetCode Companion Backend", lifespan=lifespan)
 
@@ -68,8 +134,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id"],
 )
 
+# Opt-in request profiling (X-Profile header with the admin token, or PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware)
+# Tags slow-query log records with the route that issued them
+app.add_middleware(RouteContextMiddleware)
+
 
 # 3. Pydantic Models
 class ProblemInput(BaseModel):
@@ -84,6 +156,7 @@ class SolveInput(BaseModel):
     quality: int # 0-5
     url: str
     analysis: dict = None  # Optional: cached analysis data
+    timezone: str = None  # Optional: the browser's IANA zone (e.g. "America/New_York"), for streak days
 
 # Authentication Models
 class SignUpRequest(BaseModel):
@@ -112,11 +185,11 @@ async def get_current_user(user_data: dict = Depends(get_authenticated_user), db
     Get or create User record from authenticated JWT user data.
     This ensures the User exists in our database for storing problem progress.
     """
-    user_id = user_data["id"]
+    user_id = uuid.UUID(str(user_data["id"]))  # Supabase returns a string; Uuid columns bind UUIDs
     email = user_data["email"]
     
     # Try to find existing user
-    result = await db.execute(select(User).where(User.id == user_id))
+    result = await db.execute(queries.user_by_id(user_id))
     user = result.scalar_one_or_none()
     
     if not user:
@@ -134,6 +207,30 @@ async def get_current_user(user_data: dict = Depends(get_authenticated_user), db
     return user
 
 # 5. Endpoints
+
+def _wrote_recently(user: User) -> bool:
+    """True while the user's last write (users.updated_at, bumped by /solve and /import) may not have replicated yet."""
+    if not user.updated_at:
+        return False
+    updated_at = user.updated_at
+    if updated_at.tzinfo is not None:
+        updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return datetime.utcnow() - updated_at < timedelta(seconds=READ_YOUR_WRITES_SECONDS)
+
+async def get_read_db(response: Response, user: User = Depends(get_current_user)):
+    """
+    Session for read-only endpoints: the replica when REPLICA_DATABASE_URL is set,
+    except right after this user's own writes, which must be visible (read-your-writes).
+    """
+    if replica_engine is not None and not _wrote_recently(user):
+        session_factory, route = ReplicaSessionLocal, "replica"
+    else:
+        session_factory, route = AsyncSessionLocal, "primary"
+    response.headers["X-DB-Route"] = route
+    async with session_factory() as session:
+        yield session
+
+
 @app.get("/")
 @app.head("/")
 def read_root():
@@ -151,6 +248,66 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@app.get("/health/startup")
+async def startup_timings():
+    """Cold-start breakdown in ms, including lazily imported SDKs once they have loaded."""
+    return {"timings_ms": timings.report()}
+
+
+@app.get("/admin/gemini/usage", dependencies=[Depends(require_admin)])
+async def gemini_usage():
+    """Per-request Gemini input/output token counts and latency since boot."""
+    return {
+        **usage_log.summary(),
+        "breaker": gemini_breaker.snapshot(),
+        "quota": gemini_quota.snapshot(),
+        "refresher": analysis_refresher.snapshot(),
+    }
+
+
+@app.get("/admin/executors", dependencies=[Depends(require_admin)])
+async def executor_stats():
+    """Queue depth and outcomes of the thread pools used for blocking SDK calls."""
+    return {name: executor.snapshot() for name, executor in EXECUTORS.items()}
+
+
+@app.get("/admin/outbox", dependencies=[Depends(require_admin)])
+async def outbox_stats(db: AsyncSession = Depends(get_db)):
+    """Outbox backlog (pending, oldest pending age, dead events) and this worker's consumer counters."""
+    return {**await outbox_consumer.lag(db), "consumer": outbox_consumer.snapshot()}
+
+
+@app.get("/admin/idempotency", dependencies=[Depends(require_admin)])
+async def idempotency_stats():
+    """This worker's Idempotency-Key cache: replays served from memory vs the table, and racing attempts."""
+    return idempotency.stats()
+
+@app.get("/admin/slow-queries", dependencies=[Depends(require_admin)])
+async def slow_queries(limit: int = 50):
+    """Statements slower than SLOW_QUERY_MS by fingerprint: count/total/max, routes and sampled EXPLAIN plans."""
+    return slow_query_log.snapshot(limit)
+
+
+@app.delete("/admin/slow-queries", dependencies=[Depends(require_admin)])
+async def reset_slow_queries():
+    slow_query_log.reset()
+    return {"message": "Slow-query log cleared"}
+
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Saved request profiles, newest first: duration, on-CPU vs awaiting time and top functions."""
+    return {"profiles": await asyncio.to_thread(profile_store.list)}
+
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def download_profile(profile_id: str):
+    """One profile in speedscope format (open at https://www.speedscope.app)."""
+    path = profile_store.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=path.name)
+
 
 # ==========================================
 # AUTHENTICATION ENDPOINTS
@@ -162,7 +319,7 @@ async def signup(request: SignUpRequest):
     supabase = get_supabase_client()
     
     try:
-        response = supabase.auth.sign_up({
+        response = await auth_executor.run(supabase.auth.sign_up, {
             "email": request.email,
             "password": request.password
         })
@@ -188,6 +345,8 @@ async def signup(request: SignUpRequest):
             }
         )
         
+    except (asyncio.TimeoutError, ExecutorSaturatedError):
+        raise HTTPException(status_code=503, detail="Authentication service is busy, please retry")
     except Exception as e:
         error_message = str(e)
         if "already registered" in error_message.lower():
@@ -201,7 +360,7 @@ async def login(request: LoginRequest):
     supabase = get_supabase_client()
     
     try:
-        response = supabase.auth.sign_in_with_password({
+        response = await auth_executor.run(supabase.auth.sign_in_with_password, {
             "email": request.email,
             "password": request.password
         })
@@ -221,6 +380,8 @@ async def login(request: LoginRequest):
             }
         )
         
+    except (asyncio.TimeoutError, ExecutorSaturatedError):
+        raise HTTPException(status_code=503, detail="Authentication service is busy, please retry")
     except Exception as e:
         error_message = str(e)
         raise HTTPException(status_code=401, detail="Invalid email or password")
@@ -244,7 +405,7 @@ async def refresh_token(request: RefreshTokenRequest):
     supabase = get_supabase_client()
     
     try:
-        response = supabase.auth.refresh_session(request.refresh_token)
+        response = await auth_executor.run(supabase.auth.refresh_session, request.refresh_token)
         
         if not response.session:
             raise HTTPException(
@@ -257,6 +418,8 @@ async def refresh_token(request: RefreshTokenRequest):
             "refresh_token": response.session.refresh_token,
             "token_type": "bearer"
         }
+    except (asyncio.TimeoutError, ExecutorSaturatedError):
+        raise HTTPException(status_code=503, detail="Authentication service is busy, please retry")
     except Exception as e:
         raise HTTPException(status_code=401, detail="Could not refresh token")
 
@@ -267,7 +430,7 @@ async def forgot_password(request: ForgotPasswordRequest):
     supabase = get_supabase_client()
     
     try:
-        supabase.auth.reset_password_email(request.email)
+        await auth_executor.run(supabase.auth.reset_password_email, request.email)
         return {"message": "Password reset email sent. Please check your inbox."}
     except Exception as e:
         # Don't reveal if email exists for security
@@ -279,75 +442,135 @@ async def forgot_password(request: ForgotPasswordRequest):
 # ==========================================
 
 
+ANALYZE_DEADLINE_SECONDS = float(os.getenv("ANALYZE_DEADLINE_SECONDS", "30"))
+
+async def _idempotent_replay(db: AsyncSession, user_id: uuid.UUID, key: str, fingerprint: str, response: Response):
+    """The stored response for a retried Idempotency-Key, or None on its first attempt."""
+    stored = await idempotency.replay(db, user_id, key, fingerprint)
+    if stored is not None:
+        response.headers[REPLAYED_HEADER] = "true"
+    return stored
+
+async def _idempotent_commit(db: AsyncSession, user_id: uuid.UUID, key: str, fingerprint: str, body, response: Response):
+    """
+    Commit the request with its response stored under the key, or, when a
+    concurrent attempt with the same key committed first, discard this one's
+    writes and return that attempt's response instead.
+    """
+    if key and not await idempotency.record(db, user_id, key, fingerprint, body):
+        await db.rollback()
+        stored = await _idempotent_replay(db, user_id, key, fingerprint, response)
+        if stored is None:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        return stored
+    await db.commit()
+    if key:
+        idempotency.committed(user_id, key, fingerprint, body)
+    return body
+
 @app.post("/analyze")
 async def analyze_problem(
     input_data: ProblemInput,
+    request: Request,
+    response: Response,
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: str = Header(None)
 ):
-    if not gemini_service:
+    try:
+        gemini_service = get_gemini_service()
+    except ValueError:
         raise HTTPException(status_code=500, detail="Gemini Service not initialized")
     
+    # A retry of an analysis that already completed costs one lookup
+    fingerprint = None
+    if idempotency_key:
+        idempotency_key = idempotency.validate(idempotency_key)
+        fingerprint = request_hash("/analyze", input_data.model_dump())
+        stored = await _idempotent_replay(db, user.id, idempotency_key, fingerprint, response)
+        if stored is not None:
+            return stored
+    
     try:
-        # Check if problem exists and has cached analysis
-        result = await db.execute(select(Problem).where(Problem.title == input_data.title))
-        problem = result.scalar_one_or_none()
+        # Check if problem exists (by slug, not exact title) and has cached analysis
+        problem = await find_problem(db, input_data.title, input_data.url)
         
-        # Return cached analysis if available
+        # Return cached analysis if available; entries from an older model/prompt are
+        # still served, and re-analyzed in the background
         if problem and problem.cached_analysis:
+            if is_stale(problem):
+                analysis_refresher.schedule(problem.id)
             return problem.cached_analysis
         
-        # Get fresh analysis from Gemini
-        analysis = await gemini_service.analyze_problem(input_data.description)
+        # Near-duplicate (renamed or premium variant) that already has an analysis;
+        # its version tags are copied so a stale source gets refreshed later too
+        similar = await similar_cached_problem(
+            db, input_data.description, exclude=problem.id if problem else None
+        )
+        
+        if similar:
+            analysis = similar.cached_analysis
+            version = {"model": similar.analysis_model, "prompt": similar.analysis_prompt_hash}
+        else:
+            # Get fresh analysis from Gemini, bounded by an overall deadline (retries included)
+            # A client that gives up cancels the call, freeing its LLM pool slot if still queued
+            try:
+                analysis = await cancel_on_disconnect(request, asyncio.wait_for(
+                    gemini_service.analyze_problem(input_data.description),
+                    timeout=ANALYZE_DEADLINE_SECONDS
+                ))
+            except ClientDisconnectedError:
+                return Response(status_code=499)
+            except (CircuitOpenError, asyncio.TimeoutError, ExecutorSaturatedError):
+                # Provider incident: answer from what we have locally, and don't cache it
+                return await fallback_analysis(db, input_data.title, input_data.url, input_data.description)
+            version = {}
         
         # Cache the analysis in the problem record
-        if problem:
-            problem.cached_analysis = analysis
-            problem.patterns = analysis.get('patterns', [])
-            await db.commit()
-        else:
-            # Create problem with cached analysis
-            new_problem = Problem(
-                title=input_data.title,
-                difficulty=input_data.difficulty,
-                url=input_data.url,
-                description=input_data.description,
-                cached_analysis=analysis,
-                patterns=analysis.get('patterns', [])
+        if problem is None:
+            problem = await get_or_create_problem(
+                db, input_data.title, input_data.url, input_data.difficulty, input_data.description
             )
-            db.add(new_problem)
-            await db.commit()
+        await store_analysis(db, problem, analysis, **version)
+        if not problem.description:
+            problem.description = input_data.description
+        analysis = await _idempotent_commit(db, user.id, idempotency_key, fingerprint, analysis, response)
+        similarity_index.add(problem.id, problem.description)
         
         return analysis
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/solve")
 async def solve_problem(
     input_data: SolveInput, 
+    response: Response,
     user: User = Depends(get_current_user), 
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: str = Header(None)
 ):
-    # 1. Find or Create Problem
-    result = await db.execute(select(Problem).where(Problem.title == input_data.title))
-    problem = result.scalar_one_or_none()
-    
-    if not problem:
-        problem = Problem(
-            title=input_data.title,
-            difficulty=input_data.difficulty,
-            url=input_data.url
-            # analysis data could be passed here if we wanted to simplify
-        )
-        db.add(problem)
-        await db.flush() # flush to get ID
+    # A retried solve (same Idempotency-Key) gets the first attempt's response,
+    # instead of advancing SM-2 and the daily stats a second time
+    fingerprint = None
+    if idempotency_key:
+        idempotency_key = idempotency.validate(idempotency_key)
+        fingerprint = request_hash("/solve", input_data.model_dump())
+        stored = await _idempotent_replay(db, user.id, idempotency_key, fingerprint, response)
+        if stored is not None:
+            return stored
+    
+    # Opens this user's read-your-writes window (see get_read_db)
+    user.updated_at = datetime.utcnow()
+    if input_data.timezone and input_data.timezone != user.timezone and is_valid_timezone(input_data.timezone):
+        user.timezone = input_data.timezone
+    
+    # 1. Find or Create Problem (canonical slug from the URL, so title variants share a row)
+    problem = await get_or_create_problem(db, input_data.title, input_data.url, input_data.difficulty)
     
     # 2. Find or Create User Progress
-    result = await db.execute(
-        select(UserProblemProgress).where(
-            and_(UserProblemProgress.user_id == user.id, UserProblemProgress.problem_id == problem.id)
-        )
-    )
+    result = await db.execute(queries.progress_for(user.id, problem.id))
     progress = result.scalar_one_or_none()
     
     if not progress:
@@ -381,129 +604,134 @@ async def solve_problem(
     progress.last_reviewed_at = datetime.utcnow()
     progress.next_review_date = datetime.utcnow().date() + timedelta(days=new_interval)
     
-    if new_repetitions > 0:
-        progress.status = 'learning' if new_repetitions < 3 else 'reviewing'
-    if new_repetitions > 5:
-        progress.status = 'mastered'
+    progress.status = SpacedRepetitionService.status_for(new_repetitions, progress.status)
         
     progress.times_solved = (progress.times_solved or 0) + 1
     
-    # 5. Log Review Session
-    session = ReviewSession(
-        user_id=user.id,
-        problem_id=problem.id,
-        progress_id=progress.id,
-        quality_rating=input_data.quality,
-        solved_successfully=True if input_data.quality >= 3 else False,
-        ef_before=ef_before,
-        ef_after=new_ease,
-        interval_before=interval_before,
-        interval_after=new_interval,
-        session_date=datetime.utcnow().date()
-    )
-    db.add(session)
-    
-    # 6. Update Daily Stats
-    today = datetime.utcnow().date()
-    result = await db.execute(
-        select(DailyStats).where(
-            and_(DailyStats.user_id == user.id, DailyStats.date == today)
-        )
-    )
-    daily = result.scalar_one_or_none()
+    # 5. Everything derived from this solve (session log, daily stats, streak,
+    # pattern mastery) is applied by the outbox consumer, not on this request
+    await db.flush()  # assigns progress.id for a first solve
+    solved_at = progress.last_reviewed_at
+    solved_on = local_date(user.timezone, solved_at)
+    enqueue_outbox_event(db, user.id, SOLVE_RECORDED, {
+        "problem_id": str(problem.id),
+        "progress_id": str(progress.id),
+        "quality": input_data.quality,
+        "ef_before": ef_before,
+        "ef_after": new_ease,
+        "interval_before": interval_before,
+        "interval_after": new_interval,
+        "solved_at": solved_at.isoformat(),
+        "solved_on": solved_on.isoformat(),  # the user's day, for daily stats and streaks
+    })
     
-    if not daily:
-        daily = DailyStats(user_id=user.id, date=today, problems_solved=0, problems_reviewed=0)
-        db.add(daily)
+    # Counters update once the outbox event is applied; the streak is projected the same way
+    # the consumer will advance it, so the first solve of a day already counts
+    body = {
+        "message": "Progress saved!",
+        "next_review": progress.next_review_date.strftime("%Y-%m-%d"),
+        "interval_days": new_interval,
+        "streak": advance(user.streak_count or 0, user.longest_streak or 0, user.last_active_date, solved_on)[0]
+    }
+    body = await _idempotent_commit(db, user.id, idempotency_key, fingerprint, body, response)
+    outbox_consumer.wake()
     
-    daily.problems_solved += 1
-    # Check if this counts effectively as 'reviewed' (assuming solve = review for now)
-    daily.problems_reviewed += 1
+    return body
+
+@app.post("/import")
+async def import_history(
+    file: UploadFile = File(...),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Bulk import LeetCode submission history from a CSV or NDJSON export.
+    The upload is read line by line and applied in batches, replaying SM-2
+    for every accepted solve oldest first, so memory stays flat regardless of
+    file size. Imported solves count toward daily stats, the heatmap and the
+    streak like /solve does.
+    """
+    def report(stats):
+        print(f"📥 Import for {user.id}: batch {stats.batches}, {stats.rows_read} rows, {stats.reviews_applied} reviews")
+
+    importer = HistoryImporter(db, user.id, on_progress=report)
+    lines = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
     
-    # Update Streak (basic logic)
-    if daily.problems_solved == 1: # First solve of day
-        # Ideally check yesterday, but simplifying for now.
-        user.streak_count += 1
-        user.total_problems_solved += 1
+    try:
+        stats = await importer.run(iter_records(lines, format_from_filename(file.filename)))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail=f"Import stopped after {importer.stats.rows_read} rows: {e}"
+        )
     
+    # Opens this user's read-your-writes window (see get_read_db)
+    user.updated_at = datetime.utcnow()
     await db.commit()
     
+    return {"message": "Import complete", **stats.as_dict()}
+
+@app.get("/export")
+async def export_history(
+    gzip: bool = False,
+    user: User = Depends(get_current_user)
+):
+    """
+    Stream the user's progress, review sessions and daily stats as NDJSON.
+    Rows are read through server-side cursors, so the export starts
+    immediately and memory stays flat for any amount of history.
+    """
+    filename = f"leetcode-companion-{datetime.utcnow().strftime('%Y%m%d')}.ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}{".gz" if gzip else ""}"'}
+    
+    # The stream opens its own session: request dependencies are torn down
+    # before a StreamingResponse body is iterated
+    return StreamingResponse(
+        stream_user_history(user.id, compress=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers=headers
+    )
+
+def _due_item(problem: Problem, progress: UserProblemProgress) -> dict:
     return {
-        "message": "Progress saved!",
-        "next_review": progress.next_review_date.strftime("%Y-%m-%d"),
-        "interval_days": new_interval,
-        "streak": user.streak_count
+        "title": problem.title,
+        "difficulty": problem.difficulty,
+        "url": problem.url,
+        "next_review": progress.next_review_date,
+        "status": progress.status
     }
 
 @app.get("/today")
 async def get_due_problems(
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     today = datetime.utcnow().date()
     
-    query = (
-        select(Problem, UserProblemProgress)
-        .join(UserProblemProgress, Problem.id == UserProblemProgress.problem_id)
-        .where(
-            and_(
-                UserProblemProgress.user_id == user.id,
-                UserProblemProgress.next_review_date <= today,
-                UserProblemProgress.status.in_(['learning', 'reviewing'])
-            )
-        )
-    )
-    
-    result = await db.execute(query)
-    rows = result.all()
+    result = await db.execute(queries.due_problems(user.id, today))
     
     # Simplify response
-    due = []
-    for problem, progress in rows:
-        due.append({
-            "title": problem.title,
-            "difficulty": problem.difficulty,
-            "url": problem.url,
-            "next_review": progress.next_review_date,
-            "status": progress.status
-        })
+    due = [_due_item(problem, progress) for problem, progress in result.all()]
         
     return {"due_count": len(due), "problems": due}
 
 @app.get("/stats")
 async def get_stats(
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     today = datetime.utcnow().date()
     
-    # Count due today
-    due_query = select(func.count()).select_from(UserProblemProgress).where(
-        and_(
-            UserProblemProgress.user_id == user.id,
-            UserProblemProgress.next_review_date <= today,
-            UserProblemProgress.status.in_(['learning', 'reviewing'])
-        )
-    )
-    due_result = await db.execute(due_query)
-    due_count = due_result.scalar()
+    # Due today, tracked and mastered counts in one query
+    result = await db.execute(queries.progress_counts(user.id, today))
+    due_count, total_count, mastered_count = result.one()
     
     # Calculate Mastery (simplified: mastered / total)
-    total_query = select(func.count()).select_from(UserProblemProgress).where(UserProblemProgress.user_id == user.id)
-    mastered_query = select(func.count()).select_from(UserProblemProgress).where(
-        and_(UserProblemProgress.user_id == user.id, UserProblemProgress.status == 'mastered')
-    )
-    
-    total_res = await db.execute(total_query)
-    total_count = total_res.scalar()
-    
-    mastered_res = await db.execute(mastered_query)
-    mastered_count = mastered_res.scalar()
-    
     mastery_rate = (mastered_count / total_count * 100) if total_count > 0 else 0
     
     return {
-        "streak": user.streak_count,
+        "streak": current_streak(user),
         "total_solved": user.total_problems_solved,
         "due_today": due_count,
         "mastery_rate": round(mastery_rate, 1)
@@ -512,7 +740,7 @@ async def get_stats(
 @app.get("/heatmap")
 async def get_heatmap(
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     # Get last 365 days
     since = datetime.utcnow().date() - timedelta(days=365)
@@ -535,55 +763,33 @@ async def get_heatmap(
 @app.get("/patterns")
 async def get_patterns(
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get pattern mastery statistics for the user.
-    Analyzes all problems solved by the user and groups them by pattern.
+    Counts the user's tracked problems per pattern via problem_patterns.
     """
-    # Get all problems with progress for this user
     query = (
-        select(Problem, UserProblemProgress)
-        .join(UserProblemProgress, Problem.id == UserProblemProgress.problem_id)
+        select(ProblemPattern.pattern_name, func.count())
+        .join(UserProblemProgress, UserProblemProgress.problem_id == ProblemPattern.problem_id)
         .where(UserProblemProgress.user_id == user.id)
+        .group_by(ProblemPattern.pattern_name)
     )
     
     result = await db.execute(query)
-    rows = result.all()
     
     # Dictionary to track pattern statistics
-    pattern_stats = {}
+    pattern_stats = {name: {'solved': solved, 'total': 0} for name, solved in result.all()}
     
-    for problem, progress in rows:
-        # Extract patterns from cached_analysis or patterns field
-        patterns_list = []
-        
-        if problem.patterns and isinstance(problem.patterns, list):
-            # patterns field is a JSONB array of pattern objects
-            patterns_list = [p.get('name', p) if isinstance(p, dict) else p for p in problem.patterns]
-        elif problem.cached_analysis and isinstance(problem.cached_analysis, dict):
-            # Try to extract from cached_analysis
-            if 'patterns' in problem.cached_analysis:
-                patterns_data = problem.cached_analysis['patterns']
-                if isinstance(patterns_data, list):
-                    patterns_list = [p.get('name', p) if isinstance(p, dict) else p for p in patterns_data]
-        
-        # Count solved problems for each pattern
-        for pattern_name in patterns_list:
-            if pattern_name not in pattern_stats:
-                pattern_stats[pattern_name] = {
-                    'solved': 0,
-                    'total': 0
-                }
-            
-            pattern_stats[pattern_name]['solved'] += 1
-    
-    # Get total problems per pattern (including unsolved)
-    # For now, we'll use solved count as total (can be enhanced later with LeetCode API)
+    # Get total problems per pattern (including unsolved) from the seeded catalog
+    catalog_totals = await catalog_pattern_totals(db)
     for pattern_name in pattern_stats:
-        # In production, you'd query LeetCode's API or maintain a patterns database
-        # For MVP, we'll estimate total as solved * 4 (assuming user solved 25% of pattern problems)
-        pattern_stats[pattern_name]['total'] = max(pattern_stats[pattern_name]['solved'] * 4, pattern_stats[pattern_name]['solved'])
+        solved = pattern_stats[pattern_name]['solved']
+        if pattern_name in catalog_totals:
+            pattern_stats[pattern_name]['total'] = max(catalog_totals[pattern_name], solved)
+        else:
+            # Pattern not in the catalog yet: estimate (assuming user solved 25% of pattern problems)
+            pattern_stats[pattern_name]['total'] = solved * 4
     
     # Format response
     patterns = []
@@ -604,55 +810,177 @@ async def get_patterns(
     
     return {'patterns': patterns}
 
+def _problem_item(problem: Problem, progress: UserProblemProgress) -> dict:
+    # Display list in the analysis' order; filtering goes through problem_patterns
+    patterns_list = []
+    if problem.patterns and isinstance(problem.patterns, list):
+        patterns_list = [p.get('name', p) if isinstance(p, dict) else p for p in problem.patterns]
+    
+    return {
+        'id': str(problem.id),
+        'title': problem.title,
+        'difficulty': problem.difficulty,
+        'url': problem.url,
+        'status': progress.status,
+        'next_review': progress.next_review_date.strftime('%Y-%m-%d') if progress.next_review_date else None,
+        'patterns': patterns_list,
+        'times_solved': progress.times_solved,
+        'easiness_factor': progress.easiness_factor,
+        'last_reviewed': progress.last_reviewed_at.strftime('%Y-%m-%d') if progress.last_reviewed_at else None
+    }
+
 @app.get("/problems")
 async def get_problems(
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get all problems with user progress.
     Returns detailed information for the Problems tab.
     """
     # Query all problems with progress for this user
+    result = await db.execute(queries.user_problems(user.id))
+    problems = [_problem_item(problem, progress) for problem, progress in result.all()]
+    
+    return {
+        'problems': problems,
+        'total': len(problems)
+    }
+
+# :path because pattern names come from the model and can contain "/" ("Hash Map/Set")
+@app.get("/patterns/{pattern_name:path}/problems")
+async def get_pattern_problems(
+    pattern_name: str,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """The user's problems tagged with one pattern, in the /problems format."""
     query = (
         select(Problem, UserProblemProgress)
-        .join(UserProblemProgress, Problem.id == UserProblemProgress.problem_id)
-        .where(UserProblemProgress.user_id == user.id)
+        .join(ProblemPattern, ProblemPattern.problem_id == Problem.id)
+        .join(UserProblemProgress, UserProblemProgress.problem_id == Problem.id)
+        .where(
+            ProblemPattern.pattern_name == pattern_name,
+            UserProblemProgress.user_id == user.id
+        )
         .order_by(UserProblemProgress.last_reviewed_at.desc())
     )
     
     result = await db.execute(query)
-    rows = result.all()
-    
-    problems = []
-    for problem, progress in rows:
-        # Extract patterns
-        patterns_list = []
-        if problem.patterns and isinstance(problem.patterns, list):
-            patterns_list = [p.get('name', p) if isinstance(p, dict) else p for p in problem.patterns]
-        
-        problems.append({
-            'id': str(problem.id),
-            'title': problem.title,
-            'difficulty': problem.difficulty,
-            'url': problem.url,
-            'status': progress.status,
-            'next_review': progress.next_review_date.strftime('%Y-%m-%d') if progress.next_review_date else None,
-            'patterns': patterns_list,
-            'times_solved': progress.times_solved,
-            'easiness_factor': progress.easiness_factor,
-            'last_reviewed': progress.last_reviewed_at.strftime('%Y-%m-%d') if progress.last_reviewed_at else None
-        })
+    problems = [_problem_item(problem, progress) for problem, progress in result.all()]
     
     return {
+        'pattern': pattern_name,
         'problems': problems,
         'total': len(problems)
     }
 
+@app.get("/patterns/{pattern_name:path}/due")
+async def get_pattern_due_problems(
+    pattern_name: str,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Reviews due today for one pattern (e.g. due Sliding Window problems), in the /today format."""
+    today = datetime.utcnow().date()
+    
+    query = (
+        select(Problem, UserProblemProgress)
+        .join(ProblemPattern, ProblemPattern.problem_id == Problem.id)
+        .join(UserProblemProgress, UserProblemProgress.problem_id == Problem.id)
+        .where(
+            ProblemPattern.pattern_name == pattern_name,
+            UserProblemProgress.user_id == user.id,
+            UserProblemProgress.next_review_date <= today,
+            UserProblemProgress.status.in_(['learning', 'reviewing'])
+        )
+        .order_by(UserProblemProgress.next_review_date)
+    )
+    
+    result = await db.execute(query)
+    due = [_due_item(problem, progress) for problem, progress in result.all()]
+    
+    return {"pattern": pattern_name, "due_count": len(due), "problems": due}
+
+@app.get("/search")
+async def search(
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Full-text search over your problems: titles, key insights, descriptions
+    and your notes. Every word is a prefix match; results are ranked.
+    """
+    limit = max(1, min(limit, 50))
+    offset = max(0, offset)
+    return await search_problems(db, user.id, q, limit, offset)
+
+@app.get("/sync")
+async def sync(
+    since: str = None,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Changes to your progress, daily stats and tracked problems since a cursor,
+    with deletions as tombstones. Pass the returned cursor as ?since= next time;
+    without one (or when it has expired) the response is a full snapshot.
+    """
+    return await changes_since(db, user.id, since)
+
+@app.get("/problems/{problem_id}/similar")
+async def get_similar_problems(
+    problem_id: uuid.UUID,
+    limit: int = 5,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Problems with the most similar descriptions, from the local MinHash index.
+    No LLM call is involved.
+    """
+    limit = max(1, min(limit, 20))
+    sig = similarity_index.signature_for(problem_id)
+    
+    if sig is None:
+        # Not indexed yet (e.g. created by /solve): hash the description on the fly
+        result = await db.execute(select(Problem.description).where(Problem.id == problem_id))
+        description = result.scalar_one_or_none()
+        if not description:
+            raise HTTPException(status_code=404, detail="Problem not found or has no description")
+        sig = signature(description)
+    
+    matches = similarity_index.query(sig=sig, limit=limit, exclude=problem_id)
+    if not matches:
+        return {'problem_id': str(problem_id), 'similar': []}
+    
+    result = await db.execute(
+        select(Problem.id, Problem.title, Problem.difficulty, Problem.url)
+        .where(Problem.id.in_([match_id for match_id, _ in matches]))
+    )
+    problems = {row.id: row for row in result.all()}
+    
+    similar = []
+    for match_id, score in matches:
+        row = problems.get(match_id)
+        if row:
+            similar.append({
+                'id': str(row.id),
+                'title': row.title,
+                'difficulty': row.difficulty,
+                'url': row.url,
+                'similarity': score
+            })
+    
+    return {'problem_id': str(problem_id), 'similar': similar}
+
 @app.get("/stats/detailed")
 async def get_detailed_stats(
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get detailed statistics including weekly activity and difficulty breakdown.
@@ -676,12 +1004,9 @@ async def get_detailed_stats(
     
     mastery_percentage = round((mastered / total_problems * 100), 1) if total_problems > 0 else 0
     
-    # Total review sessions
-    reviews_query = select(func.count()).select_from(ReviewSession).where(
-        ReviewSession.user_id == user.id
-    )
-    reviews_result = await db.execute(reviews_query)
-    total_reviews = reviews_result.scalar()
+    # Total review sessions: monthly rollups plus raw sessions since the last rolled-up month
+    review_totals = await user_review_totals(db, user.id)
+    total_reviews = review_totals['total_reviews']
     
     # Weekly activity (last 7 days)
     today = datetime.utcnow().date()
@@ -745,9 +1070,10 @@ async def get_detailed_stats(
         'total_problems': total_problems,
         'mastered': mastered,
         'mastery_percentage': mastery_percentage,
-        'current_streak': user.streak_count,
+        'current_streak': current_streak(user),
         'longest_streak': user.longest_streak,
         'total_reviews': total_reviews,
         'weekly_activity': weekly_activity,
-        'by_difficulty': by_difficulty
+        'by_difficulty': by_difficulty,
+        'monthly_reviews': review_totals['monthly']
     }
@@ -1,14 +1,35 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, Boolean, Text, JSON
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Date, ForeignKey, Boolean, Text, JSON, UniqueConstraint, Index, Uuid
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import text
 from .database import Base
 from datetime import datetime
 import uuid
 
+# Portable column types: native UUID/JSONB on Postgres, CHAR(32)/JSON text on SQLite
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+class SchemaVersion(Base):
+    """One row per applied schema version; checked once at startup instead of create_all."""
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+class QuotaBucket(Base):
+    """Shared provider rate-limit window, row-locked by every API worker (see services/quota.py)."""
+    __tablename__ = "quota_buckets"
+
+    name = Column(String, primary_key=True)
+    window_start = Column(Float, nullable=False, default=0.0) # epoch seconds
+    requests = Column(Integer, nullable=False, default=0)
+    tokens = Column(Integer, nullable=False, default=0)
+    last_request_at = Column(Float, nullable=False, default=0.0) # epoch seconds
+
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
     email = Column(String, unique=True, nullable=False)
     username = Column(String)
     avatar_url = Column(Text)
@@ -18,6 +39,7 @@ class User(Base):
     daily_goal = Column(Integer, default=5)
     streak_count = Column(Integer, default=0)
     longest_streak = Column(Integer, default=0)
+    last_active_date = Column(Date) # Last day (in timezone) counted toward the streak
     total_problems_solved = Column(Integer, default=0)
     
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -32,7 +54,7 @@ class User(Base):
 class Problem(Base):
     __tablename__ = "problems"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
     leetcode_id = Column(Integer, unique=True, nullable=True)
     title = Column(String, unique=True, index=True, nullable=False)
     slug = Column(String, unique=True, index=True)
@@ -41,15 +63,18 @@ class Problem(Base):
     url = Column(Text)
     
     # AI Analysis (Cached)
-    cached_analysis = Column(JSONB) # Full raw response
-    patterns = Column(JSONB, default=[]) # List of identified patterns
-    complexity_analysis = Column(JSONB, default={})
-    key_insights = Column(JSONB, default=[])
-    similar_problems = Column(JSONB, default=[])
+    cached_analysis = Column(JSONType) # Full raw response
+    patterns = Column(JSONType, default=[]) # List of identified patterns
+    complexity_analysis = Column(JSONType, default={})
+    key_insights = Column(JSONType, default=[])
+    similar_problems = Column(JSONType, default=[])
+    analysis_model = Column(String) # Gemini model that produced cached_analysis
+    analysis_prompt_hash = Column(String) # Hash of the prompt template used
+    analyzed_at = Column(DateTime)
     
     # Metadata
-    topics = Column(JSONB, default=[])
-    companies = Column(JSONB, default=[])
+    topics = Column(JSONType, default=[])
+    companies = Column(JSONType, default=[])
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -58,12 +83,25 @@ class Problem(Base):
     user_progress = relationship("UserProblemProgress", back_populates="problem")
     review_sessions = relationship("ReviewSession", back_populates="problem")
 
+class ProblemPattern(Base):
+    """One row per pattern in Problem.patterns, kept in sync by services/problem_patterns.py."""
+    __tablename__ = "problem_patterns"
+    __table_args__ = (Index("idx_problem_patterns_pattern", "pattern_name", "problem_id"),)
+
+    problem_id = Column(Uuid, ForeignKey("problems.id", ondelete="CASCADE"), primary_key=True)
+    pattern_name = Column(String, primary_key=True)
+    confidence = Column(Float) # Gemini's 0-1 score; NULL for plain-string tags
+
 class UserProblemProgress(Base):
     __tablename__ = "user_problem_progress"
+    __table_args__ = (
+        UniqueConstraint("user_id", "problem_id"),
+        Index("idx_user_progress_updated", "user_id", "updated_at"), # /sync deltas
+    )
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
-    problem_id = Column(UUID(as_uuid=True), ForeignKey("problems.id"))
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    user_id = Column(Uuid, ForeignKey("users.id"))
+    problem_id = Column(Uuid, ForeignKey("problems.id"))
     
     # SM-2 Algorithm Fields
     easiness_factor = Column(Float, default=2.5)
@@ -86,7 +124,7 @@ class UserProblemProgress(Base):
     
     # Notes
     personal_notes = Column(Text)
-    code_snippets = Column(JSONB, default=[])
+    code_snippets = Column(JSONType, default=[])
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -99,10 +137,10 @@ class UserProblemProgress(Base):
 class ReviewSession(Base):
     __tablename__ = "review_sessions"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
-    problem_id = Column(UUID(as_uuid=True), ForeignKey("problems.id"))
-    progress_id = Column(UUID(as_uuid=True), ForeignKey("user_problem_progress.id"))
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    user_id = Column(Uuid, ForeignKey("users.id"))
+    problem_id = Column(Uuid, ForeignKey("problems.id"))
+    progress_id = Column(Uuid, ForeignKey("user_problem_progress.id"))
     
     quality_rating = Column(Integer) # 0-5
     time_spent_minutes = Column(Integer)
@@ -114,7 +152,8 @@ class ReviewSession(Base):
     interval_before = Column(Integer)
     interval_after = Column(Integer)
     
-    session_date = Column(Date, default=datetime.utcnow().date)
+    # Partition key on Postgres (monthly range partitions, see services/session_rollups.py)
+    session_date = Column(Date, nullable=False, default=lambda: datetime.utcnow().date())
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
@@ -122,27 +161,56 @@ class ReviewSession(Base):
     problem = relationship("Problem", back_populates="review_sessions")
     progress = relationship("UserProblemProgress", back_populates="sessions")
 
+class ReviewSessionRollup(Base):
+    """Per-user monthly summary of review_sessions; analytics read these instead of raw rows."""
+    __tablename__ = "review_session_rollups"
+
+    user_id = Column(Uuid, ForeignKey("users.id"), primary_key=True)
+    month = Column(Date, primary_key=True) # First day of the month
+    
+    reviews = Column(Integer, nullable=False, default=0)
+    successful_reviews = Column(Integer, nullable=False, default=0)
+    problems_reviewed = Column(Integer, nullable=False, default=0)
+    average_quality = Column(Float)
+    ef_drift = Column(Float, nullable=False, default=0.0) # Sum of ef_after - ef_before
+    
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+class ReviewSessionDirtyMonth(Base):
+    """A closed month that received review_sessions (e.g. backdated by /import); the next rollup run redoes it."""
+    __tablename__ = "review_session_dirty_months"
+
+    month = Column(Date, primary_key=True) # First day of the month
+    generation = Column(Integer, nullable=False, default=1) # Bumped on every mark; a run clears only what it saw
+    marked_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 class DailyStats(Base):
     __tablename__ = "daily_stats"
+    __table_args__ = (
+        UniqueConstraint("user_id", "date", name="daily_stats_user_id_date_key"),
+        Index("idx_daily_stats_updated", "user_id", "updated_at"), # /sync deltas
+    )
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    user_id = Column(Uuid, ForeignKey("users.id"))
     date = Column(Date, nullable=False)
     
     problems_solved = Column(Integer, default=0)
     problems_reviewed = Column(Integer, default=0)
     total_time_minutes = Column(Integer, default=0)
-    patterns_practiced = Column(JSONB, default=[])
+    patterns_practiced = Column(JSONType, default=[])
     
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = relationship("User", back_populates="daily_stats")
 
 class PatternMastery(Base):
     __tablename__ = "pattern_mastery"
+    __table_args__ = (UniqueConstraint("user_id", "pattern_name", name="pattern_mastery_user_id_pattern_name_key"),)
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    user_id = Column(Uuid, ForeignKey("users.id"))
     
     pattern_name = Column(String, nullable=False)
     problems_solved = Column(Integer, default=0)
@@ -154,3 +222,57 @@ class PatternMastery(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = relationship("User", back_populates="pattern_mastery")
+
+class OutboxEvent(Base):
+    """Event committed with a write; a consumer applies its derived updates later (see services/outbox.py)."""
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        Index("idx_outbox_events_pending", "user_id", "id", postgresql_where=text("processed_at IS NULL")),
+    )
+
+    # Monotonic id: events are applied in id order per user
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id = Column(Uuid, ForeignKey("users.id"), nullable=False)
+    event_type = Column(String, nullable=False)
+    payload = Column(JSONType, nullable=False)
+    
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = Column(DateTime)
+
+class SyncTombstone(Base):
+    """A row deleted from a user's /sync replica; served to clients whose cursor predates it (see services/sync.py)."""
+    __tablename__ = "sync_tombstones"
+    __table_args__ = (Index("idx_sync_tombstones_user", "user_id", "deleted_at"),)
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id = Column(Uuid, ForeignKey("users.id"), nullable=False)
+    entity = Column(String, nullable=False) # problem, progress or daily_stats
+    entity_id = Column(String, nullable=False) # The deleted row's id (a date for daily_stats)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class IdempotencyKey(Base):
+    """Stored response for a client's Idempotency-Key, replayed to retries (see services/idempotency.py)."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (Index("idx_idempotency_keys_expires", "expires_at"),)
+
+    user_id = Column(Uuid, ForeignKey("users.id"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False) # sha256 of endpoint + body; a reused key must match
+    response = Column(JSONType, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+class DueDigest(Base):
+    """One user's due reviews on a day, written by the nightly batch job (see services/due_digest.py)."""
+    __tablename__ = "due_digests"
+    __table_args__ = (Index("idx_due_digests_date", "digest_date"),)
+
+    user_id = Column(Uuid, ForeignKey("users.id"), primary_key=True)
+    digest_date = Column(Date, primary_key=True)
+    due_count = Column(Integer, nullable=False) # Due on or before digest_date
+    overdue_count = Column(Integer, nullable=False) # Due before digest_date
+    top_overdue = Column(JSONType, nullable=False, default=[]) # Most overdue first
+    computed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
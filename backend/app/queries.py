@@ -0,0 +1,75 @@
+"""
+Cached statements for the hot endpoints.
+
+Building a select() on every request costs Python time before SQLAlchemy
+even looks at its compiled cache: the construct is assembled, then walked
+to compute its cache key. These lambda statements are built once per call
+site: SQLAlchemy keys the cache on the lambda's code and turns the closure
+variables (user id, today's date, ...) into bound parameters, so a request
+only supplies values.
+
+The compiled SQL text is identical on every call, which is what lets
+asyncpg reuse its prepared statement (parse + plan) from the per-connection
+cache sized by DB_PREPARED_STATEMENT_CACHE_SIZE (see app/database.py).
+
+Compare the before/after cost with:
+    python benchmark_queries.py
+"""
+import uuid
+from datetime import date
+
+from sqlalchemy import select, func, case, lambda_stmt
+from sqlalchemy.sql.lambdas import StatementLambdaElement
+
+from app.models import User, Problem, UserProblemProgress
+
+
+def user_by_id(user_id: uuid.UUID) -> StatementLambdaElement:
+    """get_current_user, on every authenticated request."""
+    return lambda_stmt(lambda: select(User).where(User.id == user_id))
+
+
+def due_problems(user_id: uuid.UUID, today: date) -> StatementLambdaElement:
+    """/today: (Problem, UserProblemProgress) rows due for review."""
+    return lambda_stmt(lambda: (
+        select(Problem, UserProblemProgress)
+        .join(UserProblemProgress, Problem.id == UserProblemProgress.problem_id)
+        .where(
+            UserProblemProgress.user_id == user_id,
+            UserProblemProgress.next_review_date <= today,
+            UserProblemProgress.status.in_(['learning', 'reviewing'])
+        )
+    ))
+
+
+def progress_counts(user_id: uuid.UUID, today: date) -> StatementLambdaElement:
+    """/stats: (due today, tracked, mastered) in one round trip."""
+    return lambda_stmt(lambda: (
+        select(
+            func.coalesce(func.sum(case((
+                (UserProblemProgress.next_review_date <= today)
+                & UserProblemProgress.status.in_(['learning', 'reviewing']), 1
+            ), else_=0)), 0),
+            func.count(),
+            func.coalesce(func.sum(case((UserProblemProgress.status == 'mastered', 1), else_=0)), 0),
+        )
+        .where(UserProblemProgress.user_id == user_id)
+    ))
+
+
+def user_problems(user_id: uuid.UUID) -> StatementLambdaElement:
+    """/problems: every tracked problem, most recently reviewed first."""
+    return lambda_stmt(lambda: (
+        select(Problem, UserProblemProgress)
+        .join(UserProblemProgress, Problem.id == UserProblemProgress.problem_id)
+        .where(UserProblemProgress.user_id == user_id)
+        .order_by(UserProblemProgress.last_reviewed_at.desc())
+    ))
+
+
+def progress_for(user_id: uuid.UUID, problem_id: uuid.UUID) -> StatementLambdaElement:
+    """/solve: the user's progress row for one problem."""
+    return lambda_stmt(lambda: (
+        select(UserProblemProgress)
+        .where(UserProblemProgress.user_id == user_id, UserProblemProgress.problem_id == problem_id)
+    ))
@@ -0,0 +1,271 @@
+"""
+Versioned analysis cache.
+
+Every cached analysis is tagged with the Gemini model and a hash of the
+prompt template that produced it. Reads serve whatever is cached right away
+(stale-while-revalidate) and queue outdated entries for a background refresh;
+a throttled refresher also walks outdated problems in popularity order within
+a daily budget, so a model or prompt change rolls out without deleting rows.
+
+A problem whose refresh fails is skipped for ANALYSIS_REFRESH_BACKOFF_SECONDS,
+doubling per consecutive failure, so one bad problem cannot spend the budget
+pass after pass. While the Gemini circuit is open nothing is attempted, and a
+call the breaker rejects gives its budget back.
+
+The daily budget is shared by every API worker: it is counted in one
+`quota_buckets` row (see services/quota.py), reserved with a single
+conditional UPDATE that also starts a new count at UTC midnight. If the
+database cannot be reached, a worker falls back to counting on its own.
+"""
+import asyncio
+import calendar
+import hashlib
+import os
+import time
+import uuid
+from datetime import datetime, date
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sqlalchemy import select, update, func, or_, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import dialect_insert
+from app.models import Problem, QuotaBucket, UserProblemProgress
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.gemini_service import GEMINI_MODEL, PROMPT_TEMPLATE, breaker, get_gemini_service
+from app.services.problem_patterns import sync_problem_patterns
+
+REFRESH_DAILY_BUDGET = int(os.getenv("ANALYSIS_REFRESH_DAILY_BUDGET", "200"))
+REFRESH_INTERVAL_SECONDS = float(os.getenv("ANALYSIS_REFRESH_INTERVAL_SECONDS", "30"))
+REFRESH_BACKOFF_SECONDS = float(os.getenv("ANALYSIS_REFRESH_BACKOFF_SECONDS", "3600"))
+MAX_BACKOFF_SECONDS = 7 * 24 * 3600
+BUDGET_BUCKET = "analysis_refresh"
+
+
+PROMPT_HASH = hashlib.sha256(PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+
+
+def is_stale(problem: Problem) -> bool:
+    return problem.analysis_model != GEMINI_MODEL or problem.analysis_prompt_hash != PROMPT_HASH
+
+
+def outdated_condition():
+    return or_(
+        Problem.analysis_model.is_distinct_from(GEMINI_MODEL),
+        Problem.analysis_prompt_hash.is_distinct_from(PROMPT_HASH),
+    )
+
+
+async def store_analysis(
+    db: AsyncSession,
+    problem: Problem,
+    analysis: Dict[str, Any],
+    model: Optional[str] = GEMINI_MODEL,
+    prompt: Optional[str] = PROMPT_HASH,
+):
+    """Write an analysis and its version tags onto a problem, and re-sync its pattern rows (caller commits)."""
+    problem.cached_analysis = analysis
+    problem.patterns = analysis.get("patterns", [])
+    problem.analysis_model = model
+    problem.analysis_prompt_hash = prompt
+    problem.analyzed_at = datetime.utcnow()
+    await sync_problem_patterns(db, problem)
+
+
+class AnalysisRefresher:
+    """Re-analyzes outdated problems: on demand (SWR) and by a budgeted background sweep."""
+
+    def __init__(self, daily_budget: int = REFRESH_DAILY_BUDGET, interval: float = REFRESH_INTERVAL_SECONDS):
+        self.daily_budget = daily_budget
+        self.interval = interval
+        self.in_flight: Set[uuid.UUID] = set()
+        self.tasks: Set[asyncio.Task] = set()
+        self.budget_day: date = datetime.utcnow().date()
+        self.used_today = 0  # spent by this worker
+        self.refreshed = 0
+        self.failed = 0
+        self.db_errors = 0
+        self.cooldowns: Dict[uuid.UUID, Tuple[int, float]] = {}  # id -> (consecutive failures, retry after)
+
+    async def _reserve_shared(self, day: date) -> bool:
+        """Count one refresh in the shared bucket unless today's budget is spent."""
+        from app.database import AsyncSessionLocal
+
+        day_start = float(calendar.timegm(day.timetuple()))
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                dialect_insert(QuotaBucket)
+                .values(name=BUDGET_BUCKET, window_start=0.0, requests=0, tokens=0, last_request_at=0.0)
+                .on_conflict_do_nothing()
+            )
+            # One statement, so concurrent workers cannot both take the last unit
+            result = await db.execute(
+                update(QuotaBucket)
+                .where(
+                    QuotaBucket.name == BUDGET_BUCKET,
+                    or_(QuotaBucket.window_start != day_start, QuotaBucket.requests < self.daily_budget),
+                )
+                .values(
+                    requests=case((QuotaBucket.window_start == day_start, QuotaBucket.requests + 1), else_=1),
+                    window_start=day_start,
+                    last_request_at=time.time(),
+                )
+            )
+            await db.commit()
+            return result.rowcount == 1
+
+    async def _take_budget(self) -> bool:
+        today = datetime.utcnow().date()
+        if today != self.budget_day:
+            self.budget_day, self.used_today = today, 0
+        if self.daily_budget <= 0:
+            return False
+        try:
+            taken = await self._reserve_shared(today)
+        except Exception as e:
+            self.db_errors += 1
+            print(f"⚠️  Shared refresh budget unavailable ({e}); counting this worker only")
+            taken = self.used_today < self.daily_budget
+        if taken:
+            self.used_today += 1
+        return taken
+
+    async def _return_budget(self):
+        from app.database import AsyncSessionLocal
+
+        self.used_today = max(0, self.used_today - 1)
+        day_start = float(calendar.timegm(self.budget_day.timetuple()))
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(QuotaBucket)
+                    .where(
+                        QuotaBucket.name == BUDGET_BUCKET,
+                        QuotaBucket.window_start == day_start,
+                        QuotaBucket.requests > 0,
+                    )
+                    .values(requests=QuotaBucket.requests - 1)
+                )
+                await db.commit()
+        except Exception as e:
+            self.db_errors += 1
+            print(f"⚠️  Could not return refresh budget: {e}")
+
+    def _cooling_down(self) -> Set[uuid.UUID]:
+        now = time.monotonic()
+        return {problem_id for problem_id, (_, retry_after) in self.cooldowns.items() if retry_after > now}
+
+    def _record_failure(self, problem_id: uuid.UUID):
+        failures = self.cooldowns.get(problem_id, (0, 0.0))[0] + 1
+        backoff = min(REFRESH_BACKOFF_SECONDS * 2 ** (failures - 1), MAX_BACKOFF_SECONDS)
+        self.cooldowns[problem_id] = (failures, time.monotonic() + backoff)
+
+    def schedule(self, problem_id: uuid.UUID):
+        """Queue a refresh for a stale entry that was just served; no-op if one is running."""
+        if problem_id in self.in_flight or breaker.is_open or problem_id in self._cooling_down():
+            return
+        self.in_flight.add(problem_id)
+        task = asyncio.create_task(self._refresh_scheduled(problem_id))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _refresh_scheduled(self, problem_id: uuid.UUID):
+        if not await self._take_budget():
+            self.in_flight.discard(problem_id)
+            return
+        await self._refresh_one(problem_id)
+
+    async def _refresh_one(self, problem_id: uuid.UUID):
+        from app.database import AsyncSessionLocal
+
+        try:
+            async with AsyncSessionLocal() as db:
+                problem = await db.get(Problem, problem_id)
+                if problem is None or not problem.description or not is_stale(problem):
+                    return
+                analysis = await get_gemini_service().analyze_problem(problem.description)
+                await store_analysis(db, problem, analysis)
+                await db.commit()
+                self.refreshed += 1
+                self.cooldowns.pop(problem_id, None)
+        except CircuitOpenError:
+            await self._return_budget()  # rejected without calling Gemini
+        except Exception as e:
+            self.failed += 1
+            self._record_failure(problem_id)
+            print(f"Background re-analysis of {problem_id} failed: {e}")
+        finally:
+            self.in_flight.discard(problem_id)
+
+    async def next_outdated(self, db: AsyncSession, limit: int = 20):
+        """Outdated problems ordered by how many users track them, minus those backing off after a failure."""
+        learners = (
+            select(UserProblemProgress.problem_id, func.count().label("learners"))
+            .group_by(UserProblemProgress.problem_id)
+            .subquery()
+        )
+        cooling = self._cooling_down()
+        query = (
+            select(Problem.id)
+            .outerjoin(learners, learners.c.problem_id == Problem.id)
+            .where(
+                Problem.cached_analysis.isnot(None),
+                Problem.description.isnot(None),
+                outdated_condition(),
+            )
+            .order_by(func.coalesce(learners.c.learners, 0).desc(), Problem.created_at)
+            .limit(limit)
+        )
+        if cooling:
+            query = query.where(Problem.id.notin_(cooling))
+        result = await db.execute(query)
+        return [problem_id for problem_id in result.scalars() if problem_id not in self.in_flight]
+
+    async def run_forever(self):
+        """Background sweep started from the app lifespan."""
+        from app.database import AsyncSessionLocal
+
+        print(f"🔁 Analysis refresher: model={GEMINI_MODEL} prompt={PROMPT_HASH} budget={self.daily_budget}/day")
+        while True:
+            try:
+                if breaker.is_open:
+                    await asyncio.sleep(max(self.interval, breaker.reset_timeout))
+                    continue
+                async with AsyncSessionLocal() as db:
+                    batch = await self.next_outdated(db)
+                if not batch:
+                    await asyncio.sleep(max(self.interval, 600))
+                    continue
+                exhausted = False
+                for problem_id in batch:
+                    if breaker.is_open:
+                        break  # the rest of the batch would only be rejected
+                    if not await self._take_budget():
+                        exhausted = True
+                        break
+                    self.in_flight.add(problem_id)
+                    await self._refresh_one(problem_id)
+                    await asyncio.sleep(self.interval)
+                if exhausted:
+                    await asyncio.sleep(600)  # check again later; the budget resets at UTC midnight
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Analysis refresher error: {e}")
+                await asyncio.sleep(60)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "model": GEMINI_MODEL,
+            "prompt_hash": PROMPT_HASH,
+            "daily_budget": self.daily_budget,
+            "used_today": self.used_today,
+            "db_errors": self.db_errors,
+            "in_flight": len(self.in_flight),
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "backing_off": len(self._cooling_down()),
+        }
+
+
+analysis_refresher = AnalysisRefresher()
@@ -0,0 +1,67 @@
+"""
+Cached and degraded answers for /analyze that avoid a Gemini call.
+
+similar_cached_problem finds a cached analysis of a near-duplicate problem.
+While Gemini is unavailable, fallback_analysis tries the nearest cached
+analysis (same problem, then a looser similarity match) and finally the local
+keyword classifier. Degraded results are never written to the cache.
+"""
+import uuid
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Problem
+from app.services.problem_identity import canonical_slug
+from app.services.pattern_classifier import degraded_analysis
+from app.services.similarity_index import similarity_index, CACHE_THRESHOLD
+
+# Looser than CACHE_THRESHOLD: a related problem's analysis beats keyword matching
+FALLBACK_THRESHOLD = 0.5
+
+
+async def similar_cached_problem(
+    db: AsyncSession,
+    description: str,
+    threshold: float = CACHE_THRESHOLD,
+    exclude: Optional[uuid.UUID] = None,
+) -> Optional[Problem]:
+    """Most similar indexed problem with a cached analysis at or above threshold."""
+    matches = similarity_index.query(description, limit=3, threshold=threshold, exclude=exclude)
+    if not matches:
+        return None
+    ids = [problem_id for problem_id, _ in matches]
+    result = await db.execute(
+        select(Problem).where(Problem.id.in_(ids), Problem.cached_analysis.isnot(None))
+    )
+    problems = {problem.id: problem for problem in result.scalars()}
+    for problem_id in ids:
+        if problem_id in problems:
+            return problems[problem_id]
+    return None
+
+
+async def nearest_cached_analysis(db: AsyncSession, title: str, url: str) -> Optional[Dict[str, Any]]:
+    """Cached analysis for the same problem under a differently formatted title, or by slug."""
+    conditions = [func.lower(func.trim(Problem.title)) == " ".join(title.split()).lower()]
+    slug = canonical_slug(url, title)
+    if slug:
+        conditions.append(Problem.slug == slug)
+
+    result = await db.execute(
+        select(Problem.cached_analysis)
+        .where(or_(*conditions), Problem.cached_analysis.isnot(None))
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def fallback_analysis(db: AsyncSession, title: str, url: str, description: str) -> Dict[str, Any]:
+    cached = await nearest_cached_analysis(db, title, url)
+    if cached is None:
+        similar = await similar_cached_problem(db, description, threshold=FALLBACK_THRESHOLD)
+        cached = similar.cached_analysis if similar else None
+    if cached:
+        return {**cached, "degraded": True, "source": "cached_nearest"}
+    return degraded_analysis(description)
@@ -0,0 +1,322 @@
+"""
+Offline pre-seeding of the problem catalog and its analyses.
+
+Ingests a local dataset (CSV or NDJSON with slug, leetcode_id, title,
+difficulty, topics, description), bulk-upserts Problem rows by slug and can
+then pre-run Gemini analyses at a throttled rate so user /analyze calls are
+cache hits from day one. Both phases are resumable: ingestion skips the rows
+recorded in the checkpoint file, and analysis only picks up problems that
+still have no cached analysis (failures are remembered and skipped).
+
+Problems without an analysis get problem_patterns rows from their topics
+(see problem_patterns.TOPIC_PATTERNS), so /patterns totals count the whole
+catalog before --analyze has run; an analysis replaces them.
+
+Upserted descriptions go into the similarity index as each batch commits
+(running API workers pick the rows up from the shared index directory; one
+on another host catches up at its next boot).
+
+title and leetcode_id are unique too: a row whose title belongs to another
+slug's problem is skipped (and listed in the checkpoint's skipped_rows), and
+a leetcode_id already held by another slug is dropped from the row.
+
+Usage:
+    python -m app.services.catalog_seed problems.jsonl
+    python -m app.services.catalog_seed problems.jsonl --analyze --rate 20
+    python -m app.services.catalog_seed --analyze-only --rate 20 --limit 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, update, bindparam, exists, func, or_, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import dialect_insert
+from app.models import Problem, UserProblemProgress
+from app.services.history_import import iter_records, format_from_filename, slug_from_url
+from app.services.problem_patterns import sync_topic_patterns
+from app.services.similarity_index import similarity_index, signature
+
+BATCH_SIZE = 500
+
+
+class Checkpoint:
+    """Small JSON file next to the dataset recording how far each phase got."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.data = {"ingested_rows": 0, "failed_analyses": [], "skipped_rows": []}
+        if path.exists():
+            self.data.update(json.loads(path.read_text()))
+
+    def save(self):
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.data, indent=2))
+        os.replace(tmp, self.path)
+
+
+def _parse_topics(value: Any) -> List[str]:
+    if isinstance(value, list):
+        return [str(t).strip() for t in value if str(t).strip()]
+    if isinstance(value, str) and value.strip():
+        text = value.strip()
+        if text.startswith("["):
+            return _parse_topics(json.loads(text))
+        return [t.strip() for t in text.replace("|", ";").split(";") if t.strip()]
+    return []
+
+
+def _catalog_row(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    slug = (record.get("slug") or record.get("titleSlug") or slug_from_url(record.get("url")) or "").strip().lower()
+    title = (record.get("title") or "").strip()
+    if not slug or not title:
+        return None
+
+    leetcode_id = record.get("leetcode_id") or record.get("frontend_id") or record.get("id")
+    try:
+        leetcode_id = int(leetcode_id) if leetcode_id not in (None, "") else None
+    except (TypeError, ValueError):
+        leetcode_id = None
+
+    difficulty = (record.get("difficulty") or "").strip().capitalize() or None
+    if difficulty not in ("Easy", "Medium", "Hard"):
+        difficulty = None
+
+    return {
+        "slug": slug,
+        "title": title,
+        "leetcode_id": leetcode_id,
+        "difficulty": difficulty,
+        "topics": _parse_topics(record.get("topics") or record.get("topicTags")),
+        "description": (record.get("description") or record.get("content") or "").strip() or None,
+        "url": record.get("url") or f"https://leetcode.com/problems/{slug}/",
+    }
+
+
+async def _resolve_unique_collisions(
+    db: AsyncSession, rows: List[Dict[str, Any]], skipped: List[Dict[str, str]]
+) -> List[Dict[str, Any]]:
+    """
+    The upsert only resolves conflicts on slug, and any other unique violation aborts the whole
+    batch: skip rows whose title another slug owns, and clear leetcode_ids another slug owns.
+    """
+    existing = (await db.execute(
+        select(Problem.slug, Problem.title, Problem.leetcode_id).where(or_(
+            Problem.title.in_([row["title"] for row in rows]),
+            Problem.leetcode_id.in_([row["leetcode_id"] for row in rows if row["leetcode_id"] is not None]),
+        ))
+    )).all()
+    title_owner = {problem.title: problem.slug for problem in existing}
+    id_owner = {problem.leetcode_id: problem.slug for problem in existing if problem.leetcode_id is not None}
+
+    kept = []
+    for row in rows:
+        owner = title_owner.setdefault(row["title"], row["slug"])  # also claims it within the batch
+        if owner != row["slug"]:
+            owner = repr(owner) if owner else "a problem without a slug"
+            skipped.append({"slug": row["slug"], "reason": f"title {row['title']!r} belongs to {owner}"})
+            continue
+        if row["leetcode_id"] is not None and id_owner.setdefault(row["leetcode_id"], row["slug"]) != row["slug"]:
+            print(f"⚠️  {row['slug']}: leetcode_id {row['leetcode_id']} belongs to "
+                  f"{id_owner[row['leetcode_id']]!r}; ingesting without it")
+            row = {**row, "leetcode_id": None}
+        kept.append(row)
+    return kept
+
+
+async def upsert_catalog_batch(
+    db: AsyncSession, rows: List[Dict[str, Any]], skipped: Optional[List[Dict[str, str]]] = None
+) -> int:
+    """Insert or refresh one batch of catalog rows keyed on slug; rows that cannot be stored go to `skipped`."""
+    skipped = [] if skipped is None else skipped
+    # Dedupe within the batch: ON CONFLICT DO UPDATE cannot touch a row twice
+    rows = list({row["slug"]: row for row in rows}.values())
+
+    # Rows created by /analyze or /solve before the catalog existed have a title but no slug;
+    # give them their slug first so the upsert below updates them instead of hitting the title key
+    table = Problem.__table__
+    holder = table.alias("slug_holder")
+    await db.execute(
+        update(table)
+        .where(
+            table.c.title == bindparam("b_title"),
+            table.c.slug.is_(None),
+            ~exists().where(holder.c.slug == bindparam("b_slug")),  # the slug may already be taken
+        )
+        .values(slug=bindparam("b_slug")),
+        [{"b_title": row["title"], "b_slug": row["slug"]} for row in rows],
+    )
+    rows = await _resolve_unique_collisions(db, rows, skipped)
+    if not rows:
+        await db.commit()
+        return 0
+
+    stmt = dialect_insert(Problem).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Problem.slug],
+        set_={
+            "leetcode_id": func.coalesce(stmt.excluded.leetcode_id, Problem.leetcode_id),
+            "difficulty": func.coalesce(stmt.excluded.difficulty, Problem.difficulty),
+            "topics": stmt.excluded.topics,
+            "description": func.coalesce(Problem.description, stmt.excluded.description),
+            "url": func.coalesce(Problem.url, stmt.excluded.url),
+            "updated_at": datetime.utcnow(),  # not func.now(): SQLite's is whole seconds, /sync compares it
+        },
+    ).returning(Problem.id, Problem.description)
+    stored = (await db.execute(stmt)).all()
+    unanalyzed = await db.execute(
+        select(Problem.id, Problem.topics)
+        .where(Problem.id.in_([problem_id for problem_id, _ in stored]), Problem.cached_analysis.is_(None))
+    )
+    await sync_topic_patterns(db, dict(unanalyzed.all()))
+    await db.commit()
+    signatures = []
+    for problem_id, description in stored:
+        sig = signature(description)
+        if sig is not None:
+            signatures.append((problem_id, sig))
+    similarity_index.add_many(signatures)
+    return len(rows)
+
+
+async def ingest(db: AsyncSession, path: Path, checkpoint: Checkpoint) -> int:
+    skip = checkpoint.data["ingested_rows"]
+    if skip:
+        print(f"↪️  Resuming ingestion after row {skip}")
+
+    batch: List[Dict[str, Any]] = []
+    seen = 0
+    upserted = 0
+    skipped: List[Dict[str, str]] = []
+
+    def record_skipped():
+        for row in skipped:
+            print(f"⚠️  Skipped {row['slug']}: {row['reason']}")
+        checkpoint.data["skipped_rows"].extend(skipped)
+        skipped.clear()
+
+    with open(path, newline="", encoding="utf-8") as f:
+        for record in iter_records(f, format_from_filename(str(path))):
+            seen += 1
+            if seen <= skip:
+                continue
+            row = _catalog_row(record)
+            if row:
+                batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                upserted += await upsert_catalog_batch(db, batch, skipped)
+                batch = []
+                record_skipped()
+                checkpoint.data["ingested_rows"] = seen
+                checkpoint.save()
+                print(f"📚 {seen} rows ingested")
+        if batch:
+            upserted += await upsert_catalog_batch(db, batch, skipped)
+            record_skipped()
+        checkpoint.data["ingested_rows"] = seen
+        checkpoint.save()
+    return upserted
+
+
+async def analyze_pending(
+    db: AsyncSession,
+    checkpoint: Checkpoint,
+    rate_per_minute: float,
+    limit: Optional[int] = None,
+) -> int:
+    """Analyze catalog problems without a cached analysis, most-tracked first, at a fixed rate."""
+    from app.services.gemini_service import get_gemini_service
+    from app.services.analysis_cache import store_analysis
+
+    gemini_service = get_gemini_service()
+    if rate_per_minute <= 0:
+        raise ValueError("rate_per_minute must be greater than 0")
+    interval = 60.0 / rate_per_minute
+    failed = {uuid.UUID(problem_id) for problem_id in checkpoint.data["failed_analyses"]}
+    done = 0
+
+    popularity = (
+        select(UserProblemProgress.problem_id, func.count().label("learners"))
+        .group_by(UserProblemProgress.problem_id)
+        .subquery()
+    )
+    while limit is None or done < limit:
+        result = await db.execute(
+            select(Problem)
+            .outerjoin(popularity, popularity.c.problem_id == Problem.id)
+            .where(Problem.cached_analysis.is_(None), Problem.description.isnot(None))
+            .where(Problem.id.notin_(failed) if failed else true())
+            .order_by(func.coalesce(popularity.c.learners, 0).desc(), Problem.leetcode_id)
+            .limit(50)
+        )
+        problems = result.scalars().all()
+        if not problems:
+            break
+
+        for problem in problems:
+            if limit is not None and done >= limit:
+                break
+            started = time.monotonic()
+            try:
+                analysis = await gemini_service.analyze_problem(problem.description)
+            except Exception as e:
+                print(f"❌ {problem.slug or problem.title}: {e}")
+                failed.add(problem.id)
+                checkpoint.data["failed_analyses"] = sorted(str(problem_id) for problem_id in failed)
+                checkpoint.save()
+            else:
+                await store_analysis(db, problem, analysis)
+                await db.commit()
+                done += 1
+                print(f"🤖 analyzed {problem.slug or problem.title} ({done})")
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+    return done
+
+
+def _positive_rate(value: str) -> float:
+    rate = float(value)
+    if not rate > 0:
+        raise argparse.ArgumentTypeError("must be greater than 0")
+    return rate
+
+
+async def main():
+    from app.database import AsyncSessionLocal
+
+    parser = argparse.ArgumentParser(
+        description="Seed the problem catalog and pre-run analyses.",
+        epilog="Pattern totals (/patterns) count unanalyzed problems by their dataset topics, "
+               "mapped to pattern names; analyzed problems count by their analysis' patterns.",
+    )
+    parser.add_argument("path", nargs="?", help="CSV or NDJSON dataset")
+    parser.add_argument("--analyze", action="store_true", help="Pre-run Gemini analyses after ingesting")
+    parser.add_argument("--analyze-only", action="store_true", help="Skip ingestion")
+    parser.add_argument("--rate", type=_positive_rate, default=10.0, help="Analyses per minute (default 10)")
+    parser.add_argument("--limit", type=int, help="Stop after this many analyses")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <dataset>.checkpoint.json)")
+    args = parser.parse_args()
+
+    if not args.path and not args.analyze_only:
+        parser.error("a dataset path is required unless --analyze-only is given")
+
+    checkpoint_path = Path(args.checkpoint or (f"{args.path}.checkpoint.json" if args.path else "catalog.checkpoint.json"))
+    checkpoint = Checkpoint(checkpoint_path)
+
+    async with AsyncSessionLocal() as db:
+        if not args.analyze_only:
+            upserted = await ingest(db, Path(args.path), checkpoint)
+            print(f"✅ Catalog ingested: {upserted} problems upserted")
+        if args.analyze or args.analyze_only:
+            analyzed = await analyze_pending(db, checkpoint, args.rate, args.limit)
+            print(f"✅ Pre-analysis finished: {analyzed} problems analyzed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
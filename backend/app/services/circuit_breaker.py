@@ -0,0 +1,104 @@
+"""
+Minimal async circuit breaker for calls to external providers.
+
+closed    -> calls pass through; consecutive failures are counted
+open      -> calls fail fast with CircuitOpenError until reset_timeout elapses
+half_open -> a single probe call is let through; success closes the circuit,
+             failure re-opens it for another reset_timeout
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        call_timeout: Optional[float] = 20.0,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.call_timeout = call_timeout
+
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+        self.total_calls = 0
+        self.total_failures = 0
+        self.total_rejected = 0
+
+    def _refresh_state(self):
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self.probe_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls would be rejected outright (open, or half-open with a probe running)."""
+        self._refresh_state()
+        return self.state == "open" or (self.state == "half_open" and self.probe_in_flight)
+
+    def _acquire(self):
+        self._refresh_state()
+        if self.state == "open" or (self.state == "half_open" and self.probe_in_flight):
+            self.total_rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        if self.state == "half_open":
+            self.probe_in_flight = True
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"⚡ {self.name} circuit opened after {self.consecutive_failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+
+    async def call(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Run fn under the breaker with the per-call timeout."""
+        self._acquire()
+        self.total_calls += 1
+        try:
+            if self.call_timeout:
+                result = await asyncio.wait_for(fn(*args, **kwargs), timeout=self.call_timeout)
+            else:
+                result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            # The caller went away; that says nothing about provider health
+            self.probe_in_flight = False
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._refresh_state()
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "seconds_until_probe": max(0.0, round(self.reset_timeout - (time.monotonic() - self.opened_at), 1))
+            if self.state == "open" else 0.0,
+            "total_calls": self.total_calls,
+            "total_failures": self.total_failures,
+            "total_rejected": self.total_rejected,
+        }
@@ -0,0 +1,259 @@
+"""
+Fleet-wide daily due digest.
+
+For every user with reviews due: how many are due (the /today count), how
+many of those are overdue, and the most overdue problems. Reminders and
+capacity planning read the result instead of running /today per user.
+
+Users are split into keyset chunks of DUE_DIGEST_CHUNK_SIZE ids. Each chunk
+is one set-based query: a range scan of idx_user_progress_next_review
+(user_id, next_review_date) over the chunk's id range, with window
+functions for the per-user counts and ranks, joined to problems for the
+top rows only. DUE_DIGEST_WORKERS chunks run at a time, each on its own
+connection (reads go to the replica when REPLICA_DATABASE_URL is set).
+Results are written per chunk, so memory stays bounded by
+workers x chunk size whatever the number of users:
+
+- to due_digests (default): one row per (user, day), replaced on a re-run
+  of the same day; rows older than DUE_DIGEST_RETENTION_DAYS are deleted
+- or to an NDJSON file (--output), one line per user
+
+Run it every morning, e.g. from cron:
+
+    python -m app.services.due_digest
+    python -m app.services.due_digest --output digest.ndjson --workers 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, TextIO, Tuple
+
+from sqlalchemy import select, delete, insert, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import IS_SQLITE
+from app.models import User, Problem, UserProblemProgress, DueDigest
+
+CHUNK_SIZE = int(os.getenv("DUE_DIGEST_CHUNK_SIZE", "1000"))
+WORKERS = int(os.getenv("DUE_DIGEST_WORKERS", "4"))
+TOP_OVERDUE = int(os.getenv("DUE_DIGEST_TOP", "5"))
+RETENTION_DAYS = int(os.getenv("DUE_DIGEST_RETENTION_DAYS", "14"))
+BUDGET_SECONDS = float(os.getenv("DUE_DIGEST_BUDGET_SECONDS", "600"))
+
+DUE_STATUSES = ['learning', 'reviewing']  # as /today
+
+
+def _digest_query(lo: uuid.UUID, hi: uuid.UUID, today: date, top: int):
+    """Due counts and the `top` most overdue problems for users with ids in [lo, hi]."""
+    by_user = {"partition_by": UserProblemProgress.user_id}
+    due = (
+        select(
+            UserProblemProgress.user_id,
+            UserProblemProgress.problem_id,
+            UserProblemProgress.next_review_date,
+            func.row_number().over(
+                order_by=(UserProblemProgress.next_review_date, UserProblemProgress.problem_id), **by_user
+            ).label("overdue_rank"),
+            func.count().over(**by_user).label("due_count"),
+            func.sum(case((UserProblemProgress.next_review_date < today, 1), else_=0)).over(**by_user)
+            .label("overdue_count"),
+        )
+        .where(
+            UserProblemProgress.user_id.between(lo, hi),
+            UserProblemProgress.next_review_date <= today,
+            UserProblemProgress.status.in_(DUE_STATUSES),
+        )
+        .subquery()
+    )
+    return (
+        select(
+            due.c.user_id, due.c.due_count, due.c.overdue_count, due.c.next_review_date,
+            Problem.id, Problem.title, Problem.difficulty, Problem.url,
+        )
+        .join(Problem, Problem.id == due.c.problem_id)
+        .where(due.c.overdue_rank <= top)
+        .order_by(due.c.user_id, due.c.overdue_rank)
+    )
+
+
+async def digest_chunk(
+    db: AsyncSession, lo: uuid.UUID, hi: uuid.UUID, today: date, top: int = TOP_OVERDUE
+) -> List[Dict[str, Any]]:
+    """One digest per user in [lo, hi] with anything due (users with nothing due are left out)."""
+    digests: Dict[uuid.UUID, Dict[str, Any]] = {}
+    for row in await db.execute(_digest_query(lo, hi, today, top)):
+        digest = digests.get(row.user_id)
+        if digest is None:
+            digest = digests[row.user_id] = {
+                "user_id": row.user_id,
+                "due_count": row.due_count,
+                "overdue_count": row.overdue_count,
+                "top_overdue": [],
+            }
+        digest["top_overdue"].append({
+            "problem_id": str(row.id),
+            "title": row.title,
+            "difficulty": row.difficulty,
+            "url": row.url,
+            "next_review": row.next_review_date.isoformat(),
+            "days_overdue": (today - row.next_review_date).days,
+        })
+    return list(digests.values())
+
+
+async def user_id_ranges(db: AsyncSession, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[Tuple[uuid.UUID, uuid.UUID, int]]:
+    """(first id, last id, users) per keyset chunk of users, in id order."""
+    last_id = None
+    while True:
+        query = select(User.id).order_by(User.id).limit(chunk_size)
+        if last_id is not None:
+            query = query.where(User.id > last_id)
+        ids = (await db.execute(query)).scalars().all()
+        if not ids:
+            return
+        yield ids[0], ids[-1], len(ids)
+        last_id = ids[-1]
+
+
+class TableSink:
+    """Replaces a chunk's due_digests rows for the day, one transaction per chunk."""
+
+    def __init__(self, session_factory, today: date):
+        self.session_factory = session_factory
+        self.today = today
+        # SQLite has one writer: concurrent chunk transactions would fail with "database is locked"
+        # (a stale read snapshot cannot be upgraded to a write), so writes take turns there
+        self.write_lock = asyncio.Lock() if IS_SQLITE else None
+
+    async def prepare(self, retention_days: int = RETENTION_DAYS) -> int:
+        async with self.session_factory() as db:
+            result = await db.execute(
+                delete(DueDigest).where(DueDigest.digest_date < self.today - timedelta(days=retention_days))
+            )
+            await db.commit()
+        return result.rowcount or 0
+
+    async def write(self, lo: uuid.UUID, hi: uuid.UUID, digests: List[Dict[str, Any]]):
+        if self.write_lock is None:
+            return await self._write(lo, hi, digests)
+        async with self.write_lock:
+            return await self._write(lo, hi, digests)
+
+    async def _write(self, lo: uuid.UUID, hi: uuid.UUID, digests: List[Dict[str, Any]]):
+        computed_at = datetime.utcnow()
+        async with self.session_factory() as db:
+            await db.execute(
+                delete(DueDigest).where(DueDigest.digest_date == self.today, DueDigest.user_id.between(lo, hi))
+            )
+            if digests:
+                await db.execute(insert(DueDigest), [
+                    {**digest, "digest_date": self.today, "computed_at": computed_at} for digest in digests
+                ])
+            await db.commit()
+
+
+class NdjsonSink:
+    """One JSON line per user; each chunk's lines are written together."""
+
+    def __init__(self, out: TextIO, today: date):
+        self.out = out
+        self.today = today
+
+    async def prepare(self, retention_days: int = RETENTION_DAYS) -> int:
+        return 0
+
+    async def write(self, lo: uuid.UUID, hi: uuid.UUID, digests: List[Dict[str, Any]]):
+        self.out.writelines(
+            json.dumps({**digest, "user_id": str(digest["user_id"]), "date": self.today.isoformat()}) + "\n"
+            for digest in digests
+        )
+
+
+async def run_digest(
+    sink,
+    today: date,
+    workers: int = WORKERS,
+    chunk_size: int = CHUNK_SIZE,
+    top: int = TOP_OVERDUE,
+    read_session_factory=None,
+) -> Dict[str, Any]:
+    """Digest every user into `sink`, `workers` chunks at a time."""
+    from app.database import ReplicaSessionLocal
+
+    read_session_factory = read_session_factory or ReplicaSessionLocal
+    workers = max(1, workers)
+    started = time.monotonic()
+    report = {"date": today.isoformat(), "users": 0, "users_due": 0, "reviews_due": 0, "chunks": 0,
+              "pruned": await sink.prepare()}
+    chunks: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)  # bounds ids held ahead of the workers
+
+    async def worker():
+        async with read_session_factory() as db:
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    return
+                lo, hi, users = chunk
+                digests = await digest_chunk(db, lo, hi, today, top)
+                await db.rollback()  # end the read transaction between chunks
+                await sink.write(lo, hi, digests)
+                report["users"] += users
+                report["users_due"] += len(digests)
+                report["reviews_due"] += sum(digest["due_count"] for digest in digests)
+                report["chunks"] += 1
+
+    async def produce():
+        async with read_session_factory() as db:
+            async for chunk in user_id_ranges(db, chunk_size):
+                await chunks.put(chunk)
+        for _ in range(workers):
+            await chunks.put(None)
+
+    tasks = [asyncio.create_task(produce())] + [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()  # after a failure: stop the rest instead of leaving them blocked on the queue
+
+    report["seconds"] = round(time.monotonic() - started, 1)
+    report["users_per_second"] = round(report["users"] / report["seconds"]) if report["seconds"] else None
+    return report
+
+
+async def main():
+    from app.database import AsyncSessionLocal, engine, replica_engine
+
+    parser = argparse.ArgumentParser(description="Compute every user's due count and most overdue problems.")
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="Digest day (default: today, UTC)")
+    parser.add_argument("--output", help="Write NDJSON to this file instead of the due_digests table")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Chunks processed concurrently")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Users per set-based query")
+    parser.add_argument("--top", type=int, default=TOP_OVERDUE, help="Most overdue problems kept per user")
+    args = parser.parse_args()
+
+    for bind in (engine, replica_engine):
+        if bind is not None:
+            bind.echo = False  # one line per statement would dwarf the report
+    today = args.date or datetime.utcnow().date()
+    out: Optional[TextIO] = open(args.output, "w") if args.output else None
+    try:
+        sink = NdjsonSink(out, today) if out else TableSink(AsyncSessionLocal, today)
+        report = await run_digest(sink, today, args.workers, args.chunk_size, args.top)
+    finally:
+        if out:
+            out.close()
+    print(f"✅ Due digest finished: {report}")
+    if report["seconds"] > BUDGET_SECONDS:
+        print(f"⚠️  Took {report['seconds']}s, over the {BUDGET_SECONDS:.0f}s budget: raise --workers or --chunk-size")
+    await engine.dispose()
+    if replica_engine:
+        await replica_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+"""
+Bounded thread pools for blocking SDK calls.
+
+The Gemini and Supabase SDKs are synchronous. Calling them inside an
+`async def` handler blocks the event loop for the whole HTTP round trip, and
+asyncio.to_thread shares one default pool between everything. Each provider
+gets its own small pool instead, with a queue limit, an optional per-call
+timeout and counters for /admin/executors.
+
+Cancelling the awaiting coroutine (timeout or client disconnect) removes a
+call that is still queued, so it never takes a thread. A call that already
+started cannot be interrupted; it finishes in its thread and the result is
+dropped.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from starlette.requests import Request
+
+
+class ExecutorSaturatedError(Exception):
+    """Raised instead of queueing when a pool's backlog is full."""
+
+
+class ClientDisconnectedError(Exception):
+    """The client closed the connection before the work finished."""
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, max_workers: int, max_queue: int, timeout: Optional[float] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+
+    def _invoke(self, submitted: float, fn: Callable[..., Any], args, kwargs) -> Any:
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait += time.monotonic() - submitted
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def _on_done(self, future):
+        with self._lock:
+            if future.cancelled():
+                self.queued -= 1  # never reached _invoke
+                self.cancelled += 1
+            elif future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run a blocking call on this pool; raises asyncio.TimeoutError after `timeout` (default: the pool's)."""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise ExecutorSaturatedError(f"{self.name} pool queue is full ({self.max_queue})")
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        future = self.pool.submit(self._invoke, time.monotonic(), fn, args, kwargs)
+        future.add_done_callback(self._on_done)
+        # wrap_future propagates cancellation: a queued call is dropped from the pool
+        awaitable = asyncio.wrap_future(future)
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            if timeout:
+                return await asyncio.wait_for(awaitable, timeout=timeout)
+            return await awaitable
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self.completed + self.failed + self.running
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "running": self.running,
+                "peak_queued": self.peak_queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "cancelled": self.cancelled,
+                "rejected": self.rejected,
+                "avg_queue_wait_ms": round(self.total_wait / started * 1000, 1) if started else 0.0,
+            }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+llm_executor = BoundedExecutor(
+    "llm",
+    max_workers=int(os.getenv("LLM_POOL_SIZE", "4")),
+    max_queue=int(os.getenv("LLM_POOL_QUEUE", "32")),
+    # Per-call timeout for Gemini is enforced by its circuit breaker (GEMINI_TIMEOUT_SECONDS)
+)
+auth_executor = BoundedExecutor(
+    "auth",
+    max_workers=int(os.getenv("AUTH_POOL_SIZE", "8")),
+    max_queue=int(os.getenv("AUTH_POOL_QUEUE", "64")),
+    timeout=float(os.getenv("AUTH_CALL_TIMEOUT_SECONDS", "10")),
+)
+EXECUTORS = {executor.name: executor for executor in (llm_executor, auth_executor)}
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[Any], poll_interval: float = 0.5) -> Any:
+    """Await `awaitable`, cancelling it if the client disconnects first."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnectedError()
+    finally:
+        if not task.done():
+            task.cancel()
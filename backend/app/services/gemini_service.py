@@ -2,10 +2,16 @@ import os
 import json
 import asyncio
 import time
+from collections import deque
 from typing import Dict, Any, Optional
 from pathlib import Path
 from dotenv import load_dotenv
-import google.generativeai as genai
+
+from app.startup import timings
+from app.services.prompt_compaction import compact_description, estimate_tokens
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.executors import llm_executor
+from app.services.quota import build_quota
 
 # Robust .env loading
 # Finds the project root by looking for 'backend' in the path or just going up
@@ -20,54 +26,110 @@ else:
     # Fallback to standard loading if path calculation fails (e.g. structure change)
     load_dotenv()
 
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash-latest")
+
+# Kept flush-left: indentation inside the prompt is paid for in input tokens
+PROMPT_TEMPLATE = """You are an expert algorithm instructor. Analyze this LeetCode problem.
+
+PROBLEM:
+{problem}
+
+REQUIREMENTS:
+1. Identify optimal algorithmic patterns.
+2. Estimate Time/Space complexity.
+3. Provide confidence score (0-1).
+4. List prerequisites and similar problems.
+5. Provide a 'Key Insight'.
+
+Return JSON with this schema:
+{{"patterns": [{{"name": str, "confidence": float, "reason": str}}], "time_complexity": str, "space_complexity": str, "difficulty_analysis": str, "key_insight": str, "prerequisites": [str], "similar_problems": [str]}}"""
+
+class UsageLog:
+    """Ring buffer of per-request token counts and latency for cost tracking."""
+
+    def __init__(self, maxlen: int = 1000):
+        self.entries = deque(maxlen=maxlen)
+        self.total_requests = 0
+        self.total_input_tokens = 0
+        self.total_output_tokens = 0
+
+    def record(self, input_tokens: int, output_tokens: int, latency_ms: float, raw_chars: int, prompt_chars: int):
+        self.entries.append({
+            "at": time.time(),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "latency_ms": round(latency_ms, 1),
+            "raw_description_chars": raw_chars,
+            "prompt_chars": prompt_chars,
+        })
+        self.total_requests += 1
+        self.total_input_tokens += input_tokens
+        self.total_output_tokens += output_tokens
+
+    def summary(self) -> Dict[str, Any]:
+        recent = list(self.entries)
+        latencies = sorted(e["latency_ms"] for e in recent)
+        return {
+            "total_requests": self.total_requests,
+            "total_input_tokens": self.total_input_tokens,
+            "total_output_tokens": self.total_output_tokens,
+            "recent": {
+                "count": len(recent),
+                "avg_input_tokens": round(sum(e["input_tokens"] for e in recent) / len(recent), 1) if recent else 0,
+                "avg_output_tokens": round(sum(e["output_tokens"] for e in recent) / len(recent), 1) if recent else 0,
+                "p50_latency_ms": latencies[len(latencies) // 2] if latencies else 0,
+                "p95_latency_ms": latencies[int(len(latencies) * 0.95)] if latencies else 0,
+            },
+            "last": recent[-10:],
+        }
+
+usage_log = UsageLog()
+
+# Shared by every GeminiService instance so provider health survives re-construction
+breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "3")),
+    reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30")),
+    call_timeout=float(os.getenv("GEMINI_TIMEOUT_SECONDS", "20")),
+)
+
+# One RPM/TPM budget for every worker, not one per process
+quota = build_quota("gemini")
+
+_genai = None
+
+def _load_genai():
+    """Import google.generativeai on first use; it is the slowest import in the app."""
+    global _genai
+    if _genai is None:
+        with timings.measure("import google.generativeai"):
+            import google.generativeai as genai
+        _genai = genai
+    return _genai
+
 class GeminiService:
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY is not set. Please check your .env file.")
         
+        genai = _load_genai()
         genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash-latest')
+        self.model_name = GEMINI_MODEL
+        self.model = genai.GenerativeModel(self.model_name)
+        
+        # Rate limiting state: shared by all workers through Postgres (GEMINI_QUOTA_BACKEND)
+        self.quota = quota
         
-        # Rate limiting state
-        self.last_request_time = 0
-        self.min_request_interval = 2.0  # Increased to 2 seconds
-        self.lock = asyncio.Lock()
-
-    async def _rate_limit(self):
-        """Ensures we don't exceed the free tier rate limits."""
-        async with self.lock:
-            current_time = time.time()
-            elapsed = current_time - self.last_request_time
-            if elapsed < self.min_request_interval:
-                await asyncio.sleep(self.min_request_interval - elapsed)
-            self.last_request_time = time.time()
+        self.usage = usage_log
+        self.breaker = breaker
+
+    async def _rate_limit(self, prompt: str):
+        """Ensures we don't exceed the free tier rate limits across all workers."""
+        return await self.quota.acquire(estimate_tokens(prompt))
 
     def _build_system_prompt(self, problem_description: str) -> str:
-        return f"""
-        You are an expert algorithm instructor. Analyze this LeetCode problem.
-        
-        PROBLEM:
-        {problem_description}
-        
-        REQUIREMENTS:
-        1. Identify optimal algorithmic patterns.
-        2. Estimate Time/Space complexity.
-        3. Provide confidence score (0-1).
-        4. List prerequisites and similar problems.
-        5. Provide a 'Key Insight'.
-        
-        Return JSON with this schema:
-        {{
-            "patterns": [{{"name": str, "confidence": float, "reason": str}}],
-            "time_complexity": str,
-            "space_complexity": str,
-            "difficulty_analysis": str,
-            "key_insight": str,
-            "prerequisites": [str],
-            "similar_problems": [str]
-        }}
-        """
+        return PROMPT_TEMPLATE.format(problem=compact_description(problem_description))
 
     async def analyze_problem(self, description: str) -> Dict[str, Any]:
         """
@@ -75,17 +137,24 @@ class GeminiService:
         """
         if not description:
             raise ValueError("Problem description cannot be empty")
+        
+        # Fail fast instead of queueing behind the rate limiter during an outage
+        if self.breaker.is_open:
+            raise CircuitOpenError("gemini circuit is open")
             
         retry_count = 0
         max_retries = 3
         
         while retry_count < max_retries:
             try:
-                await self._rate_limit()
-                
                 prompt = self._build_system_prompt(description)
+                reservation = await self._rate_limit(prompt)
+                genai = _load_genai()
                 
-                response = await asyncio.to_thread(
+                started = time.perf_counter()
+                # The SDK call blocks; it runs on the dedicated LLM pool, not the default executor
+                response = await self.breaker.call(
+                    llm_executor.run,
                     self.model.generate_content,
                     prompt,
                     generation_config=genai.types.GenerationConfig(
@@ -98,9 +167,16 @@ class GeminiService:
                 
                 if not response.text:
                     raise ValueError("Empty response from Gemini API")
-                    
+                
+                input_tokens = self._record_usage(response, prompt, description, time.perf_counter() - started)
+                await self.quota.settle(reservation, input_tokens)
                 return json.loads(response.text)
                 
+            except CircuitOpenError:
+                raise
+            except asyncio.TimeoutError:
+                print(f"Gemini call timed out after {self.breaker.call_timeout}s")
+                raise
             except Exception as e:
                 error_str = str(e)
                 if "429" in error_str:
@@ -113,6 +189,25 @@ class GeminiService:
 
         raise Exception("Failed to analyze problem after multiple retries due to rate limiting.")
 
+    def _record_usage(self, response, prompt: str, description: str, elapsed: float):
+        """Prefer the API's own token counts; fall back to local estimates on older SDKs."""
+        usage = getattr(response, "usage_metadata", None)
+        input_tokens = getattr(usage, "prompt_token_count", None) or estimate_tokens(prompt)
+        output_tokens = getattr(usage, "candidates_token_count", None) or estimate_tokens(response.text)
+        self.usage.record(input_tokens, output_tokens, elapsed * 1000, len(description), len(prompt))
+        print(f"🔢 Gemini usage: {input_tokens} in / {output_tokens} out tokens, {elapsed * 1000:.0f} ms")
+        return input_tokens
+
+_service: Optional[GeminiService] = None
+
+def get_gemini_service() -> GeminiService:
+    """Shared GeminiService, constructed on the first /analyze call rather than at boot."""
+    global _service
+    if _service is None:
+        with timings.measure("gemini client init"):
+            _service = GeminiService()
+    return _service
+
 # Usage Example (for testing)
 if __name__ == "__main__":
     async def main():
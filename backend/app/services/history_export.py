@@ -0,0 +1,103 @@
+"""
+Streaming NDJSON export of a user's full history.
+
+Rows are read through server-side cursors (AsyncSession.stream with yield_per)
+and serialized one line at a time, so memory stays flat and the first bytes
+reach the client before the database has finished producing rows.
+"""
+import json
+import uuid
+import zlib
+from datetime import datetime, date
+from typing import Any, AsyncIterator, Dict
+
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.models import Problem, UserProblemProgress, ReviewSession, ReviewSessionRollup, DailyStats
+
+EXPORT_FORMAT_VERSION = 1
+YIELD_PER = 500
+FLUSH_BYTES = 64 * 1024
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return str(value)
+
+
+def _row_to_dict(obj) -> Dict[str, Any]:
+    return {column.key: getattr(obj, column.key) for column in obj.__mapper__.column_attrs}
+
+
+def _line(record_type: str, data: Dict[str, Any]) -> bytes:
+    return (json.dumps({"type": record_type, "data": data}, default=_json_default) + "\n").encode("utf-8")
+
+
+async def _iter_lines(user_id: uuid.UUID) -> AsyncIterator[bytes]:
+    yield _line("meta", {
+        "user_id": user_id,
+        "exported_at": datetime.utcnow(),
+        "version": EXPORT_FORMAT_VERSION,
+    })
+
+    async with AsyncSessionLocal() as db:
+        progress_query = (
+            select(UserProblemProgress, Problem.slug, Problem.title)
+            .join(Problem, Problem.id == UserProblemProgress.problem_id)
+            .where(UserProblemProgress.user_id == user_id)
+            .order_by(UserProblemProgress.created_at)
+            .execution_options(yield_per=YIELD_PER)
+        )
+        result = await db.stream(progress_query)
+        async for progress, slug, title in result:
+            data = _row_to_dict(progress)
+            data.update(problem_slug=slug, problem_title=title)
+            yield _line("progress", data)
+            db.expunge(progress)
+
+        for model, record_type, order_column in (
+            (ReviewSession, "review_session", ReviewSession.created_at),
+            # Raw sessions past SESSION_RETENTION_MONTHS survive only as monthly rollups
+            (ReviewSessionRollup, "review_rollup", ReviewSessionRollup.month),
+            (DailyStats, "daily_stats", DailyStats.date),
+        ):
+            query = (
+                select(model)
+                .where(model.user_id == user_id)
+                .order_by(order_column)
+                .execution_options(yield_per=YIELD_PER)
+            )
+            result = await db.stream_scalars(query)
+            async for row in result:
+                yield _line(record_type, _row_to_dict(row))
+                db.expunge(row)
+
+
+async def stream_user_history(user_id: uuid.UUID, compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Yield the export as NDJSON chunks of roughly FLUSH_BYTES, optionally gzipped.
+    The header line is flushed on its own so the response starts immediately.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = bytearray()
+    first = True
+
+    async for line in _iter_lines(user_id):
+        buffer += line
+        if first or len(buffer) >= FLUSH_BYTES:
+            first = False
+            chunk = bytes(buffer)
+            buffer.clear()
+            if compressor:
+                chunk = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield chunk
+
+    chunk = bytes(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush(zlib.Z_FINISH)
+    if chunk:
+        yield chunk
@@ -0,0 +1,511 @@
+"""
+Streaming bulk import of a user's LeetCode submission history.
+
+Reads a CSV or NDJSON export one line at a time, resolves problems in
+batches by slug and replays the SM-2 schedule for every accepted solve.
+Memory use is bounded by the batch size, not by the size of the file.
+
+SM-2 is replayed oldest solve first, whatever the file's order (LeetCode's
+export is newest first). A file that fits in one batch is sorted in memory;
+a larger one is sorted externally: every batch is sorted and spilled to a
+temporary file as a run, and the runs are merged lazily.
+
+Imported solves count like /solve: one review per problem per local day
+(users.timezone), daily_stats for those days, total_problems_solved up by
+one per day that gets its first solve, and the streak rebuilt from
+daily_stats at the end (the days are backdated, see streaks.repair_user).
+
+Usage:
+    python -m app.services.history_import submissions.csv --user-id <uuid>
+"""
+import argparse
+import asyncio
+import csv
+import heapq
+import itertools
+import json
+import os
+import re
+import tempfile
+import uuid
+from collections import Counter
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from operator import attrgetter
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select, or_, update, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import dialect_insert
+from app.models import User, Problem, UserProblemProgress, ReviewSession
+from app.services.outbox import add_daily_solves
+from app.services.session_rollups import mark_dirty_months
+from app.services.spaced_repetition import SpacedRepetitionService
+from app.services.streaks import local_date, repair_user
+
+DEFAULT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+DEFAULT_QUALITY = int(os.getenv("IMPORT_DEFAULT_QUALITY", "4"))
+
+SORT_BLOCK_BYTES = 16 * 1024  # read size per run while merging
+
+_SLUG_FROM_URL = re.compile(r"/problems/([a-z0-9-]+)")
+
+
+def slug_from_url(url: Optional[str]) -> Optional[str]:
+    """Extract the problem slug from a leetcode.com/problems/<slug>/ URL."""
+    if not url:
+        return None
+    match = _SLUG_FROM_URL.search(url.lower())
+    return match.group(1) if match else None
+
+
+def slugify_title(title: str) -> str:
+    """Best-effort slug for rows that only carry a title ("1. Two Sum" -> "two-sum")."""
+    title = re.sub(r"^\s*\d+\.\s*", "", title)
+    return re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-")
+
+
+@dataclass
+class ImportRow:
+    slug: str
+    title: str
+    difficulty: Optional[str]
+    url: str
+    leetcode_id: Optional[int]
+    quality: int
+    solved_at: datetime
+
+
+@dataclass
+class ImportStats:
+    rows_read: int = 0
+    rows_skipped: int = 0
+    reviews_applied: int = 0
+    problems_created: int = 0
+    problems_tracked: int = 0
+    batches: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if value in (None, ""):
+        return None
+    text = str(value).strip()
+    if text.isdigit():
+        seconds = int(text)
+        if seconds > 10**11:  # milliseconds
+            seconds //= 1000
+        return datetime.utcfromtimestamp(seconds)
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _normalize_record(record: Dict[str, Any]) -> Optional[ImportRow]:
+    """Map one raw export record onto an ImportRow, or None if it should be skipped."""
+    status = record.get("status") or record.get("statusDisplay") or record.get("status_display")
+    if status and str(status).strip().lower() not in ("accepted", "ac", "solved"):
+        return None
+
+    url = (record.get("url") or "").strip()
+    title = (record.get("title") or "").strip()
+    slug = (
+        record.get("slug") or record.get("titleSlug") or record.get("title_slug")
+        or slug_from_url(url) or (slugify_title(title) if title else None)
+    )
+    if not slug:
+        return None
+    slug = str(slug).strip().lower()
+
+    solved_at = _parse_timestamp(
+        record.get("solved_at") or record.get("timestamp") or record.get("date")
+    ) or datetime.utcnow()
+
+    try:
+        quality = int(record.get("quality") or DEFAULT_QUALITY)
+    except (TypeError, ValueError):
+        quality = DEFAULT_QUALITY
+    quality = max(0, min(5, quality))
+
+    leetcode_id = record.get("leetcode_id") or record.get("questionId") or record.get("frontend_id")
+    try:
+        leetcode_id = int(leetcode_id) if leetcode_id not in (None, "") else None
+    except (TypeError, ValueError):
+        leetcode_id = None
+
+    difficulty = (record.get("difficulty") or "").strip().capitalize() or None
+    if difficulty not in (None, "Easy", "Medium", "Hard"):
+        difficulty = None
+
+    return ImportRow(
+        slug=slug,
+        title=title or slug.replace("-", " ").title(),
+        difficulty=difficulty,
+        url=url or f"https://leetcode.com/problems/{slug}/",
+        leetcode_id=leetcode_id,
+        quality=quality,
+        solved_at=solved_at,
+    )
+
+
+def iter_records(lines: Iterable[str], fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield raw records from a CSV or NDJSON line stream without buffering the file.
+    The format is sniffed from the first non-blank line when not given.
+    """
+    lines = iter(lines)
+    first = None
+    for line in lines:
+        if line.strip():
+            first = line
+            break
+    if first is None:
+        return
+    lines = itertools.chain([first], lines)
+
+    if fmt is None:
+        fmt = "ndjson" if first.lstrip().startswith("{") else "csv"
+
+    if fmt == "csv":
+        yield from csv.DictReader(lines)
+    elif fmt in ("ndjson", "jsonl", "json"):
+        for number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {number}: {e}")
+            if isinstance(record, dict):
+                yield record
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+_SOLVE_ORDER = attrgetter("solved_at")
+
+
+def _spill(spool: BinaryIO, rows: List[ImportRow]) -> Tuple[int, int]:
+    """Append rows to the spool file as one sorted run; returns its byte range."""
+    spool.seek(0, os.SEEK_END)
+    start = spool.tell()
+    for row in sorted(rows, key=_SOLVE_ORDER):
+        record = asdict(row)
+        record["solved_at"] = row.solved_at.isoformat()
+        spool.write(json.dumps(record).encode("utf-8") + b"\n")
+    return start, spool.tell()
+
+
+def _read_run(spool: BinaryIO, start: int, end: int) -> Iterator[ImportRow]:
+    """One run's rows, read a block at a time (the merge reads all runs interleaved)."""
+    position, pending = start, b""
+    while position < end:
+        spool.seek(position)
+        block = spool.read(min(SORT_BLOCK_BYTES, end - position))
+        position += len(block)
+        *lines, pending = (pending + block).split(b"\n")
+        for line in lines:
+            record = json.loads(line)
+            record["solved_at"] = datetime.fromisoformat(record["solved_at"])
+            yield ImportRow(**record)
+
+
+def format_from_filename(filename: Optional[str]) -> Optional[str]:
+    if not filename:
+        return None
+    extension = os.path.splitext(filename)[1].lower().lstrip(".")
+    return {"csv": "csv", "ndjson": "ndjson", "jsonl": "ndjson", "json": "ndjson"}.get(extension)
+
+
+class HistoryImporter:
+    """Applies an import stream for one user in fixed-size, individually committed batches."""
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        on_progress: Optional[Callable[[ImportStats], None]] = None,
+    ):
+        self.db = db
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self.stats = ImportStats()
+        self.timezone: Optional[str] = None
+
+    async def run(self, records: Iterable[Dict[str, Any]]) -> ImportStats:
+        self.timezone = (await self.db.execute(
+            select(User.timezone).where(User.id == self.user_id)
+        )).scalar_one_or_none()
+
+        with tempfile.TemporaryFile() as spool:
+            batch: List[ImportRow] = []
+            runs: List[Tuple[int, int]] = []
+            for record in records:
+                self.stats.rows_read += 1
+                row = _normalize_record(record)
+                if row is None:
+                    self.stats.rows_skipped += 1
+                    continue
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    runs.append(_spill(spool, batch))
+                    batch = []
+
+            if not runs:
+                if batch:
+                    await self._apply_batch(sorted(batch, key=_SOLVE_ORDER))
+            else:
+                if batch:
+                    runs.append(_spill(spool, batch))
+                merged = heapq.merge(*(_read_run(spool, start, end) for start, end in runs), key=_SOLVE_ORDER)
+                while True:
+                    batch = list(itertools.islice(merged, self.batch_size))
+                    if not batch:
+                        break
+                    await self._apply_batch(batch)
+
+        if self.stats.reviews_applied:
+            await repair_user(self.db, self.user_id)
+            await self.db.commit()
+        return self.stats
+
+    async def _resolve_problems(self, rows: List[ImportRow]) -> Dict[str, uuid.UUID]:
+        """Return slug -> problem id for every row, creating missing problems in one statement."""
+        by_slug = {row.slug: row for row in rows}
+        ids = await self._lookup_problems(by_slug.values())
+
+        missing = [row for slug, row in by_slug.items() if slug not in ids]
+        if missing:
+            values = [
+                {
+                    "id": uuid.uuid4(),
+                    "slug": row.slug,
+                    "title": row.title,
+                    "difficulty": row.difficulty,
+                    "url": row.url,
+                    "leetcode_id": row.leetcode_id,
+                }
+                for row in missing
+            ]
+            result = await self.db.execute(
+                dialect_insert(Problem).values(values).on_conflict_do_nothing().returning(Problem.id)
+            )
+            self.stats.problems_created += len(result.all())
+            ids.update(await self._lookup_problems(missing))
+        return ids
+
+    async def _lookup_problems(self, rows: Iterable[ImportRow]) -> Dict[str, uuid.UUID]:
+        """slug -> problem id, matching the slug first, then leetcode_id, then the exact title."""
+        rows = list(rows)
+        slugs = [row.slug for row in rows]
+        titles = {row.title: row.slug for row in rows}
+        numbers = {row.leetcode_id: row.slug for row in rows if row.leetcode_id is not None}
+        conditions = [Problem.slug.in_(slugs), Problem.title.in_(list(titles))]
+        if numbers:
+            conditions.append(Problem.leetcode_id.in_(list(numbers)))
+        result = await self.db.execute(
+            select(Problem.id, Problem.slug, Problem.title, Problem.leetcode_id).where(or_(*conditions))
+        )
+        ids: Dict[str, uuid.UUID] = {}
+        by_number: Dict[str, uuid.UUID] = {}
+        by_title: Dict[str, uuid.UUID] = {}
+        for problem_id, slug, title, leetcode_id in result.all():
+            if slug in slugs:
+                ids[slug] = problem_id
+            if leetcode_id in numbers:
+                by_number.setdefault(numbers[leetcode_id], problem_id)
+            if title in titles:
+                by_title.setdefault(titles[title], problem_id)
+        for matches in (by_number, by_title):
+            for slug, problem_id in matches.items():
+                ids.setdefault(slug, problem_id)
+        return ids
+
+    async def _apply_batch(self, rows: List[ImportRow]):
+        """Apply rows sorted oldest first; every batch after them holds later solves."""
+        problem_ids = await self._resolve_problems(rows)
+
+        result = await self.db.execute(
+            select(UserProblemProgress).where(
+                UserProblemProgress.user_id == self.user_id,
+                UserProblemProgress.problem_id.in_(list(set(problem_ids.values())))
+            )
+        )
+        states = {
+            p.problem_id: {
+                "id": p.id,
+                "easiness_factor": p.easiness_factor,
+                "interval": p.interval,
+                "repetitions": p.repetitions,
+                "times_solved": p.times_solved or 0,
+                "status": p.status,
+                "last_reviewed_at": p.last_reviewed_at,
+                "next_review_date": p.next_review_date,
+            }
+            for p in result.scalars()
+        }
+        existing = set(states)
+
+        sessions = []
+        for row in rows:
+            problem_id = problem_ids.get(row.slug)
+            if problem_id is None:
+                self.stats.rows_skipped += 1
+                continue
+
+            state = states.setdefault(problem_id, {
+                "id": uuid.uuid4(),
+                "easiness_factor": 2.5,
+                "interval": 0,
+                "repetitions": 0,
+                "times_solved": 0,
+                "status": "new",
+                "last_reviewed_at": None,
+                "next_review_date": None,
+            })
+            # One review per problem per local day; this also makes re-imports a no-op
+            solved_on = local_date(self.timezone, row.solved_at)
+            last = state["last_reviewed_at"]
+            if last is not None and local_date(self.timezone, last) >= solved_on:
+                self.stats.rows_skipped += 1
+                continue
+
+            new_interval, new_ease, new_repetitions = SpacedRepetitionService.calculate_next_review(
+                quality=row.quality,
+                ease_factor=state["easiness_factor"],
+                interval=state["interval"],
+                repetitions=state["repetitions"]
+            )
+            sessions.append({
+                "id": uuid.uuid4(),
+                "user_id": self.user_id,
+                "problem_id": problem_id,
+                "progress_id": state["id"],
+                "quality_rating": row.quality,
+                "solved_successfully": row.quality >= 3,
+                "ef_before": state["easiness_factor"],
+                "ef_after": new_ease,
+                "interval_before": state["interval"],
+                "interval_after": new_interval,
+                "session_date": solved_on,
+                "created_at": row.solved_at,
+            })
+            state.update(
+                easiness_factor=new_ease,
+                interval=new_interval,
+                repetitions=new_repetitions,
+                times_solved=state["times_solved"] + 1,
+                status=SpacedRepetitionService.status_for(new_repetitions, state["status"]),
+                last_reviewed_at=row.solved_at,
+                next_review_date=row.solved_at.date() + timedelta(days=new_interval),
+            )
+
+        touched = {s["problem_id"] for s in sessions}
+        if touched:
+            await self._upsert_progress({pid: states[pid] for pid in touched}, sessions)
+            await self.db.execute(insert(ReviewSession), sessions)
+            # Backdated sessions: their months' rollups must be redone
+            await mark_dirty_months(self.db, {session["session_date"] for session in sessions})
+
+            # Same counting as /solve: total_problems_solved grows once per day with a first solve
+            first_solves = await add_daily_solves(
+                self.db, self.user_id, Counter(session["session_date"] for session in sessions)
+            )
+            if first_solves:
+                await self.db.execute(
+                    update(User)
+                    .where(User.id == self.user_id)
+                    .values(total_problems_solved=func.coalesce(User.total_problems_solved, 0) + first_solves)
+                )
+            self.stats.problems_tracked += len(touched - existing)
+
+        await self.db.commit()
+        self.stats.reviews_applied += len(sessions)
+        self.stats.batches += 1
+        if self.on_progress:
+            self.on_progress(self.stats)
+
+    async def _upsert_progress(self, states: Dict[uuid.UUID, Dict[str, Any]], sessions: List[Dict[str, Any]]):
+        values = [
+            {
+                "id": state["id"],
+                "user_id": self.user_id,
+                "problem_id": problem_id,
+                "easiness_factor": state["easiness_factor"],
+                "interval": state["interval"],
+                "repetitions": state["repetitions"],
+                "times_solved": state["times_solved"],
+                "total_attempts": state["times_solved"],
+                "status": state["status"],
+                "last_reviewed_at": state["last_reviewed_at"],
+                "next_review_date": state["next_review_date"],
+            }
+            for problem_id, state in states.items()
+        ]
+        stmt = dialect_insert(UserProblemProgress).values(values)
+        updated = ("easiness_factor", "interval", "repetitions", "times_solved",
+                   "status", "last_reviewed_at", "next_review_date")
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserProblemProgress.user_id, UserProblemProgress.problem_id],
+            set_={
+                **{column: stmt.excluded[column] for column in updated},
+                "updated_at": datetime.utcnow(),  # ON CONFLICT skips the ORM's onupdate (/sync reads it)
+            },
+        ).returning(UserProblemProgress.problem_id, UserProblemProgress.id)
+        result = await self.db.execute(stmt)
+
+        # A concurrent /solve may have created the row first; point sessions at the surviving id
+        progress_ids = dict(result.all())
+        for session in sessions:
+            session["progress_id"] = progress_ids.get(session["problem_id"], session["progress_id"])
+
+
+def _print_progress(stats: ImportStats):
+    print(
+        f"📥 batch {stats.batches}: {stats.rows_read} rows read, "
+        f"{stats.reviews_applied} reviews applied, {stats.problems_created} problems created"
+    )
+
+
+async def main():
+    from app.database import AsyncSessionLocal
+
+    parser = argparse.ArgumentParser(description="Import LeetCode submission history for a user.")
+    parser.add_argument("path", help="CSV or NDJSON export file")
+    parser.add_argument("--user-id", help="UUID of the user to import into")
+    parser.add_argument("--email", help="Look the user up by email instead of id")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Override format detection")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if not args.user_id and not args.email:
+        parser.error("one of --user-id or --email is required")
+
+    async with AsyncSessionLocal() as db:
+        if args.user_id:
+            user_id = uuid.UUID(args.user_id)
+        else:
+            result = await db.execute(select(User.id).where(User.email == args.email))
+            user_id = result.scalar_one_or_none()
+            if user_id is None:
+                raise SystemExit(f"No user with email {args.email}")
+
+        importer = HistoryImporter(db, user_id, batch_size=args.batch_size, on_progress=_print_progress)
+        with open(args.path, newline="", encoding="utf-8") as f:
+            stats = await importer.run(iter_records(f, args.format or format_from_filename(args.path)))
+
+    print(f"✅ Import finished: {json.dumps(stats.as_dict())}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
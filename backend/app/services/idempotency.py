@@ -0,0 +1,168 @@
+"""
+Idempotency-Key support for retried writes (/solve, /analyze).
+
+The extension retries a request whose response was lost, which used to
+apply a solve twice (SM-2 advanced twice, daily stats and streak counted
+twice). A client now sends the same Idempotency-Key header on every attempt
+of one logical request:
+
+- the first attempt stores its response in idempotency_keys, in the same
+  transaction as the write, so the response exists exactly when the write does
+- a retry gets the stored response back (Idempotent-Replayed: true) from an
+  in-process LRU, or one primary-key lookup on another worker, without
+  redoing the work
+- two attempts racing each other: the loser's insert conflicts, it rolls
+  back its own transaction and replays the winner's response
+- a key reused with a different request body is rejected with 422
+
+Keys are scoped to the user and expire after IDEMPOTENCY_TTL_HOURS; expired
+rows are deleted at most hourly, by whichever write notices first.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import IS_SQLITE, dialect_insert
+from app.models import IdempotencyKey
+
+TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "1024"))
+MAX_KEY_LENGTH = 255
+PURGE_INTERVAL_SECONDS = 3600
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def request_hash(endpoint: str, payload: Dict[str, Any]) -> str:
+    """Fingerprint of the request a key was first used for."""
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{endpoint}\n{body}".encode()).hexdigest()
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _bind_time(at: datetime) -> datetime:
+    # The Postgres columns are TIMESTAMPTZ; compare with an aware value there
+    return at if IS_SQLITE else at.replace(tzinfo=timezone.utc)
+
+
+class IdempotencyStore:
+    """(user_id, key) -> stored response: a bounded LRU in front of the idempotency_keys table."""
+
+    def __init__(self, capacity: int = CACHE_SIZE, ttl_hours: float = TTL_HOURS):
+        self.capacity = capacity
+        self.ttl = timedelta(hours=ttl_hours)
+        self.entries: "OrderedDict[Tuple[uuid.UUID, str], Tuple[str, Any, datetime]]" = OrderedDict()
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.conflicts = 0
+        self.last_purge = 0.0
+
+    @staticmethod
+    def validate(key: str) -> str:
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+        return key
+
+    def _check(self, stored_hash: str, fingerprint: str):
+        if stored_hash != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+
+    def _remember(self, cache_key: Tuple[uuid.UUID, str], fingerprint: str, response: Any, expires_at: datetime):
+        self.entries[cache_key] = (fingerprint, response, expires_at)
+        self.entries.move_to_end(cache_key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    async def replay(self, db: AsyncSession, user_id: uuid.UUID, key: str, fingerprint: str) -> Optional[Any]:
+        """The stored response for this key, or None if the request has not completed yet."""
+        cache_key = (user_id, key)
+        now = datetime.utcnow()
+        cached = self.entries.get(cache_key)
+        if cached is not None:
+            if cached[2] > now:
+                self.entries.move_to_end(cache_key)
+                self._check(cached[0], fingerprint)
+                self.hits += 1
+                return cached[1]
+            del self.entries[cache_key]
+
+        row = (await db.execute(
+            select(IdempotencyKey.request_hash, IdempotencyKey.response, IdempotencyKey.expires_at)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        )).one_or_none()
+        if row is None or _naive_utc(row.expires_at) <= now:
+            self.misses += 1
+            return None
+        self._check(row.request_hash, fingerprint)
+        self.db_hits += 1
+        self._remember(cache_key, row.request_hash, row.response, _naive_utc(row.expires_at))
+        return row.response
+
+    async def record(self, db: AsyncSession, user_id: uuid.UUID, key: str, fingerprint: str, response: Any) -> bool:
+        """
+        Store the response in the caller's transaction, before it commits.
+        False when another attempt with this key got there first: the caller
+        rolls back and replays that attempt's response instead.
+        """
+        await self._purge_expired(db)
+        now = datetime.utcnow()
+        stmt = dialect_insert(IdempotencyKey).values(
+            user_id=user_id, key=key, request_hash=fingerprint, response=response,
+            created_at=now, expires_at=now + self.ttl
+        )
+        # A live row wins; an expired one not purged yet is taken over
+        result = await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[IdempotencyKey.user_id, IdempotencyKey.key],
+                set_={
+                    "request_hash": stmt.excluded.request_hash,
+                    "response": stmt.excluded.response,
+                    "created_at": stmt.excluded.created_at,
+                    "expires_at": stmt.excluded.expires_at,
+                },
+                where=IdempotencyKey.expires_at <= _bind_time(now),
+            ).returning(IdempotencyKey.key)
+        )
+        if result.scalar_one_or_none() is None:
+            self.conflicts += 1
+            return False
+        return True
+
+    def committed(self, user_id: uuid.UUID, key: str, fingerprint: str, response: Any):
+        """Cache a response once its transaction has committed (never before: it could still roll back)."""
+        self._remember((user_id, key), fingerprint, response, datetime.utcnow() + self.ttl)
+
+    async def _purge_expired(self, db: AsyncSession):
+        if time.monotonic() - self.last_purge < PURGE_INTERVAL_SECONDS:
+            return
+        self.last_purge = time.monotonic()
+        await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= _bind_time(datetime.utcnow())))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "conflicts": self.conflicts,
+        }
+
+
+idempotency = IdempotencyStore()
@@ -0,0 +1,418 @@
+"""
+Transactional outbox for /solve.
+
+/solve commits the SM-2 progress update and one `outbox_events` row in the
+same transaction and returns. Everything derived from a solve (the review
+session log, daily_stats, the user's streak and counters, pattern_mastery)
+is applied afterwards by OutboxConsumer, either in-process
+(OUTBOX_CONSUMER=inprocess, the default) or in a separate worker:
+
+    python -m app.services.outbox            # consume until stopped
+    python -m app.services.outbox --drain    # apply what is pending and exit
+
+A user's events are applied in id order, in batches; each batch runs in one
+transaction that also marks its events processed. The mark only matches rows
+still unprocessed, so an event another consumer already applied is never
+applied twice. On Postgres a per-user advisory lock keeps two consumers from
+interleaving one user's events. A batch that fails is retried one event at a
+time; an event that keeps failing is parked after OUTBOX_MAX_ATTEMPTS and
+reported as dead by /admin/outbox.
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, update, delete, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import IS_SQLITE, dialect_insert
+from app.models import OutboxEvent, User, ProblemPattern, ReviewSession, DailyStats, PatternMastery
+from app.services.session_rollups import mark_dirty_months, month_start
+from app.services.streaks import apply_active_days
+
+OUTBOX_CONSUMER = os.getenv("OUTBOX_CONSUMER", "inprocess")  # inprocess | external
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+RETENTION_HOURS = float(os.getenv("OUTBOX_RETENTION_HOURS", "72"))
+
+SOLVE_RECORDED = "solve_recorded"
+
+
+def enqueue(db: AsyncSession, user_id: uuid.UUID, event_type: str, payload: Dict[str, Any]) -> OutboxEvent:
+    """Add an event to the caller's transaction (caller commits)."""
+    event = OutboxEvent(user_id=user_id, event_type=event_type, payload=payload)
+    db.add(event)
+    return event
+
+
+def mastery_level(problems_solved: int, average_quality: float) -> str:
+    if problems_solved >= 15 and average_quality >= 4.0:
+        return "expert"
+    if problems_solved >= 8 and average_quality >= 3.5:
+        return "advanced"
+    if problems_solved >= 3:
+        return "intermediate"
+    return "beginner"
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """TIMESTAMPTZ columns come back timezone-aware from Postgres, naive from SQLite."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _pending():
+    return (OutboxEvent.processed_at.is_(None), OutboxEvent.attempts < MAX_ATTEMPTS)
+
+
+# ==========================================
+# Applying solve_recorded events
+# ==========================================
+
+async def _log_sessions(db: AsyncSession, user_id: uuid.UUID, events: List[OutboxEvent]):
+    for event in events:
+        solve = event.payload
+        db.add(ReviewSession(
+            user_id=user_id,
+            problem_id=uuid.UUID(solve["problem_id"]),
+            progress_id=uuid.UUID(solve["progress_id"]),
+            quality_rating=solve["quality"],
+            solved_successfully=solve["quality"] >= 3,
+            ef_before=solve["ef_before"],
+            ef_after=solve["ef_after"],
+            interval_before=solve["interval_before"],
+            interval_after=solve["interval_after"],
+            session_date=date.fromisoformat(solve["solved_on"]),
+        ))
+    # Usually the current month, which the rollup job redoes once it closes; an event applied
+    # after its month closed (consumer lag, local date behind UTC) marks that month instead
+    current = month_start(datetime.utcnow().date())
+    await mark_dirty_months(db, [
+        day for day in (date.fromisoformat(event.payload["solved_on"]) for event in events) if day < current
+    ])
+
+
+async def add_daily_solves(db: AsyncSession, user_id: uuid.UUID, per_day: Dict[date, int]) -> int:
+    """One atomic multi-row upsert; returns how many days got their first solve from these counts."""
+    if not per_day:
+        return 0
+    upsert = dialect_insert(DailyStats).values([
+        {"id": uuid.uuid4(), "user_id": user_id, "date": day, "problems_solved": count, "problems_reviewed": count}
+        for day, count in sorted(per_day.items())
+    ])
+    result = await db.execute(
+        upsert.on_conflict_do_update(
+            index_elements=[DailyStats.user_id, DailyStats.date],
+            set_={
+                "problems_solved": DailyStats.problems_solved + upsert.excluded.problems_solved,
+                "problems_reviewed": DailyStats.problems_reviewed + upsert.excluded.problems_reviewed,
+                "updated_at": datetime.utcnow(),  # ON CONFLICT skips the ORM's onupdate
+            },
+        ).returning(DailyStats.date, DailyStats.problems_solved)
+    )
+    # A day's total equal to this batch's count means the row was just created
+    return sum(1 for day, solved in result.all() if solved == per_day[day])
+
+
+async def _count_daily_stats(db: AsyncSession, user_id: uuid.UUID, events: List[OutboxEvent]) -> int:
+    return await add_daily_solves(db, user_id, Counter(date.fromisoformat(event.payload["solved_on"]) for event in events))
+
+
+async def _update_user_counters(db: AsyncSession, user_id: uuid.UUID, events: List[OutboxEvent], first_solves: int):
+    # solved_on is the user's local date, so streak days follow their timezone
+    await apply_active_days(db, user_id, {date.fromisoformat(event.payload["solved_on"]) for event in events})
+    if not first_solves:
+        return
+    await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(total_problems_solved=func.coalesce(User.total_problems_solved, 0) + first_solves)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _update_pattern_mastery(db: AsyncSession, user_id: uuid.UUID, events: List[OutboxEvent]):
+    problem_ids = {uuid.UUID(event.payload["problem_id"]) for event in events}
+    result = await db.execute(
+        select(ProblemPattern.problem_id, ProblemPattern.pattern_name)
+        .where(ProblemPattern.problem_id.in_(problem_ids))
+    )
+    patterns: Dict[uuid.UUID, List[str]] = defaultdict(list)
+    for problem_id, name in result.all():
+        patterns[problem_id].append(name)
+
+    practiced: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for event in events:
+        for name in patterns[uuid.UUID(event.payload["problem_id"])]:
+            practiced[name].append(event.payload)
+    if not practiced:
+        return
+
+    # Read-modify-write is safe here: this user's events are applied by one consumer at a time
+    result = await db.execute(
+        select(PatternMastery).where(
+            PatternMastery.user_id == user_id,
+            PatternMastery.pattern_name.in_(list(practiced)),
+        )
+    )
+    existing = {mastery.pattern_name: mastery for mastery in result.scalars()}
+    for name, solves in practiced.items():
+        mastery = existing.get(name)
+        if mastery is None:
+            mastery = PatternMastery(user_id=user_id, pattern_name=name, problems_solved=0, average_quality=0.0)
+            db.add(mastery)
+        before = mastery.problems_solved or 0
+        total = before + len(solves)
+        quality_sum = float(mastery.average_quality or 0) * before + sum(solve["quality"] for solve in solves)
+        mastery.problems_solved = total
+        mastery.average_quality = round(quality_sum / total, 2)
+        mastery.mastery_level = mastery_level(total, mastery.average_quality)
+        practiced_at = max(datetime.fromisoformat(solve["solved_at"]) for solve in solves)
+        if mastery.last_practiced_at is None or _naive_utc(mastery.last_practiced_at) < practiced_at:
+            mastery.last_practiced_at = practiced_at
+
+
+async def apply_solves(db: AsyncSession, user_id: uuid.UUID, events: List[OutboxEvent]):
+    """Everything /solve used to do after the SM-2 update, for a batch of one user's solves."""
+    await _log_sessions(db, user_id, events)
+    first_solves = await _count_daily_stats(db, user_id, events)
+    await _update_user_counters(db, user_id, events, first_solves)
+    await _update_pattern_mastery(db, user_id, events)
+
+
+HANDLERS = {SOLVE_RECORDED: apply_solves}
+
+
+# ==========================================
+# Consumer
+# ==========================================
+
+class OutboxConsumer:
+    def __init__(self, batch_size: int = BATCH_SIZE, poll_seconds: float = POLL_SECONDS):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._wake = asyncio.Event()
+        self.applied = 0
+        self.batches = 0
+        self.failures = 0
+        self.skipped_locked = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.last_pass_at: Optional[datetime] = None
+        self.last_pass_ms = 0.0
+        self.last_purge = 0.0
+
+    def wake(self):
+        """Called after a commit that enqueued events, so the in-process consumer does not wait for its poll."""
+        self._wake.set()
+
+    async def _apply_user_batch(self, user_id: uuid.UUID, limit: int) -> Optional[int]:
+        """Apply up to `limit` of a user's pending events in one transaction; None if it failed."""
+        from app.database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            if not IS_SQLITE:
+                locked = await db.execute(
+                    text("SELECT pg_try_advisory_xact_lock(hashtext(:key))"), {"key": f"outbox:{user_id}"}
+                )
+                if not locked.scalar():
+                    self.skipped_locked += 1
+                    return 0
+
+            result = await db.execute(
+                select(OutboxEvent)
+                .where(OutboxEvent.user_id == user_id, *_pending())
+                .order_by(OutboxEvent.id)
+                .limit(limit)
+            )
+            events = result.scalars().all()
+            if not events:
+                return 0
+
+            ids = [event.id for event in events]
+            now = datetime.utcnow()
+            try:
+                claimed = await db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_(ids), OutboxEvent.processed_at.is_(None))
+                    .values(processed_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+                if claimed.rowcount != len(ids):
+                    await db.rollback()  # another consumer applied some of them first
+                    return 0
+
+                by_type: Dict[str, List[OutboxEvent]] = defaultdict(list)
+                for event in events:
+                    by_type[event.event_type].append(event)
+                for event_type, typed in by_type.items():
+                    handler = HANDLERS.get(event_type)
+                    if handler is None:
+                        raise ValueError(f"unknown outbox event type {event_type!r}")
+                    await handler(db, user_id, typed)
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                if len(ids) == 1:
+                    await self._record_failure(ids[0], e)
+                return None
+
+        for event in events:
+            lag = (now - _naive_utc(event.created_at)).total_seconds()
+            self.lag_total += lag
+            self.lag_max = max(self.lag_max, lag)
+        self.applied += len(events)
+        self.batches += 1
+        return len(events)
+
+    async def _record_failure(self, event_id: int, error: Exception):
+        from app.database import AsyncSessionLocal
+
+        self.failures += 1
+        print(f"⚠️  Outbox event {event_id} failed: {error}")
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id == event_id)
+                .values(attempts=OutboxEvent.attempts + 1, last_error=str(error)[:1000])
+            )
+            await db.commit()
+
+    async def _process_user(self, user_id: uuid.UUID) -> int:
+        applied = await self._apply_user_batch(user_id, self.batch_size)
+        if applied is not None:
+            return applied
+        # The batch failed: go one event at a time, so the failing event is found
+        # and the user's later events stay queued behind it
+        applied = 0
+        while True:
+            count = await self._apply_user_batch(user_id, 1)
+            if not count:
+                return applied
+            applied += count
+
+    async def process_pending(self) -> int:
+        """One pass over the users with pending events, oldest event first."""
+        from app.database import AsyncSessionLocal
+
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(OutboxEvent.user_id)
+                .where(*_pending())
+                .group_by(OutboxEvent.user_id)
+                .order_by(func.min(OutboxEvent.id))
+                .limit(self.batch_size)
+            )
+            users = result.scalars().all()
+
+        applied = 0
+        for user_id in users:
+            applied += await self._process_user(user_id)
+        self.last_pass_at = datetime.utcnow()
+        self.last_pass_ms = (time.perf_counter() - started) * 1000
+        return applied
+
+    async def purge(self, retention_hours: float = RETENTION_HOURS) -> int:
+        """Delete processed events past the retention window (dead events are kept for inspection)."""
+        from app.database import AsyncSessionLocal
+
+        cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(delete(OutboxEvent).where(OutboxEvent.processed_at < cutoff))
+            await db.commit()
+        return result.rowcount or 0
+
+    async def drain(self) -> int:
+        total = 0
+        while True:
+            applied = await self.process_pending()
+            total += applied
+            if not applied:
+                return total
+
+    async def run_forever(self):
+        """Background loop: started from the app lifespan, or by this module's CLI as a separate worker."""
+        print(f"📬 Outbox consumer started (batch={self.batch_size}, poll={self.poll_seconds}s)")
+        while True:
+            self._wake.clear()
+            applied = 0
+            try:
+                applied = await self.process_pending()
+                if time.monotonic() - self.last_purge > 3600:
+                    self.last_purge = time.monotonic()
+                    purged = await self.purge()
+                    if purged:
+                        print(f"📬 Purged {purged} processed outbox events")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Outbox consumer error: {e}")
+            if applied:
+                continue  # more may be queued behind this pass
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def lag(self, db: AsyncSession) -> Dict[str, Any]:
+        """Backlog as seen in the database (covers events from every API worker)."""
+        result = await db.execute(
+            select(func.count(), func.min(OutboxEvent.created_at)).where(*_pending())
+        )
+        pending, oldest = result.one()
+        dead = (await db.execute(
+            select(func.count()).select_from(OutboxEvent).where(
+                OutboxEvent.processed_at.is_(None), OutboxEvent.attempts >= MAX_ATTEMPTS
+            )
+        )).scalar()
+        return {
+            "pending": pending,
+            "oldest_pending_seconds": round((datetime.utcnow() - _naive_utc(oldest)).total_seconds(), 1) if oldest else 0.0,
+            "dead": dead,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """This process's consumer counters."""
+        return {
+            "mode": OUTBOX_CONSUMER,
+            "applied": self.applied,
+            "batches": self.batches,
+            "failures": self.failures,
+            "skipped_locked": self.skipped_locked,
+            "avg_apply_lag_ms": round(self.lag_total / self.applied * 1000, 1) if self.applied else 0.0,
+            "max_apply_lag_ms": round(self.lag_max * 1000, 1),
+            "last_pass_at": self.last_pass_at.isoformat() if self.last_pass_at else None,
+            "last_pass_ms": round(self.last_pass_ms, 1),
+        }
+
+
+outbox_consumer = OutboxConsumer()
+
+
+async def main():
+    from app.database import engine
+
+    parser = argparse.ArgumentParser(description="Apply /solve outbox events (run with OUTBOX_CONSUMER=external on the API).")
+    parser.add_argument("--drain", action="store_true", help="Apply pending events and exit")
+    args = parser.parse_args()
+
+    try:
+        if args.drain:
+            applied = await outbox_consumer.drain()
+            print(f"✅ Outbox drained: {applied} events applied, {outbox_consumer.failures} failures")
+        else:
+            await outbox_consumer.run_forever()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+"""
+Per-pattern problem totals from the seeded catalog.
+
+Feeds the "total" column of /patterns. Counts problem_patterns rows:
+analyzed problems by their analysis' patterns, unanalyzed catalog problems
+by their dataset topics (so totals cover the catalog without --analyze).
+A pattern with no rows at all gets an estimate in /patterns instead.
+The catalog changes only when it is re-seeded or new problems are analyzed,
+so totals are cached in-process.
+"""
+import time
+from typing import Dict
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import ProblemPattern
+
+CACHE_TTL_SECONDS = 300
+
+# Index-only scan of idx_problem_patterns_pattern (pattern_name, problem_id)
+_PATTERN_TOTALS = (
+    select(ProblemPattern.pattern_name, func.count())
+    .group_by(ProblemPattern.pattern_name)
+)
+
+_cache: Dict[str, int] = {}
+_cached_at = 0.0
+
+
+async def catalog_pattern_totals(db: AsyncSession) -> Dict[str, int]:
+    """pattern name -> number of catalog problems tagged with it."""
+    global _cache, _cached_at
+    if time.monotonic() - _cached_at < CACHE_TTL_SECONDS:
+        return _cache
+
+    result = await db.execute(_PATTERN_TOTALS)
+    _cache = {name: total for name, total in result.all()}
+    _cached_at = time.monotonic()
+    return _cache
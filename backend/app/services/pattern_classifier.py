@@ -0,0 +1,71 @@
+"""
+Keyword-based pattern classifier used when Gemini is unavailable.
+
+Far less accurate than the LLM, but instant and local: it lets /analyze
+return a pattern-only answer during provider incidents instead of failing.
+"""
+import re
+from typing import Any, Dict, List, Tuple
+
+# (pattern, [(phrase, weight), ...]); phrases are matched on word boundaries
+PATTERN_RULES: List[Tuple[str, List[Tuple[str, float]]]] = [
+    ("Hash Map", [("two numbers", 2), ("indices", 1), ("frequency", 2), ("anagram", 3), ("duplicate", 2), ("count", 1)]),
+    ("Two Pointers", [("two pointers", 4), ("sorted array", 2), ("palindrome", 2), ("in-place", 2), ("pair", 1)]),
+    ("Sliding Window", [("substring", 3), ("subarray", 2), ("contiguous", 2), ("window", 3), ("at most k", 3), ("without repeating", 2), ("consecutive", 1)]),
+    ("Binary Search", [("sorted", 2), ("log n", 3), ("rotated", 3), ("search", 1), ("minimum possible", 2), ("peak", 2)]),
+    ("Dynamic Programming", [("number of ways", 4), ("maximum profit", 3), ("minimum cost", 3), ("subsequence", 3), ("climb", 3), ("partition", 2)]),
+    ("Backtracking", [("all possible", 3), ("permutations", 4), ("combinations", 4), ("subsets", 4), ("n-queens", 5), ("generate all", 3)]),
+    ("Stack", [("parentheses", 4), ("brackets", 3), ("next greater", 4), ("monotonic", 3), ("evaluate", 2)]),
+    ("Linked List", [("linked list", 5), ("listnode", 4), ("head", 1)]),
+    ("Tree", [("binary tree", 5), ("root", 2), ("bst", 4), ("ancestor", 3), ("depth", 2)]),
+    ("Graph", [("graph", 4), ("edges", 3), ("grid", 2), ("islands", 4), ("connected", 2), ("neighbors", 2)]),
+    ("Topological Sort", [("prerequisites", 5), ("course", 2), ("dependencies", 3), ("ordering", 2)]),
+    ("Heap", [("kth largest", 5), ("k-th largest", 5), ("top k", 4), ("k closest", 4), ("median", 3), ("priority", 2)]),
+    ("Intervals", [("intervals", 5), ("overlapping", 3), ("meeting", 3), ("merge", 1)]),
+    ("Greedy", [("minimum number of", 2), ("jump", 3), ("maximize", 1), ("minimize", 1)]),
+    ("Trie", [("prefix", 3), ("trie", 5), ("dictionary", 2), ("words", 1)]),
+    ("Union Find", [("union", 3), ("disjoint", 4), ("connected components", 4), ("redundant", 3)]),
+    ("Bit Manipulation", [("xor", 4), ("bit", 3), ("single number", 4), ("binary representation", 3)]),
+]
+
+_COMPILED = [
+    (pattern, [(phrase, re.compile(r"\b" + re.escape(phrase) + r"\b"), weight) for phrase, weight in rules])
+    for pattern, rules in PATTERN_RULES
+]
+
+
+def classify_patterns(description: str, limit: int = 3) -> List[Dict[str, Any]]:
+    """Return up to `limit` patterns in the same shape Gemini uses."""
+    text = (description or "").lower()
+    scored = []
+    for pattern, rules in _COMPILED:
+        hits = [(phrase, weight) for phrase, regex, weight in rules if regex.search(text)]
+        score = sum(weight for _, weight in hits)
+        if score >= 2:
+            scored.append((score, pattern, hits))
+
+    scored.sort(reverse=True)
+    return [
+        {
+            "name": pattern,
+            # Capped well below LLM confidences so consumers can tell the difference
+            "confidence": round(min(0.6, score / 10), 2),
+            "reason": "Keyword match: " + ", ".join(phrase for phrase, _ in hits[:3]),
+        }
+        for score, pattern, hits in scored[:limit]
+    ]
+
+
+def degraded_analysis(description: str) -> Dict[str, Any]:
+    """Analysis-shaped response built only from the local classifier."""
+    return {
+        "patterns": classify_patterns(description),
+        "time_complexity": "Unavailable (AI analysis temporarily offline)",
+        "space_complexity": "Unavailable (AI analysis temporarily offline)",
+        "difficulty_analysis": "",
+        "key_insight": "AI analysis is temporarily unavailable; patterns were estimated from keywords.",
+        "prerequisites": [],
+        "similar_problems": [],
+        "degraded": True,
+        "source": "local_classifier",
+    }
@@ -0,0 +1,324 @@
+"""
+Canonical problem identity.
+
+Problems are identified by their LeetCode slug (derived from the URL, or from
+the title when there is no URL) and looked up through the unique slug index
+instead of by exact title, so whitespace or casing differences no longer
+create duplicate rows (the history import also matches on leetcode_id). A small in-process LRU maps
+slug -> problem id for the hot path.
+
+Rows created before slugs were tracked are found by normalized title and
+adopt the slug on first touch. Duplicates that already exist are folded
+together by the merge job, which also points queued outbox events at the
+surviving rows so they still apply:
+
+Usage:
+    python -m app.services.problem_identity --merge --dry-run
+    python -m app.services.problem_identity --merge
+"""
+import argparse
+import asyncio
+import os
+import uuid
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import dialect_insert
+from app.models import Problem, ProblemPattern, UserProblemProgress, ReviewSession, OutboxEvent
+from app.services.problem_patterns import sync_problem_patterns
+from app.services.sync import record_deletions, PROBLEM, PROGRESS
+from app.services.history_import import slug_from_url, slugify_title
+
+CACHE_SIZE = int(os.getenv("PROBLEM_ID_CACHE_SIZE", "4096"))
+
+
+def normalize_title(title: str) -> str:
+    return " ".join((title or "").split())
+
+
+def canonical_slug(url: Optional[str], title: Optional[str] = None) -> Optional[str]:
+    """Slug from the problem URL, falling back to one derived from the title."""
+    return slug_from_url(url) or (slugify_title(normalize_title(title)) if title else None) or None
+
+
+class ProblemIdCache:
+    """Bounded slug -> problem id LRU."""
+
+    def __init__(self, capacity: int = CACHE_SIZE):
+        self.capacity = capacity
+        self.entries: "OrderedDict[str, uuid.UUID]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, slug: str) -> Optional[uuid.UUID]:
+        problem_id = self.entries.get(slug)
+        if problem_id is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(slug)
+        self.hits += 1
+        return problem_id
+
+    def put(self, slug: str, problem_id: uuid.UUID):
+        self.entries[slug] = problem_id
+        self.entries.move_to_end(slug)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def discard(self, slug: str):
+        self.entries.pop(slug, None)
+
+    def clear(self):
+        self.entries.clear()
+
+
+problem_ids = ProblemIdCache()
+
+
+async def find_problem(db: AsyncSession, title: str, url: Optional[str]) -> Optional[Problem]:
+    """Existing problem for this title/URL, by slug first and normalized title last."""
+    slug = canonical_slug(url, title)
+    if slug:
+        problem_id = problem_ids.get(slug)
+        if problem_id is not None:
+            problem = await db.get(Problem, problem_id)
+            if problem is not None:
+                return problem
+            problem_ids.discard(slug)  # merged or deleted since it was cached
+
+    problem = None
+    if slug:
+        result = await db.execute(select(Problem).where(Problem.slug == slug))
+        problem = result.scalar_one_or_none()
+
+    if problem is None:
+        # Legacy rows created by title only; they adopt the slug (persisted with the caller's commit)
+        result = await db.execute(
+            select(Problem)
+            .where(func.lower(func.trim(Problem.title)) == normalize_title(title).lower())
+            .order_by(Problem.slug.is_(None), Problem.created_at)
+            .limit(1)
+        )
+        problem = result.scalar_one_or_none()
+        if problem is not None and problem.slug is None and slug:
+            problem.slug = slug
+
+    if problem is not None and problem.slug:
+        problem_ids.put(problem.slug, problem.id)
+    return problem
+
+
+async def get_or_create_problem(
+    db: AsyncSession,
+    title: str,
+    url: Optional[str],
+    difficulty: Optional[str] = None,
+    description: Optional[str] = None,
+) -> Problem:
+    """find_problem, or insert a new row; a concurrent insert of the same slug is resolved by re-reading."""
+    problem = await find_problem(db, title, url)
+    if problem is not None:
+        return problem
+
+    slug = canonical_slug(url, title)
+    result = await db.execute(
+        dialect_insert(Problem)
+        .values(
+            id=uuid.uuid4(),
+            title=normalize_title(title),
+            slug=slug,
+            difficulty=difficulty,
+            url=url,
+            description=description,
+        )
+        .on_conflict_do_nothing()
+        .returning(Problem.id)
+    )
+    problem_id = result.scalar_one_or_none()
+    if problem_id is None:
+        problem = await find_problem(db, title, url)
+        if problem is None:
+            raise RuntimeError(f"Could not resolve problem {title!r} after a conflicting insert")
+        return problem
+
+    if slug:
+        problem_ids.put(slug, problem_id)
+    return await db.get(Problem, problem_id)
+
+
+# ==========================================
+# One-off duplicate merge
+# ==========================================
+
+def _merge_key(problem: Problem) -> Optional[str]:
+    return problem.slug or canonical_slug(problem.url, problem.title)
+
+
+def _pick_keeper(problems: List[Problem]) -> Problem:
+    """Prefer the row that already owns the slug, then one with an analysis, then the oldest."""
+    return min(
+        problems,
+        key=lambda p: (p.slug is None, p.cached_analysis is None, p.created_at or datetime.max),
+    )
+
+
+async def _merge_progress(
+    db: AsyncSession, keeper: Problem, duplicate: Problem, progress_map: Dict[str, str]
+) -> int:
+    """
+    Move a duplicate's progress onto the keeper, combining rows for users who have both.
+    Deleted progress ids are added to progress_map (old id -> surviving id).
+    """
+    result = await db.execute(
+        select(UserProblemProgress).where(UserProblemProgress.problem_id.in_([keeper.id, duplicate.id]))
+    )
+    by_user: Dict[uuid.UUID, Dict[uuid.UUID, UserProblemProgress]] = defaultdict(dict)
+    for progress in result.scalars():
+        by_user[progress.user_id][progress.problem_id] = progress
+
+    combined = 0
+    deletions = []
+    for user_id, rows in by_user.items():
+        moved = rows.get(duplicate.id)
+        if moved is None:
+            continue
+        deletions.append((user_id, PROBLEM, duplicate.id))  # gone from this user's /sync replica
+        kept = rows.get(keeper.id)
+        if kept is None:
+            moved.problem_id = keeper.id
+            continue
+
+        # Both exist: the most recently reviewed row carries the SM-2 schedule, counters add up
+        if (moved.last_reviewed_at or moved.created_at or datetime.min) > (kept.last_reviewed_at or kept.created_at or datetime.min):
+            for field in ("easiness_factor", "interval", "repetitions", "next_review_date",
+                          "last_reviewed_at", "status"):
+                setattr(kept, field, getattr(moved, field))
+        kept.times_solved = (kept.times_solved or 0) + (moved.times_solved or 0)
+        kept.total_attempts = (kept.total_attempts or 0) + (moved.total_attempts or 0)
+        kept.personal_notes = kept.personal_notes or moved.personal_notes
+        await db.execute(
+            update(ReviewSession)
+            .where(ReviewSession.progress_id == moved.id)
+            .values(progress_id=kept.id)
+        )
+        # Core delete: an ORM delete would try to lazy-load the row's sessions
+        await db.execute(delete(UserProblemProgress).where(UserProblemProgress.id == moved.id))
+        db.expunge(moved)
+        progress_map[str(moved.id)] = str(kept.id)
+        deletions.append((user_id, PROGRESS, moved.id))
+        combined += 1
+    await record_deletions(db, deletions)
+    return combined
+
+
+async def _remap_pending_events(
+    db: AsyncSession, problem_map: Dict[str, str], progress_map: Dict[str, str]
+) -> int:
+    """
+    Point unapplied outbox events at the surviving problem / progress rows, in the
+    merge's transaction: their payloads carry the ids of rows the merge deletes.
+    """
+    result = await db.execute(
+        select(OutboxEvent)
+        .where(
+            OutboxEvent.processed_at.is_(None),
+            OutboxEvent.payload["problem_id"].as_string().in_(list(problem_map)),
+        )
+        .with_for_update()
+    )
+    remapped = 0
+    for event in result.scalars():
+        payload = dict(event.payload)
+        payload["problem_id"] = problem_map[payload["problem_id"]]
+        if payload.get("progress_id") in progress_map:
+            payload["progress_id"] = progress_map[payload["progress_id"]]
+        event.payload = payload  # reassigned: JSON columns do not track in-place changes
+        remapped += 1
+    return remapped
+
+
+async def merge_duplicates(db: AsyncSession, dry_run: bool = False) -> Dict[str, int]:
+    """Fold problems that share a canonical slug into one row each."""
+    result = await db.execute(select(Problem).order_by(Problem.created_at))
+    groups: Dict[str, List[Problem]] = defaultdict(list)
+    for problem in result.scalars():
+        key = _merge_key(problem)
+        if key:
+            groups[key].append(problem)
+
+    stats = {"groups": 0, "problems_removed": 0, "progress_combined": 0, "events_remapped": 0}
+    for slug, problems in groups.items():
+        if len(problems) < 2:
+            continue
+        keeper = _pick_keeper(problems)
+        duplicates = [p for p in problems if p.id != keeper.id]
+        stats["groups"] += 1
+        stats["problems_removed"] += len(duplicates)
+        print(f"🔗 {slug}: keeping {keeper.title!r}, merging {[p.title for p in duplicates]}")
+        if dry_run:
+            continue
+
+        # Release unique values held by duplicates before the keeper takes them over
+        leetcode_id = keeper.leetcode_id or next((p.leetcode_id for p in duplicates if p.leetcode_id), None)
+        for duplicate in duplicates:
+            if not keeper.cached_analysis and duplicate.cached_analysis:
+                keeper.cached_analysis = duplicate.cached_analysis
+                keeper.patterns = duplicate.patterns
+                keeper.analysis_model = duplicate.analysis_model
+                keeper.analysis_prompt_hash = duplicate.analysis_prompt_hash
+                keeper.analyzed_at = duplicate.analyzed_at
+            keeper.description = keeper.description or duplicate.description
+            keeper.difficulty = keeper.difficulty or duplicate.difficulty
+            keeper.url = keeper.url or duplicate.url
+            duplicate.slug = None
+            duplicate.leetcode_id = None
+        await db.flush()
+        keeper.slug = slug
+        keeper.leetcode_id = leetcode_id
+
+        progress_map: Dict[str, str] = {}
+        for duplicate in duplicates:
+            stats["progress_combined"] += await _merge_progress(db, keeper, duplicate, progress_map)
+            await db.execute(
+                update(ReviewSession)
+                .where(ReviewSession.problem_id == duplicate.id)
+                .values(problem_id=keeper.id)
+            )
+            await db.flush()
+            await db.execute(delete(ProblemPattern).where(ProblemPattern.problem_id == duplicate.id))
+            await db.execute(delete(Problem).where(Problem.id == duplicate.id))
+            db.expunge(duplicate)
+        stats["events_remapped"] += await _remap_pending_events(
+            db, {str(duplicate.id): str(keeper.id) for duplicate in duplicates}, progress_map
+        )
+        await sync_problem_patterns(db, keeper)  # may have adopted a duplicate's analysis
+        await db.commit()
+
+    problem_ids.clear()
+    return stats
+
+
+async def main():
+    from app.database import AsyncSessionLocal
+
+    parser = argparse.ArgumentParser(description="Canonical problem identity maintenance.")
+    parser.add_argument("--merge", action="store_true", help="Fold duplicate problem rows together")
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would be merged")
+    args = parser.parse_args()
+
+    if not args.merge:
+        parser.error("nothing to do (use --merge)")
+
+    async with AsyncSessionLocal() as db:
+        stats = await merge_duplicates(db, dry_run=args.dry_run)
+    print(f"✅ Duplicate merge {'(dry run) ' if args.dry_run else ''}finished: {stats}")
+    if stats["problems_removed"] and not args.dry_run:
+        print("ℹ️  Rebuild the similarity index: python -m app.services.similarity_index --rebuild")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
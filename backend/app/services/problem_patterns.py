@@ -0,0 +1,180 @@
+"""
+Normalized problem -> pattern rows.
+
+Problem.patterns keeps the analysis' pattern list as JSON for display, and
+problem_patterns holds one (problem_id, pattern_name, confidence) row per
+entry. Pattern reads (/patterns, /patterns/{name}/problems, /patterns/{name}/due,
+the catalog totals and pattern mastery) join this table on its
+(pattern_name, problem_id) index instead of unpacking JSON.
+
+Catalog problems that have not been analyzed get rows from their dataset
+topics (mapped through TOPIC_PATTERNS where LeetCode's tag differs from the
+analysis' usual name), so catalog totals cover them too; an analysis replaces
+those rows.
+
+store_analysis() re-syncs a problem's rows whenever its analysis changes, and
+the catalog seed writes topic rows as it upserts. backfill() fills rows for
+problems tagged before the table existed; it runs once in the background at
+startup and can be run by hand:
+
+    python -m app.services.problem_patterns --backfill
+"""
+import argparse
+import asyncio
+import os
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select, delete, insert, exists, or_, cast, String
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from app.models import Problem, ProblemPattern
+
+AUTO_BACKFILL = os.getenv("PROBLEM_PATTERNS_AUTO_BACKFILL", "true").lower() == "true"
+BACKFILL_BATCH_SIZE = 500
+MAX_NAME_LENGTH = 100  # pattern_name is VARCHAR(100), as in pattern_mastery
+
+# LeetCode topic tag -> the pattern name analyses use for it (other tags are used as is)
+TOPIC_PATTERNS = {
+    "Hash Table": "Hash Map",
+    "Heap (Priority Queue)": "Heap",
+}
+
+
+def _confidence(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def topic_patterns(topics: Optional[Iterable[Any]]) -> List[str]:
+    """Dataset topic tags as pattern names."""
+    if not isinstance(topics, list):
+        return []
+    return [TOPIC_PATTERNS.get(topic.strip(), topic.strip()) for topic in topics if isinstance(topic, str)]
+
+
+def pattern_entries(problem: Problem) -> Dict[str, Optional[float]]:
+    """
+    pattern name -> confidence for a problem. Entries are {"name", "confidence"}
+    objects or plain strings; repeated names keep their highest confidence.
+    Falls back to cached_analysis when the patterns column is empty, and to the
+    catalog topics when the problem has not been analyzed.
+    """
+    patterns = problem.patterns
+    if not patterns and isinstance(problem.cached_analysis, dict):
+        patterns = problem.cached_analysis.get("patterns")
+    if not patterns and problem.cached_analysis is None:
+        patterns = topic_patterns(problem.topics)
+    if not isinstance(patterns, list):
+        return {}
+
+    entries: Dict[str, Optional[float]] = {}
+    for pattern in patterns:
+        name, confidence = (pattern.get("name"), _confidence(pattern.get("confidence"))) \
+            if isinstance(pattern, dict) else (pattern, None)
+        if not isinstance(name, str) or not name.strip():
+            continue
+        name = name.strip()[:MAX_NAME_LENGTH]
+        if name not in entries or (confidence or 0) > (entries[name] or 0):
+            entries[name] = confidence
+    return entries
+
+
+async def sync_problem_patterns(db: AsyncSession, problem: Problem) -> int:
+    """Replace a problem's pattern rows with its current patterns (caller commits)."""
+    if problem.id is None or problem in db.new:
+        await db.flush()  # the rows reference problems.id
+    await db.execute(delete(ProblemPattern).where(ProblemPattern.problem_id == problem.id))
+    entries = pattern_entries(problem)
+    if entries:
+        await db.execute(insert(ProblemPattern), [
+            {"problem_id": problem.id, "pattern_name": name, "confidence": confidence}
+            for name, confidence in entries.items()
+        ])
+    return len(entries)
+
+
+async def sync_topic_patterns(db: AsyncSession, topics: Dict[uuid.UUID, Any]) -> int:
+    """Replace the rows of unanalyzed catalog problems (id -> topics) with their topic rows (caller commits)."""
+    if not topics:
+        return 0
+    await db.execute(delete(ProblemPattern).where(ProblemPattern.problem_id.in_(list(topics))))
+    rows = [
+        {"problem_id": problem_id, "pattern_name": name, "confidence": None}
+        for problem_id, tags in topics.items()
+        for name in dict.fromkeys(name[:MAX_NAME_LENGTH] for name in topic_patterns(tags) if name)
+    ]
+    if rows:
+        await db.execute(insert(ProblemPattern), rows)
+    return len(rows)
+
+
+async def backfill(db: AsyncSession, batch_size: int = BACKFILL_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Create rows for analyzed or topic-tagged problems that have none, in keyset-paginated
+    batches. Problems without a pattern list (no analysis and no topics, or an analysis
+    with no patterns) get no rows and no writes, so a filled table makes this a read-only pass.
+    """
+    stats = {"problems": 0, "rows": 0}
+    last_id = None
+    while True:
+        query = (
+            select(Problem)
+            .options(load_only(Problem.id, Problem.patterns, Problem.cached_analysis, Problem.topics))
+            # patterns and topics default to [], not NULL
+            .where(or_(Problem.cached_analysis.isnot(None), cast(Problem.topics, String) != "[]"))
+            .where(~exists().where(ProblemPattern.problem_id == Problem.id))
+            .order_by(Problem.id)
+            .limit(batch_size)
+        )
+        if last_id is not None:
+            query = query.where(Problem.id > last_id)
+        problems = (await db.execute(query)).scalars().all()
+        if not problems:
+            break
+        for problem in problems:
+            if not pattern_entries(problem):
+                continue  # nothing to store, and no rows to delete
+            stats["problems"] += 1
+            stats["rows"] += await sync_problem_patterns(db, problem)
+        await db.commit()
+        last_id = problems[-1].id
+    return stats
+
+
+async def run_backfill():
+    """Background backfill started from the app lifespan."""
+    from app.database import AsyncSessionLocal
+
+    try:
+        async with AsyncSessionLocal() as db:
+            stats = await backfill(db)
+        if stats["problems"]:
+            print(f"🏷️  Backfilled problem_patterns: {stats}")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"problem_patterns backfill failed: {e}")
+
+
+async def main():
+    from app.database import AsyncSessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Maintain the normalized problem_patterns table.")
+    parser.add_argument("--backfill", action="store_true", help="Create rows for problems that have none")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error("nothing to do (use --backfill)")
+
+    async with AsyncSessionLocal() as db:
+        stats = await backfill(db, args.batch_size)
+    print(f"✅ problem_patterns backfill finished: {stats}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,307 @@
+"""
+Opt-in sampling profiler for single requests.
+
+A request is profiled when it carries `X-Profile: 1` together with a valid
+`X-Admin-Token`, or when it falls in the PROFILE_SAMPLE_RATE fraction of
+requests. A sampler thread then reads the request task's stack every
+PROFILE_INTERVAL_MS:
+
+- while the event loop thread is executing the request, the real thread
+  stack (including synchronous work such as ORM hydration or JSON encoding);
+- while the request is suspended, the chain of awaiting coroutines, ending
+  in an "(awaiting)" frame, so time spent waiting on the database, Supabase
+  or Gemini shows up under the code that awaited it.
+
+Each profile is written to PROFILE_DIR in speedscope's sampled format
+(open it at https://www.speedscope.app), with a small summary next to it;
+only the newest PROFILE_MAX_FILES are kept. Profiled responses carry an
+`X-Profile-Id` header. When a request is not profiled the middleware does
+one header scan and one random() call.
+"""
+import asyncio
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+PROFILE_DIR = Path(os.getenv(
+    "PROFILE_DIR",
+    Path(__file__).resolve().parent.parent.parent / ".cache" / "profiles"
+))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # fraction of requests, 0 disables
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+
+_PROFILE_SUFFIX = ".speedscope.json"
+_SUMMARY_SUFFIX = ".summary.json"
+_UNSAFE = re.compile(r"[^A-Za-z0-9]+")
+_PROFILE_ID = re.compile(r"^\d{8}T\d{12}-[A-Z]+-[A-Za-z0-9_]+$")
+
+# (name, file, first line) identifies a function across samples
+FrameKey = Tuple[str, str, int]
+AWAITING: FrameKey = ("(awaiting)", "", 0)
+
+
+def _frame_key(frame) -> FrameKey:
+    code = frame.f_code
+    return (getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+
+
+def _next_awaitable(obj):
+    """The object a coroutine / generator-based awaitable is suspended on."""
+    if hasattr(obj, "cr_await"):
+        return obj.cr_await
+    return getattr(obj, "gi_yieldfrom", None)
+
+
+# asyncio's loop -> running task map; read from the sampler thread to tell
+# "executing now" from "suspended" (the GIL makes the lookup safe)
+_current_tasks = getattr(asyncio.tasks, "_current_tasks", {})
+
+
+class RequestSampler(threading.Thread):
+    """Samples one request task from a side thread until stopped."""
+
+    def __init__(self, task: asyncio.Task, root_frame, loop_thread_id: int, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.task = task
+        self.loop = task.get_loop()
+        self.root_frame = root_frame  # the middleware frame: stacks start here
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.recording = False  # only while the handler runs, not during thread start/join
+        self.samples: List[Tuple[Tuple[FrameKey, ...], float]] = []
+        self._stopped = threading.Event()
+
+    def _await_chain(self) -> List[FrameKey]:
+        """Coroutines from the middleware down to the innermost one (suspended or running)."""
+        chain: List[FrameKey] = []
+        recording = False
+        awaitable = self.task.get_coro()
+        while awaitable is not None:
+            frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+            if frame is None:
+                break  # a future or other leaf awaitable
+            recording = recording or frame is self.root_frame
+            if recording:
+                chain.append(_frame_key(frame))
+            awaitable = _next_awaitable(awaitable)
+        return chain
+
+    def _sample(self) -> List[FrameKey]:
+        if _current_tasks.get(self.loop) is not self.task:
+            return self._await_chain() + [AWAITING]
+
+        frames = []
+        frame = sys._current_frames().get(self.loop_thread_id)
+        while frame is not None:
+            frames.append(frame)
+            if frame is self.root_frame:
+                return [_frame_key(f) for f in reversed(frames)]
+            frame = frame.f_back
+        # Executing on a separate stack (SQLAlchemy's greenlet for ORM work):
+        # graft it onto the coroutine chain that switched into it
+        return self._await_chain() + [_frame_key(f) for f in reversed(frames)]
+
+    def run(self):
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            now = time.perf_counter()
+            if self.recording:
+                self.samples.append((tuple(self._sample()), now - last))
+            last = now
+
+    def stop(self):
+        self.recording = False
+        self._stopped.set()
+        self.join()
+
+
+def _speedscope(name: str, samples: List[Tuple[Tuple[FrameKey, ...], float]]) -> Dict[str, Any]:
+    frames: List[Dict[str, Any]] = []
+    index: Dict[FrameKey, int] = {}
+    stacks, weights = [], []
+    for stack, weight in samples:
+        ids = []
+        for key in stack:
+            if key not in index:
+                index[key] = len(frames)
+                frame = {"name": key[0]}
+                if key[1]:
+                    frame.update(file=key[1], line=key[2])
+                frames.append(frame)
+            ids.append(index[key])
+        stacks.append(ids)
+        weights.append(round(weight * 1000, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "leetcode-companion",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": round(sum(weights), 3),
+            "samples": stacks,
+            "weights": weights,
+        }],
+    }
+
+
+def _summarize(samples: List[Tuple[Tuple[FrameKey, ...], float]], limit: int = 10) -> Dict[str, Any]:
+    """On-CPU vs awaiting split and the functions with the most self time."""
+    on_cpu = awaiting = 0.0
+    self_time: Counter = Counter()
+    for stack, weight in samples:
+        waiting = stack[-1] == AWAITING
+        if waiting:
+            awaiting += weight
+            stack = stack[:-1]
+        else:
+            on_cpu += weight
+        if stack:
+            name, filename, line = stack[-1]
+            self_time[(name, f"{filename}:{line}", "awaiting" if waiting else "cpu")] += weight
+    return {
+        "on_cpu_ms": round(on_cpu * 1000, 1),
+        "awaiting_ms": round(awaiting * 1000, 1),
+        "top_self": [
+            {"function": name, "location": location, "state": state, "ms": round(seconds * 1000, 1)}
+            for (name, location, state), seconds in self_time.most_common(limit)
+        ],
+    }
+
+
+class ProfileStore:
+    """Rotating directory of speedscope profiles with a JSON summary beside each."""
+
+    def __init__(self, directory: Path = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def save(self, summary: Dict[str, Any], profile: Dict[str, Any]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile_id = summary["id"]
+        (self.directory / f"{profile_id}{_PROFILE_SUFFIX}").write_text(json.dumps(profile))
+        (self.directory / f"{profile_id}{_SUMMARY_SUFFIX}").write_text(json.dumps(summary))
+        self._rotate()
+
+    def _rotate(self):
+        summaries = sorted(self.directory.glob(f"*{_SUMMARY_SUFFIX}"))
+        for old in summaries[:max(0, len(summaries) - self.max_files)]:
+            profile_id = old.name[:-len(_SUMMARY_SUFFIX)]
+            old.unlink(missing_ok=True)
+            (self.directory / f"{profile_id}{_PROFILE_SUFFIX}").unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries, newest first (ids start with a UTC timestamp)."""
+        if not self.directory.exists():
+            return []
+        summaries = []
+        for path in sorted(self.directory.glob(f"*{_SUMMARY_SUFFIX}"), reverse=True):
+            try:
+                summaries.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue  # rotated away or half-written by another worker
+        return summaries
+
+    def path(self, profile_id: str) -> Optional[Path]:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}{_PROFILE_SUFFIX}"
+        return path if path.exists() else None
+
+
+profile_store = ProfileStore()
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _requested_by_admin(scope) -> bool:
+    if _header(scope, b"x-profile") not in ("1", "true"):
+        return False
+    expected = os.getenv("ADMIN_TOKEN")
+    token = _header(scope, b"x-admin-token")
+    return bool(expected and token and hmac.compare_digest(token, expected))
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware: the handler must run in this task for the sampler to follow it."""
+
+    def __init__(self, app, store: ProfileStore = profile_store):
+        self.app = app
+        self.store = store
+        self.active = 0
+        self.profiled = 0
+
+    def _trigger(self, scope) -> Optional[str]:
+        if _requested_by_admin(scope):
+            return "header"
+        if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trigger = self._trigger(scope)
+        if trigger is None or self.active >= PROFILE_MAX_CONCURRENT:
+            return await self.app(scope, receive, send)
+
+        started_at = datetime.utcnow()
+        profile_id = f"{started_at:%Y%m%dT%H%M%S%f}-{scope['method']}-{_UNSAFE.sub('_', scope['path']).strip('_') or 'root'}"
+        status = {"code": None}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler = RequestSampler(
+            asyncio.current_task(), sys._getframe(), threading.get_ident(), PROFILE_INTERVAL_MS / 1000
+        )
+        self.active += 1
+        start = time.perf_counter()
+        sampler.start()
+        sampler.recording = True
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            # Stopping joins the sampler thread: at most one interval, and only on profiled requests
+            sampler.stop()
+            self.active -= 1
+            duration = time.perf_counter() - start
+            name = f"{scope['method']} {scope['path']}"
+            summary = {
+                "id": profile_id,
+                "request": name,
+                "status": status["code"],
+                "trigger": trigger,
+                "started_at": started_at.isoformat(),
+                "duration_ms": round(duration * 1000, 1),
+                "samples": len(sampler.samples),
+                "interval_ms": PROFILE_INTERVAL_MS,
+                **_summarize(sampler.samples),
+            }
+            try:
+                await asyncio.to_thread(self.store.save, summary, _speedscope(name, sampler.samples))
+                self.profiled += 1
+            except OSError as e:
+                print(f"⚠️  Could not save profile {profile_id}: {e}")
@@ -0,0 +1,126 @@
+"""
+Prompt preprocessing for Gemini analysis.
+
+Scraped descriptions carry HTML remnants, LeetCode page chrome, runs of
+whitespace and long example/constraint sections. Compacting them before
+they go into the prompt cuts input tokens (cost) and latency without losing
+what the model needs to classify the problem.
+"""
+import html
+import os
+import re
+from typing import Optional
+
+# Rough Gemini tokenizer ratio for English + code; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+MAX_EXAMPLES = int(os.getenv("PROMPT_MAX_EXAMPLES", "2"))
+MAX_CONSTRAINT_LINES = int(os.getenv("PROMPT_MAX_CONSTRAINT_LINES", "8"))
+MAX_INPUT_TOKENS = int(os.getenv("PROMPT_MAX_INPUT_TOKENS", "1500"))
+
+# Only real tags: a known name, on one line. The scraper sends innerText, where "<" and ">"
+# are comparisons ("0 <= i < j < n and nums[i] > 3") and must survive.
+_TAG_NAMES = r"p|div|span|br|hr|li|ul|ol|pre|code|strong|em|b|i|u|s|sub|sup|font|a|img|table|thead|tbody|tr|td|th|blockquote|h\d"
+_BLOCK_TAG = re.compile(r"</?(p|div|br|li|ul|ol|pre|h\d)(\s[^<>\n]*)?/?>", re.IGNORECASE)
+_TAG = re.compile(rf"</?({_TAG_NAMES})(\s[^<>\n]*)?/?>", re.IGNORECASE)
+_ZERO_WIDTH = re.compile("[\u200b-\u200d\ufeff]")
+_INLINE_SPACE = re.compile("[ \t\u00a0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_EXAMPLE_HEADER = re.compile(r"^\s*Example\s*\d*\s*:?\s*$|^\s*Example\s*\d+\s*:", re.IGNORECASE)
+_SECTION_HEADER = re.compile(r"^\s*(Constraints|Follow[- ]?up|Note)\s*:?", re.IGNORECASE)
+
+# LeetCode page chrome that innerText picks up around the statement
+_BOILERPLATE = re.compile(
+    r"^\s*(Topics|Companies|Hint \d+|Similar Questions|Discussion.*|Copyright.*)\s*$",
+    re.IGNORECASE,
+)
+# Chrome labels followed by value lines ("Accepted / 1.2M", "...interview before? / Yes / 12").
+# Bare numbers and Yes/No are only chrome right after one of these: elsewhere they are
+# example outputs.
+_CHROME_LABEL = re.compile(
+    r"^\s*(Seen this question in a real interview before\?.*|Accepted|Submissions|Acceptance Rate)\s*$",
+    re.IGNORECASE,
+)
+_CHROME_VALUE = re.compile(r"^\s*(\d+(\.\d+)?[KM]?%?|Yes|No)\s*$", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate; avoids a count_tokens round trip per request."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def normalize_description(text: str) -> str:
+    """Strip HTML, page chrome and redundant whitespace."""
+    if _TAG.search(text):
+        text = html.unescape(_TAG.sub("", _BLOCK_TAG.sub("\n", text)))
+    text = _ZERO_WIDTH.sub("", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = []
+    in_chrome = False
+    for line in text.split("\n"):
+        line = _INLINE_SPACE.sub(" ", line).strip()
+        if not line:
+            lines.append(line)
+            continue
+        if _CHROME_LABEL.match(line):
+            in_chrome = True
+            continue
+        if in_chrome and _CHROME_VALUE.match(line):
+            continue
+        in_chrome = False
+        if _BOILERPLATE.match(line):
+            continue
+        lines.append(line)
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def _cap_sections(text: str, max_examples: int, max_constraint_lines: int) -> str:
+    """Keep the first max_examples examples and max_constraint_lines constraint lines."""
+    output = []
+    examples_seen = 0
+    section = None
+    constraint_lines = 0
+
+    for line in text.split("\n"):
+        if _EXAMPLE_HEADER.match(line):
+            examples_seen += 1
+            section = "example"
+        elif _SECTION_HEADER.match(line):
+            section = "constraints" if line.strip().lower().startswith("constraints") else "other"
+            constraint_lines = 0
+            output.append(line)
+            continue
+
+        if section == "example" and examples_seen > max_examples:
+            continue
+        if section == "constraints" and line.strip():
+            constraint_lines += 1
+            if constraint_lines > max_constraint_lines:
+                continue
+        output.append(line)
+
+    return _BLANK_LINES.sub("\n\n", "\n".join(output)).strip()
+
+
+def compact_description(
+    text: str,
+    max_examples: Optional[int] = None,
+    max_constraint_lines: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> str:
+    """
+    Normalize a scraped description and shrink it to the input token budget.
+    Examples are dropped first, then the text is truncated as a last resort.
+    """
+    max_examples = MAX_EXAMPLES if max_examples is None else max_examples
+    max_constraint_lines = MAX_CONSTRAINT_LINES if max_constraint_lines is None else max_constraint_lines
+    max_tokens = MAX_INPUT_TOKENS if max_tokens is None else max_tokens
+
+    text = _cap_sections(normalize_description(text), max_examples, max_constraint_lines)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    text = _cap_sections(text, 0, max_constraint_lines)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    return text[: max_tokens * CHARS_PER_TOKEN].rsplit(" ", 1)[0] + " ..."
@@ -0,0 +1,174 @@
+"""
+Gemini request/token quota shared by every API worker.
+
+The limiter used to live in GeminiService (last_request_time + an asyncio
+lock), so each uvicorn worker or replica had its own budget. PostgresQuota
+keeps the budget in one `quota_buckets` row instead: a caller locks the row
+(SELECT ... FOR UPDATE), checks the minimum spacing and the per-minute
+request/token windows, records its reservation and commits. All workers
+therefore share one RPM/TPM budget. Times come from the database clock, so
+skew between hosts does not matter.
+
+Token use is reserved from an estimate before the call and corrected with
+the API's own count afterwards (settle). If the database cannot be reached,
+the worker falls back to its local limiter instead of blocking analyses.
+"""
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, update, func
+
+from app.database import IS_SQLITE, dialect_insert
+from app.models import QuotaBucket
+
+# postgres | local; an embedded SQLite deployment is a single node, so it defaults to local
+QUOTA_BACKEND = os.getenv("GEMINI_QUOTA_BACKEND", "local" if IS_SQLITE else "postgres")
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "30"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+GEMINI_MIN_INTERVAL_SECONDS = float(os.getenv("GEMINI_MIN_INTERVAL_SECONDS", "2.0"))
+
+WINDOW_SECONDS = 60.0
+MAX_SLEEP_SECONDS = 5.0  # re-check at least this often while waiting
+
+
+@dataclass
+class Reservation:
+    window_start: float
+    tokens: int
+
+
+class LocalQuota:
+    """Per-process limiter: the original minimum spacing between calls."""
+
+    def __init__(self, min_interval: float = GEMINI_MIN_INTERVAL_SECONDS):
+        self.min_interval = min_interval
+        self.last_request_time = 0.0
+        self.lock = asyncio.Lock()
+        self.waited = 0.0
+
+    async def acquire(self, tokens: int) -> Optional[Reservation]:
+        async with self.lock:
+            elapsed = time.time() - self.last_request_time
+            if elapsed < self.min_interval:
+                self.waited += self.min_interval - elapsed
+                await asyncio.sleep(self.min_interval - elapsed)
+            self.last_request_time = time.time()
+        return None
+
+    async def settle(self, reservation: Optional[Reservation], actual_tokens: int):
+        pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": "local", "min_interval": self.min_interval, "seconds_waited": round(self.waited, 1)}
+
+
+class PostgresQuota:
+    """Cross-worker limiter backed by one row-locked quota_buckets row."""
+
+    def __init__(
+        self,
+        name: str,
+        rpm: int = GEMINI_RPM,
+        tpm: int = GEMINI_TPM,
+        min_interval: float = GEMINI_MIN_INTERVAL_SECONDS,
+    ):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.min_interval = min_interval
+        # Serializes this worker's callers so they queue here rather than on the row lock
+        self.lock = asyncio.Lock()
+        self.fallback = LocalQuota(min_interval)
+        self.waited = 0.0
+        self.db_errors = 0
+
+    async def _try_acquire(self, tokens: int):
+        """One locked read-modify-write. Returns (seconds to wait, reservation or None)."""
+        from app.database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                dialect_insert(QuotaBucket)
+                .values(name=self.name, window_start=0.0, requests=0, tokens=0, last_request_at=0.0)
+                .on_conflict_do_nothing()
+            )
+            result = await db.execute(
+                select(QuotaBucket, func.extract("epoch", func.clock_timestamp()))
+                .where(QuotaBucket.name == self.name)
+                .with_for_update()
+            )
+            bucket, now = result.one()
+            now = float(now)
+
+            if now - bucket.window_start >= WINDOW_SECONDS:
+                bucket.window_start, bucket.requests, bucket.tokens = now, 0, 0
+
+            wait = self.min_interval - (now - bucket.last_request_at)
+            if bucket.requests + 1 > self.rpm:
+                wait = max(wait, bucket.window_start + WINDOW_SECONDS - now)
+            # A single oversized prompt is still let through in an empty window
+            if bucket.tokens and bucket.tokens + tokens > self.tpm:
+                wait = max(wait, bucket.window_start + WINDOW_SECONDS - now)
+
+            if wait > 0:
+                await db.rollback()
+                return wait, None
+
+            bucket.requests += 1
+            bucket.tokens += tokens
+            bucket.last_request_at = now
+            reservation = Reservation(window_start=bucket.window_start, tokens=tokens)
+            await db.commit()
+            return 0.0, reservation
+
+    async def acquire(self, tokens: int) -> Optional[Reservation]:
+        async with self.lock:
+            while True:
+                try:
+                    wait, reservation = await self._try_acquire(tokens)
+                except Exception as e:
+                    self.db_errors += 1
+                    print(f"⚠️  Shared Gemini quota unavailable ({e}); using the local limiter")
+                    return await self.fallback.acquire(tokens)
+                if reservation is not None:
+                    return reservation
+                self.waited += min(wait, MAX_SLEEP_SECONDS)
+                await asyncio.sleep(min(wait, MAX_SLEEP_SECONDS))
+
+    async def settle(self, reservation: Optional[Reservation], actual_tokens: int):
+        """Replace the reserved token estimate with the real count, if the window is still current."""
+        if reservation is None or actual_tokens == reservation.tokens:
+            return
+        from app.database import AsyncSessionLocal
+
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(QuotaBucket)
+                    .where(QuotaBucket.name == self.name, QuotaBucket.window_start == reservation.window_start)
+                    .values(tokens=QuotaBucket.tokens + (actual_tokens - reservation.tokens))
+                )
+                await db.commit()
+        except Exception as e:
+            self.db_errors += 1
+            print(f"⚠️  Could not settle Gemini token usage: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "backend": "postgres",
+            "bucket": self.name,
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "min_interval": self.min_interval,
+            "seconds_waited": round(self.waited, 1),
+            "db_errors": self.db_errors,
+        }
+
+
+def build_quota(name: str):
+    if QUOTA_BACKEND == "postgres":
+        return PostgresQuota(name)
+    return LocalQuota()
@@ -0,0 +1,215 @@
+"""
+Full-text search over a user's tracked problems.
+
+Searchable text: the problem title, the analysis' key insight, the problem
+description (weighted in that order) and the user's own notes.
+
+Postgres: problems.search_vector and user_problem_progress.notes_vector are
+generated tsvector columns (kept current by Postgres itself) with GIN
+indexes; see schema.sql / migrations/008. They are not mapped on the models.
+
+SQLite: two FTS5 tables, problems_fts and progress_notes_fts, maintained by
+triggers (plus problem_search_docs, which gives each problem an integer key). ensure_search_index() creates them (and fills them once) at
+startup, since SQLite databases are not upgraded through migrations/.
+
+Every query term is a prefix match ("slid win" finds "Sliding Window") and
+all terms must match. Results are ranked (ts_rank / bm25) and paginated
+with limit / offset.
+"""
+import re
+import uuid
+from typing import Any, Dict, List
+
+from sqlalchemy import select, func, text, bindparam, Uuid, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import IS_SQLITE
+from app.models import Problem, UserProblemProgress
+
+MAX_TERMS = 8
+NOTES_WEIGHT = 1.5  # a match in your own notes outranks one in a description
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def query_terms(q: str) -> List[str]:
+    return _TERM.findall((q or "").lower())[:MAX_TERMS]
+
+
+def tsquery(terms: List[str]) -> str:
+    """to_tsquery input: every term as a prefix, all required (terms are \\w+, nothing to escape)."""
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def fts5_query(terms: List[str]) -> str:
+    return " AND ".join(f'"{term}"*' for term in terms)
+
+
+# SQLite: problems_fts rows are keyed by an INTEGER PRIMARY KEY from problem_search_docs
+# (problems has no integer key, and its implicit rowid can change on VACUUM). Joining on that
+# rowid avoids reading a stored id column for every match, which dominated broad queries.
+# Notes only re-index when personal_notes changes, not on every solve.
+_SQLITE_SEARCH_DDL = [
+    """CREATE TABLE IF NOT EXISTS problem_search_docs (
+        doc_id INTEGER PRIMARY KEY, problem_id CHAR(32) NOT NULL UNIQUE
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS problems_fts USING fts5(
+        title, key_insight, description, tokenize = 'porter unicode61'
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS progress_notes_fts USING fts5(
+        progress_id UNINDEXED, user_id UNINDEXED, problem_id UNINDEXED, personal_notes,
+        tokenize = 'porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS problems_fts_insert AFTER INSERT ON problems BEGIN
+        INSERT INTO problem_search_docs (problem_id) VALUES (NEW.id);
+        INSERT INTO problems_fts (rowid, title, key_insight, description)
+        VALUES (last_insert_rowid(), NEW.title, json_extract(NEW.cached_analysis, '$.key_insight'), NEW.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS problems_fts_update AFTER UPDATE OF title, description, cached_analysis ON problems BEGIN
+        DELETE FROM problems_fts WHERE rowid = (SELECT doc_id FROM problem_search_docs WHERE problem_id = OLD.id);
+        INSERT INTO problems_fts (rowid, title, key_insight, description)
+        SELECT doc_id, NEW.title, json_extract(NEW.cached_analysis, '$.key_insight'), NEW.description
+        FROM problem_search_docs WHERE problem_id = NEW.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS problems_fts_delete AFTER DELETE ON problems BEGIN
+        DELETE FROM problems_fts WHERE rowid = (SELECT doc_id FROM problem_search_docs WHERE problem_id = OLD.id);
+        DELETE FROM problem_search_docs WHERE problem_id = OLD.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS progress_notes_fts_insert AFTER INSERT ON user_problem_progress
+    WHEN NEW.personal_notes IS NOT NULL BEGIN
+        INSERT INTO progress_notes_fts (progress_id, user_id, problem_id, personal_notes)
+        VALUES (NEW.id, NEW.user_id, NEW.problem_id, NEW.personal_notes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS progress_notes_fts_update
+    AFTER UPDATE OF personal_notes, problem_id ON user_problem_progress BEGIN
+        DELETE FROM progress_notes_fts WHERE progress_id = OLD.id;
+        INSERT INTO progress_notes_fts (progress_id, user_id, problem_id, personal_notes)
+        SELECT NEW.id, NEW.user_id, NEW.problem_id, NEW.personal_notes WHERE NEW.personal_notes IS NOT NULL;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS progress_notes_fts_delete AFTER DELETE ON user_problem_progress BEGIN
+        DELETE FROM progress_notes_fts WHERE progress_id = OLD.id;
+    END""",
+]
+
+_SQLITE_SEARCH_FILL = [
+    "INSERT INTO problem_search_docs (problem_id) SELECT id FROM problems",
+    """INSERT INTO problems_fts (rowid, title, key_insight, description)
+    SELECT d.doc_id, p.title, json_extract(p.cached_analysis, '$.key_insight'), p.description
+    FROM problems p JOIN problem_search_docs d ON d.problem_id = p.id""",
+    """INSERT INTO progress_notes_fts (progress_id, user_id, problem_id, personal_notes)
+    SELECT id, user_id, problem_id, personal_notes FROM user_problem_progress WHERE personal_notes IS NOT NULL""",
+]
+
+
+async def ensure_search_index(engine) -> str:
+    """SQLite only: create the FTS5 tables and triggers if missing, filling them the first time."""
+    if not IS_SQLITE:
+        return "tsvector columns (schema.sql)"
+    async with engine.begin() as conn:
+        existed = (await conn.execute(text(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'problems_fts'"
+        ))).scalar_one()
+        for statement in _SQLITE_SEARCH_DDL:
+            await conn.execute(text(statement))
+        if existed:
+            return "FTS5 index present"
+        for statement in _SQLITE_SEARCH_FILL:
+            await conn.execute(text(statement))
+        indexed = (await conn.execute(select(func.count()).select_from(text("problems_fts")))).scalar_one()
+    return f"FTS5 index built ({indexed} problems)"
+
+
+_SEARCH_PG = text(f"""
+    WITH q AS (SELECT to_tsquery('english', :query) AS query),
+    hits AS (
+        SELECT p.id AS problem_id, ts_rank(p.search_vector, q.query) AS score
+        FROM problems p
+        JOIN user_problem_progress upp ON upp.problem_id = p.id AND upp.user_id = :user_id
+        CROSS JOIN q
+        WHERE p.search_vector @@ q.query
+        UNION ALL
+        SELECT upp.problem_id, {NOTES_WEIGHT} * ts_rank(upp.notes_vector, q.query)
+        FROM user_problem_progress upp
+        CROSS JOIN q
+        WHERE upp.user_id = :user_id AND upp.notes_vector @@ q.query
+    )
+    SELECT problem_id, SUM(score) AS rank
+    FROM hits
+    GROUP BY problem_id
+    ORDER BY rank DESC, problem_id
+    LIMIT :limit OFFSET :offset
+""")
+
+# bm25() is lower-is-better, so it is negated; column weights: title, key insight, description.
+# CROSS JOIN pins the join order: otherwise SQLite may drive from the user's rows and re-run
+# the MATCH once per row through a rowid constraint.
+_SEARCH_SQLITE = text(f"""
+    WITH hits AS (
+        SELECT d.problem_id, -bm25(problems_fts, 10.0, 4.0, 1.0) AS score
+        FROM problems_fts f
+        CROSS JOIN problem_search_docs d
+        CROSS JOIN user_problem_progress upp
+        WHERE problems_fts MATCH :query
+          AND d.doc_id = f.rowid
+          AND upp.problem_id = d.problem_id AND upp.user_id = :user_id
+        UNION ALL
+        SELECT n.problem_id, -{NOTES_WEIGHT} * bm25(progress_notes_fts)
+        FROM progress_notes_fts n
+        WHERE progress_notes_fts MATCH :query AND n.user_id = :user_id
+    )
+    SELECT problem_id, SUM(score) AS rank
+    FROM hits
+    GROUP BY problem_id
+    ORDER BY rank DESC, problem_id
+    LIMIT :limit OFFSET :offset
+""")
+
+_SEARCH = (_SEARCH_SQLITE if IS_SQLITE else _SEARCH_PG).bindparams(
+    bindparam("user_id", type_=Uuid)
+).columns(problem_id=Uuid, rank=Float)
+
+
+async def search_problems(
+    db: AsyncSession, user_id: uuid.UUID, q: str, limit: int = 20, offset: int = 0
+) -> Dict[str, Any]:
+    """One page of the user's problems matching q, best first."""
+    terms = query_terms(q)
+    page = {"query": q, "results": [], "limit": limit, "offset": offset, "has_more": False}
+    if not terms:
+        return page
+
+    result = await db.execute(_SEARCH, {
+        "query": fts5_query(terms) if IS_SQLITE else tsquery(terms),
+        "user_id": user_id,
+        "limit": limit + 1,  # one extra row tells whether there is a next page
+        "offset": offset,
+    })
+    ranked = result.all()
+    page["has_more"] = len(ranked) > limit
+    ranked = ranked[:limit]
+    if not ranked:
+        return page
+
+    rows = await db.execute(
+        select(Problem, UserProblemProgress)
+        .join(UserProblemProgress, UserProblemProgress.problem_id == Problem.id)
+        .where(UserProblemProgress.user_id == user_id, Problem.id.in_([problem_id for problem_id, _ in ranked]))
+    )
+    by_id = {problem.id: (problem, progress) for problem, progress in rows.all()}
+    for problem_id, rank in ranked:
+        if problem_id not in by_id:
+            continue  # untracked between the two queries
+        problem, progress = by_id[problem_id]
+        analysis = problem.cached_analysis if isinstance(problem.cached_analysis, dict) else {}
+        page["results"].append({
+            "id": str(problem.id),
+            "title": problem.title,
+            "difficulty": problem.difficulty,
+            "url": problem.url,
+            "status": progress.status,
+            "next_review": progress.next_review_date.strftime("%Y-%m-%d") if progress.next_review_date else None,
+            "key_insight": analysis.get("key_insight"),
+            "notes": progress.personal_notes,
+            "rank": round(rank, 4),
+        })
+    return page
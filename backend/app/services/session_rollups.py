@@ -0,0 +1,366 @@
+"""
+Partition maintenance, monthly rollups and retention for review_sessions.
+
+On Postgres, review_sessions is range-partitioned by month on session_date
+(see schema.sql / migrations/004). This job:
+
+1. creates the partitions for the coming months, and moves rows that
+   landed in the default partition (e.g. old dates from /import) into
+   their month's partition (ensure_review_session_partitions() in SQL);
+2. (re)computes per-user monthly rollups for closed months that received
+   sessions since the last run: reviews, successes, distinct problems,
+   average quality and EF drift;
+3. optionally drops raw sessions older than SESSION_RETENTION_MONTHS,
+   whole partitions at a time, once their months are rolled up.
+
+Which months received sessions: every month that was still open at the
+last run is redone once it closes. Writes into an already closed month
+(/import backdates session_date and created_at; the outbox consumer can
+apply a solve after its month closed) call mark_dirty_months() in their
+transaction, which records the month in review_session_dirty_months.
+A run clears only the marks it saw (by generation), so a month marked while
+it runs is redone next time. Dirty months past the retention window no
+longer have their earlier raw rows: their new rows are added to the
+existing rollups and deleted in the same transaction instead.
+
+On SQLite there are no partitions; rollups work the same and retention is a
+plain DELETE.
+
+Usage:
+    python -m app.services.session_rollups
+    python -m app.services.session_rollups --retention-months 24
+"""
+import argparse
+import asyncio
+import os
+import re
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select, delete, func, case, literal, text, and_, or_, Date
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import IS_SQLITE, dialect_insert
+from app.models import ReviewSession, ReviewSessionRollup, ReviewSessionDirtyMonth
+
+PARTITIONS_AHEAD = int(os.getenv("SESSION_PARTITIONS_AHEAD", "3"))
+RETENTION_MONTHS = int(os.getenv("SESSION_RETENTION_MONTHS", "0"))  # 0 keeps raw sessions forever
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv("SESSION_MAINTENANCE_INTERVAL_HOURS", "24"))
+
+_PARTITION_NAME = re.compile(r"^review_sessions_(\d{4})_(\d{2})$")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+async def ensure_partitions(db: AsyncSession, months_ahead: int = PARTITIONS_AHEAD) -> int:
+    """Create upcoming monthly partitions; returns how many were created (0 on SQLite)."""
+    if IS_SQLITE:
+        return 0
+    result = await db.execute(text("SELECT ensure_review_session_partitions(:ahead)"), {"ahead": months_ahead})
+    await db.commit()
+    return result.scalar_one()
+
+
+async def mark_dirty_months(db: AsyncSession, days: Iterable[date]):
+    """Record that sessions were written for these days' months (caller's transaction)."""
+    months = sorted({month_start(day) for day in days})
+    if not months:
+        return
+    stmt = dialect_insert(ReviewSessionDirtyMonth).values(
+        [{"month": month, "generation": 1, "marked_at": datetime.utcnow()} for month in months]
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[ReviewSessionDirtyMonth.month],
+        set_={"generation": ReviewSessionDirtyMonth.generation + 1, "marked_at": stmt.excluded.marked_at},
+    ))
+
+
+async def _dirty_months(db: AsyncSession) -> Dict[date, int]:
+    rows = await db.execute(select(ReviewSessionDirtyMonth.month, ReviewSessionDirtyMonth.generation))
+    return {month: generation for month, generation in rows.all()}
+
+
+async def _clear_dirty_month(db: AsyncSession, month: date, generation: int):
+    """Drop the mark unless it was bumped after this run read it (caller commits)."""
+    await db.execute(delete(ReviewSessionDirtyMonth).where(
+        ReviewSessionDirtyMonth.month == month, ReviewSessionDirtyMonth.generation == generation
+    ))
+
+
+async def _months_to_roll_up(db: AsyncSession, before: date) -> List[date]:
+    """Closed months that were still open at the last run, or have never been rolled up."""
+    last_run = (await db.execute(select(func.max(ReviewSessionRollup.computed_at)))).scalar_one_or_none()
+    if last_run is None:
+        days = (await db.execute(
+            select(ReviewSession.session_date).where(ReviewSession.session_date < before).distinct()
+        )).scalars().all()
+        return sorted({month_start(day) for day in days})
+    months = []
+    month = month_start(last_run.date())
+    while month < before:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+async def roll_up_month(db: AsyncSession, month: date, computed_at: Optional[datetime] = None) -> int:
+    """Recompute every user's rollup for one month with a single INSERT ... SELECT ... ON CONFLICT."""
+    next_month = add_months(month, 1)
+    summary = (
+        select(
+            ReviewSession.user_id,
+            literal(month, Date).label("month"),
+            func.count().label("reviews"),
+            func.sum(case((ReviewSession.solved_successfully.is_(True), 1), else_=0)).label("successful_reviews"),
+            func.count(func.distinct(ReviewSession.problem_id)).label("problems_reviewed"),
+            func.avg(ReviewSession.quality_rating).label("average_quality"),
+            func.coalesce(func.sum(ReviewSession.ef_after - ReviewSession.ef_before), 0.0).label("ef_drift"),
+            literal(computed_at or datetime.utcnow()).label("computed_at"),
+        )
+        .where(
+            ReviewSession.session_date >= month,
+            ReviewSession.session_date < next_month,
+            ReviewSession.user_id.isnot(None),
+        )
+        .group_by(ReviewSession.user_id)
+    )
+    columns = ["user_id", "month", "reviews", "successful_reviews", "problems_reviewed",
+               "average_quality", "ef_drift", "computed_at"]
+    stmt = dialect_insert(ReviewSessionRollup).from_select(columns, summary)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ReviewSessionRollup.user_id, ReviewSessionRollup.month],
+        set_={column: getattr(stmt.excluded, column) for column in columns[2:]},
+    )
+    result = await db.execute(stmt)
+    await db.commit()
+    return result.rowcount or 0
+
+
+async def merge_month(db: AsyncSession, month: date, computed_at: Optional[datetime] = None) -> int:
+    """
+    Add a month's raw sessions to its rollups and delete them, in one transaction (caller commits).
+    For months past the retention window, where the raw rows already rolled up are gone.
+    """
+    next_month = add_months(month, 1)
+    moved = (await db.execute(
+        delete(ReviewSession)
+        .where(ReviewSession.session_date >= month, ReviewSession.session_date < next_month,
+               ReviewSession.user_id.isnot(None))
+        .returning(ReviewSession.user_id, ReviewSession.problem_id, ReviewSession.solved_successfully,
+                   ReviewSession.quality_rating, ReviewSession.ef_before, ReviewSession.ef_after)
+    )).all()
+    added = defaultdict(lambda: {"reviews": 0, "successful_reviews": 0, "problems": set(),
+                                 "ratings": [], "ef_drift": 0.0})
+    for row in moved:
+        summary = added[row.user_id]
+        summary["reviews"] += 1
+        summary["successful_reviews"] += 1 if row.solved_successfully else 0
+        summary["problems"].add(row.problem_id)
+        if row.quality_rating is not None:
+            summary["ratings"].append(row.quality_rating)
+        if row.ef_before is not None and row.ef_after is not None:
+            summary["ef_drift"] += row.ef_after - row.ef_before
+    if not added:
+        return 0
+
+    existing = {
+        rollup.user_id: rollup
+        for rollup in (await db.execute(
+            select(ReviewSessionRollup).where(
+                ReviewSessionRollup.month == month, ReviewSessionRollup.user_id.in_(list(added))
+            )
+        )).scalars()
+    }
+    for user_id, summary in added.items():
+        rollup = existing.get(user_id)
+        if rollup is None:
+            rollup = ReviewSessionRollup(user_id=user_id, month=month, reviews=0, successful_reviews=0,
+                                         problems_reviewed=0, average_quality=None, ef_drift=0.0)
+            db.add(rollup)
+        ratings = summary["ratings"]
+        if ratings:
+            # Weighted by reviews: the rollup does not keep how many of its reviews had a rating
+            old_weight = rollup.reviews if rollup.average_quality is not None else 0
+            rollup.average_quality = (
+                (rollup.average_quality or 0) * old_weight + sum(ratings)
+            ) / (old_weight + len(ratings))
+        rollup.reviews += summary["reviews"]
+        rollup.successful_reviews += summary["successful_reviews"]
+        # Upper bound: the month's earlier problems are not known any more
+        rollup.problems_reviewed += len(summary["problems"])
+        rollup.ef_drift += summary["ef_drift"]
+        rollup.computed_at = computed_at or datetime.utcnow()
+    return len(moved)
+
+
+async def roll_up(db: AsyncSession, retention_months: int = RETENTION_MONTHS) -> Dict[str, Any]:
+    current = month_start(datetime.utcnow().date())
+    # Raw rows older than the retention cutoff may already be gone; recomputing would undercount
+    oldest = add_months(current, -retention_months) if retention_months else None
+
+    started = datetime.utcnow()
+    dirty = await _dirty_months(db)
+    months = sorted(set(await _months_to_roll_up(db, before=current)) | {m for m in dirty if m < current})
+    rolled, merged = [], []
+    for month in months:
+        if oldest and month < oldest:
+            if month in dirty:
+                await merge_month(db, month, computed_at=started)
+                await _clear_dirty_month(db, month, dirty[month])
+                await db.commit()
+                merged.append(month.strftime("%Y-%m"))
+            continue
+        await roll_up_month(db, month, computed_at=started)
+        if month in dirty:
+            await _clear_dirty_month(db, month, dirty[month])
+            await db.commit()
+        rolled.append(month.strftime("%Y-%m"))
+    return {"months_rolled_up": rolled, "months_merged": merged}
+
+
+async def _partition_months(db: AsyncSession) -> Dict[date, str]:
+    result = await db.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'review_sessions'::regclass
+    """))
+    months = {}
+    for (name,) in result.all():
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return months
+
+
+async def apply_retention(db: AsyncSession, retention_months: int = RETENTION_MONTHS) -> Dict[str, Any]:
+    """Drop raw sessions older than the window; their rollups stay."""
+    if not retention_months:
+        return {"dropped": []}
+    cutoff = add_months(month_start(datetime.utcnow().date()), -retention_months)
+
+    rolled = set((await db.execute(
+        select(ReviewSessionRollup.month).where(ReviewSessionRollup.month < cutoff).distinct()
+    )).scalars())
+    # Marked after this run's rollup step: those rows are not in any rollup yet
+    dirty = [month for month in await _dirty_months(db) if month < cutoff]
+    not_dirty = and_(True, *[
+        or_(ReviewSession.session_date < month, ReviewSession.session_date >= add_months(month, 1))
+        for month in dirty
+    ])
+
+    if IS_SQLITE:
+        result = await db.execute(delete(ReviewSession).where(ReviewSession.session_date < cutoff, not_dirty))
+        await db.commit()
+        return {"dropped": [f"{result.rowcount} rows before {cutoff}"]}
+
+    dropped = []
+    for month, name in sorted((await _partition_months(db)).items()):
+        if month >= cutoff:
+            continue
+        if month in dirty:
+            print(f"⚠️  Keeping {name}: marked for rollup")
+            continue
+        if month not in rolled:
+            has_rows = (await db.execute(text(f'SELECT EXISTS (SELECT 1 FROM "{name}")'))).scalar_one()
+            if has_rows:
+                print(f"⚠️  Keeping {name}: not rolled up yet")
+                continue
+        await db.execute(text(f'DROP TABLE "{name}"'))
+        dropped.append(name)
+    await db.execute(
+        text("DELETE FROM review_sessions_default WHERE session_date < :cutoff "
+             "AND date_trunc('month', session_date)::date <> ALL(:dirty)"),
+        {"cutoff": cutoff, "dirty": dirty},
+    )
+    await db.commit()
+    return {"dropped": dropped}
+
+
+async def run_maintenance(db: AsyncSession, retention_months: int = RETENTION_MONTHS) -> Dict[str, Any]:
+    created = await ensure_partitions(db)
+    report = {"partitions_created": created}
+    report.update(await roll_up(db, retention_months))
+    report.update(await apply_retention(db, retention_months))
+    return report
+
+
+async def run_forever(interval_hours: float = MAINTENANCE_INTERVAL_HOURS):
+    """Background loop started from the app lifespan."""
+    from app.database import AsyncSessionLocal
+
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                report = await run_maintenance(db)
+            print(f"🗂️  Review session maintenance: {report}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Review session maintenance failed: {e}")
+        await asyncio.sleep(interval_hours * 3600)
+
+
+async def user_review_totals(db: AsyncSession, user_id) -> Dict[str, Any]:
+    """
+    Total reviews for a user from rollups plus raw sessions not rolled up yet (after the last
+    rolled-up month, or in a month marked dirty), and the rollup rows for the last 12 months.
+    """
+    rollups = (await db.execute(
+        select(ReviewSessionRollup)
+        .where(ReviewSessionRollup.user_id == user_id)
+        .order_by(ReviewSessionRollup.month)
+    )).scalars().all()
+    dirty = list(await _dirty_months(db))
+    # Inside the window a dirty month is recomputed from raw rows, which replace its rollup;
+    # past it, the raw rows are only the new ones and add to it (see merge_month)
+    oldest = add_months(month_start(datetime.utcnow().date()), -RETENTION_MONTHS) if RETENTION_MONTHS else None
+    replaced = {month for month in dirty if oldest is None or month >= oldest}
+
+    raw_query = select(func.count()).select_from(ReviewSession).where(ReviewSession.user_id == user_id)
+    if rollups:
+        raw_query = raw_query.where(or_(
+            ReviewSession.session_date >= add_months(rollups[-1].month, 1),
+            *[and_(ReviewSession.session_date >= month, ReviewSession.session_date < add_months(month, 1))
+              for month in dirty],
+        ))
+    raw_reviews = (await db.execute(raw_query)).scalar()
+
+    return {
+        "total_reviews": sum(r.reviews for r in rollups if r.month not in replaced) + raw_reviews,
+        "monthly": [
+            {
+                "month": r.month.strftime("%Y-%m"),
+                "reviews": r.reviews,
+                "success_rate": round(r.successful_reviews / r.reviews * 100, 1) if r.reviews else 0,
+                "average_quality": round(r.average_quality, 2) if r.average_quality is not None else None,
+                "ef_drift": round(r.ef_drift, 2),
+            }
+            for r in rollups[-12:]
+        ],
+    }
+
+
+async def main():
+    from app.database import AsyncSessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Review session partitions, rollups and retention.")
+    parser.add_argument("--retention-months", type=int, default=RETENTION_MONTHS,
+                        help="Drop raw sessions older than this many months (0 keeps them)")
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as db:
+        report = await run_maintenance(db, args.retention_months)
+    print(f"✅ Review session maintenance finished: {report}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
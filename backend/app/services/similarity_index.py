@@ -0,0 +1,294 @@
+"""
+In-process near-duplicate index over problem descriptions.
+
+Each description is reduced to a 128-value MinHash signature over word
+3-grams. Signatures live in a memory-mapped .npy file next to an append-only
+id list, so the index loads instantly, grows incrementally as problems are
+added, and a lookup is one vectorized comparison (well under a millisecond
+for thousands of problems).
+
+Several processes can share an index directory (API workers, the catalog
+seed): writes take an exclusive lock on index.lock, and every process picks
+up rows the others appended (ids.txt only grows) or a matrix they grew
+before reading. One process at a time runs the boot-time catch-up, which
+indexes problems that are missing, e.g. seeded while the API was down.
+Without fcntl (Windows) there is no lock: keep to one writer process there.
+
+Usage:
+    python -m app.services.similarity_index --rebuild
+"""
+import argparse
+import asyncio
+import os
+import re
+import uuid
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.prompt_compaction import normalize_description
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+NUM_PERM = 128
+SHINGLE_SIZE = 3
+INITIAL_CAPACITY = 1024
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+
+INDEX_DIR = Path(os.getenv(
+    "SIMILARITY_INDEX_DIR",
+    Path(__file__).resolve().parent.parent.parent / ".cache" / "similarity"
+))
+CACHE_THRESHOLD = float(os.getenv("SIMILARITY_CACHE_THRESHOLD", "0.8"))
+
+_rng = np.random.RandomState(20240501)  # fixed seed: signatures must be stable across restarts
+_A = _rng.randint(1, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature of a description, or None if there is nothing to hash."""
+    words = _WORD.findall(normalize_description(text or "").lower())
+    if not words:
+        return None
+    size = min(SHINGLE_SIZE, len(words))
+    shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    permuted = (hashes[:, None] * _A[None, :] + _B[None, :]) % _PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+class SimilarityIndex:
+    def __init__(self, directory: Path = INDEX_DIR):
+        self.directory = Path(directory)
+        self.matrix_path = self.directory / "signatures.npy"
+        self.ids_path = self.directory / "ids.txt"
+        self.signatures: Optional[np.ndarray] = None
+        self.ids: List[uuid.UUID] = []
+        self.rows: Dict[uuid.UUID, int] = {}
+        self._ids_read = 0  # bytes of ids.txt consumed
+        self._matrix_inode: Optional[int] = None
+
+    @contextmanager
+    def _lock(self, name: str = "index.lock", wait: bool = True):
+        """Exclusive advisory lock on a file in the index directory; yields whether it was taken."""
+        if fcntl is None:
+            yield True
+            return
+        with open(self.directory / name, "a") as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _open_matrix(self):
+        self.signatures = np.load(self.matrix_path, mmap_mode="r+")
+        self._matrix_inode = os.stat(self.matrix_path).st_ino
+
+    def load(self):
+        """Memory-map existing files, or start an empty index."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock():
+            if not (self.matrix_path.exists() and self.ids_path.exists()):
+                np.lib.format.open_memmap(
+                    self.matrix_path, mode="w+", dtype=np.uint32, shape=(INITIAL_CAPACITY, NUM_PERM)
+                ).flush()
+                self.ids_path.write_text("")
+        self.ids, self.rows, self._ids_read = [], {}, 0
+        self._sync()
+        return self
+
+    def _sync(self):
+        """Pick up ids other processes appended, then remap the matrix if it was grown (replaced)."""
+        size = os.stat(self.ids_path).st_size
+        if size < self._ids_read:
+            self.ids, self.rows, self._ids_read = [], {}, 0  # recreated: read it again
+        if size > self._ids_read:
+            with open(self.ids_path, "rb") as f:
+                f.seek(self._ids_read)
+                chunk = f.read(size - self._ids_read)
+            chunk = chunk[:chunk.rfind(b"\n") + 1]  # an id line still being written waits
+            # ids.txt is the commit point: a row written without its id line is simply reused
+            for line in chunk.split():
+                problem_id = uuid.UUID(line.decode())
+                self.rows[problem_id] = len(self.ids)
+                self.ids.append(problem_id)
+            self._ids_read += len(chunk)
+        if (self.signatures is None or os.stat(self.matrix_path).st_ino != self._matrix_inode
+                or len(self.ids) > self.signatures.shape[0]):
+            self._open_matrix()
+
+    @property
+    def loaded(self) -> bool:
+        return self.signatures is not None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _grow(self):
+        old = self.signatures
+        grown = np.lib.format.open_memmap(
+            self.directory / "signatures.tmp.npy", mode="w+", dtype=np.uint32,
+            shape=(old.shape[0] * 2, NUM_PERM)
+        )
+        grown[: old.shape[0]] = old
+        grown.flush()
+        del grown, old
+        self.signatures = None
+        os.replace(self.directory / "signatures.tmp.npy", self.matrix_path)
+        self._open_matrix()
+
+    def add(self, problem_id: uuid.UUID, text: str, flush: bool = True) -> bool:
+        """Insert or refresh one problem. Returns False when the text has no content."""
+        sig = signature(text)
+        if sig is None:
+            return False
+        return self.add_many([(problem_id, sig)], flush=flush) == 1
+
+    def add_many(self, signatures: List[Tuple[uuid.UUID, np.ndarray]], flush: bool = True) -> int:
+        """Insert or refresh precomputed signatures under one hold of the write lock."""
+        if not signatures:
+            return 0
+        if not self.loaded:
+            self.load()
+        with self._lock():
+            self._sync()
+            appended = []
+            for problem_id, sig in signatures:
+                row = self.rows.get(problem_id)
+                if row is None:
+                    if len(self.ids) >= self.signatures.shape[0]:
+                        self._grow()
+                    row = len(self.ids)
+                    self.ids.append(problem_id)
+                    self.rows[problem_id] = row
+                    appended.append(problem_id)
+                self.signatures[row] = sig
+            if flush:
+                self.signatures.flush()  # rows reach the file before the id lines that commit them
+            if appended:
+                with open(self.ids_path, "a") as f:
+                    f.write("".join(f"{problem_id}\n" for problem_id in appended))
+                    f.flush()
+                self._ids_read = os.stat(self.ids_path).st_size
+        return len(signatures)
+
+    def query(
+        self,
+        text: Optional[str] = None,
+        sig: Optional[np.ndarray] = None,
+        limit: int = 5,
+        threshold: float = 0.0,
+        exclude: Optional[uuid.UUID] = None,
+    ) -> List[Tuple[uuid.UUID, float]]:
+        """Top matches as (problem_id, estimated Jaccard similarity), best first."""
+        if not self.loaded:
+            self.load()
+        self._sync()
+        if sig is None:
+            sig = signature(text or "")
+        count = len(self.ids)
+        if sig is None or count == 0:
+            return []
+
+        scores = (self.signatures[:count] == sig).mean(axis=1)
+        if exclude is not None and exclude in self.rows:
+            scores[self.rows[exclude]] = -1.0
+
+        k = min(limit, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], round(float(scores[i]), 3)) for i in top if scores[i] >= threshold and scores[i] > 0]
+
+    def signature_for(self, problem_id: uuid.UUID) -> Optional[np.ndarray]:
+        if not self.loaded:
+            self.load()
+        self._sync()
+        row = self.rows.get(problem_id)
+        return None if row is None else np.array(self.signatures[row])
+
+
+similarity_index = SimilarityIndex()
+
+
+async def _index_rows(index: SimilarityIndex, result, batch_size: int) -> int:
+    added = 0
+    async for partition in result.partitions(batch_size):
+        signatures = []
+        for problem_id, description in partition:
+            sig = signature(description)
+            if sig is not None:
+                signatures.append((problem_id, sig))
+        added += index.add_many(signatures, flush=False)
+        await asyncio.sleep(0)  # let request handlers run during a boot-time rebuild
+    return added
+
+
+async def rebuild(index: SimilarityIndex = similarity_index, batch_size: int = 500, missing_only: bool = False) -> int:
+    """
+    (Re)index every problem with a description, streaming rows from the database.
+    missing_only indexes just the problems the index does not have yet (the boot-time
+    catch-up). Returns 0 at once if another process is already rebuilding this directory.
+    """
+    from sqlalchemy import select
+    from app.database import AsyncSessionLocal
+    from app.models import Problem
+
+    if not index.loaded:
+        index.load()
+    added = 0
+    with index._lock("rebuild.lock", wait=False) as acquired:
+        if not acquired:
+            return 0
+        async with AsyncSessionLocal() as db:
+            if not missing_only:
+                result = await db.stream(
+                    select(Problem.id, Problem.description)
+                    .where(Problem.description.isnot(None))
+                    .execution_options(yield_per=batch_size)
+                )
+                added = await _index_rows(index, result, batch_size)
+            else:
+                index._sync()
+                ids = await db.stream(
+                    select(Problem.id).where(Problem.description.isnot(None)).execution_options(yield_per=batch_size)
+                )
+                missing = [problem_id async for problem_id in ids.scalars() if problem_id not in index.rows]
+                for start in range(0, len(missing), batch_size):
+                    result = await db.stream(
+                        select(Problem.id, Problem.description).where(Problem.id.in_(missing[start:start + batch_size]))
+                    )
+                    added += await _index_rows(index, result, batch_size)
+        index.signatures.flush()
+    return added
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Build the problem similarity index.")
+    parser.add_argument("--rebuild", action="store_true", help="Index all problems with a description")
+    parser.add_argument("--query", help="Print the closest problems to this text")
+    args = parser.parse_args()
+
+    similarity_index.load()
+    if args.rebuild:
+        added = await rebuild()
+        print(f"✅ Indexed {added} problems ({len(similarity_index)} total) in {similarity_index.directory}")
+    if args.query:
+        for problem_id, score in similarity_index.query(args.query, limit=10):
+            print(f"{score:.3f}  {problem_id}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,252 @@
+"""
+Slow-query log with sampled EXPLAIN capture.
+
+Engine event hooks (installed from app/database.py) time every statement.
+Statements slower than SLOW_QUERY_MS are aggregated by fingerprint, a hash
+of the statement with literals, placeholders and IN lists normalized.
+Each aggregate keeps count / total / max time, the bind-parameter types and
+the routes that issued it. The route comes from a context variable set by
+RouteContextMiddleware.
+
+For a sample of slow SELECTs (SLOW_QUERY_EXPLAIN_RATE), the plan is captured
+in the background on a separate connection: EXPLAIN (ANALYZE, BUFFERS) on
+Postgres (re-runs the SELECT inside a rolled-back transaction, with a
+statement timeout), EXPLAIN QUERY PLAN on SQLite. The index names found in
+the plan are listed next to it, e.g. whether the /today join uses
+idx_user_progress_next_review. Writes are never explained.
+
+Read the log at GET /admin/slow-queries; DELETE clears it.
+"""
+import asyncio
+import contextvars
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))  # 0 disables the log
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "5000"))
+MAX_FINGERPRINTS = int(os.getenv("SLOW_QUERY_MAX_FINGERPRINTS", "500"))
+PLANS_PER_FINGERPRINT = 3
+
+# Set per request; SQLAlchemy's greenlet inherits the coroutine's context
+current_scope: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("current_scope", default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\$\d+|%\([^)]+\)s|(?<!:):\w+|\?")  # not ::type casts
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,)+\s*\?\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+_PLAN_INDEX = re.compile(
+    r"(?:Index(?: Only)? Scan(?: Backward)? using|Bitmap Index Scan on|USING (?:COVERING )?INDEX)\s+\"?(\w+)"
+)
+_PLAN_SEQ_SCAN = re.compile(r"(?:Seq Scan on|^SCAN)\s+\"?(\w+)", re.MULTILINE)
+
+
+def normalize(statement: str) -> str:
+    """Statement shape: literals and placeholders become ?, IN lists collapse, whitespace folds."""
+    shape = _STRING.sub("?", statement)
+    shape = _NUMBER.sub("?", shape)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _IN_LIST.sub("IN (...)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+def fingerprint(shape: str) -> str:
+    return hashlib.sha1(shape.encode("utf-8")).hexdigest()[:12]
+
+
+def parameter_types(parameters: Any, executemany: bool) -> Any:
+    if executemany and isinstance(parameters, (list, tuple)) and parameters:
+        parameters = parameters[0]
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return []
+
+
+def route_label() -> Optional[str]:
+    scope = current_scope.get()
+    if scope is None:
+        return None  # background task or CLI
+    route = scope.get("route")
+    return f"{scope.get('method')} {getattr(route, 'path', scope.get('path'))}"
+
+
+def _explainable(statement: str) -> bool:
+    head = statement.lstrip().upper()
+    return head.startswith("SELECT") and " FOR UPDATE" not in head and " FOR SHARE" not in head
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, explain_rate: float = SLOW_QUERY_EXPLAIN_RATE):
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.explaining = False  # one plan capture at a time
+        self.explain_failures = 0
+        self.tasks = set()
+
+    def install(self, async_engine):
+        """Register timing hooks on an AsyncEngine (primary or replica)."""
+        if self.threshold_ms <= 0:
+            return
+        sync_engine = async_engine.sync_engine
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def _start(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def _finish(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info["slow_query_started"].pop()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms < self.threshold_ms or conn.get_execution_options().get("skip_slow_query_log"):
+                return
+            entry = self.record(statement, parameters, executemany, elapsed_ms)
+            if self._should_explain(statement):
+                self._schedule_explain(async_engine, entry["fingerprint"], statement, parameters, elapsed_ms)
+
+        @event.listens_for(sync_engine, "handle_error")
+        def _failed(context):
+            # A failed statement never reaches after_cursor_execute
+            started = context.connection.info.get("slow_query_started") if context.connection is not None else None
+            if started:
+                started.pop()
+
+    def record(self, statement: str, parameters: Any, executemany: bool, elapsed_ms: float) -> Dict[str, Any]:
+        shape = normalize(statement)
+        key = fingerprint(shape)
+        route = route_label()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if len(self.entries) >= MAX_FINGERPRINTS:
+                    # Make room by dropping the cheapest fingerprint
+                    del self.entries[min(self.entries, key=lambda k: self.entries[k]["total_ms"])]
+                entry = self.entries[key] = {
+                    "fingerprint": key,
+                    "shape": shape,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "routes": Counter(),
+                    "parameter_types": None,
+                    "first_seen": datetime.utcnow(),
+                    "last_seen": None,
+                    "plans": deque(maxlen=PLANS_PER_FINGERPRINT),
+                }
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["routes"][route or "(background)"] += 1
+            entry["parameter_types"] = parameter_types(parameters, executemany)
+            entry["last_seen"] = datetime.utcnow()
+        return entry
+
+    def _should_explain(self, statement: str) -> bool:
+        return (
+            not self.explaining
+            and self.explain_rate > 0
+            and _explainable(statement)
+            and random.random() < self.explain_rate
+        )
+
+    def _schedule_explain(self, async_engine, key: str, statement: str, parameters: Any, elapsed_ms: float):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # synchronous caller (no loop to run the capture on)
+        self.explaining = True
+        task = loop.create_task(self._explain(async_engine, key, statement, parameters, elapsed_ms, route_label()))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _explain(self, async_engine, key: str, statement: str, parameters: Any, elapsed_ms: float, route: Optional[str]):
+        try:
+            sqlite = async_engine.dialect.name == "sqlite"
+            prefix = "EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN (ANALYZE, BUFFERS) "
+            async with async_engine.connect() as conn:
+                conn = await conn.execution_options(skip_slow_query_log=True)
+                if not sqlite:
+                    await conn.exec_driver_sql(f"SET LOCAL statement_timeout = {SLOW_QUERY_EXPLAIN_TIMEOUT_MS}")
+                result = await conn.exec_driver_sql(prefix + statement, parameters)
+                rows = result.all()
+                await conn.rollback()
+            # Postgres returns one text column; SQLite's detail is the last of (id, parent, notused, detail)
+            plan = "\n".join(str(row[-1]) for row in rows)
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    entry["plans"].append({
+                        "captured_at": datetime.utcnow(),
+                        "route": route,
+                        "duration_ms": round(elapsed_ms, 1),
+                        "indexes": sorted(set(_PLAN_INDEX.findall(plan))),
+                        "seq_scans": sorted(set(_PLAN_SEQ_SCAN.findall(plan))),
+                        "plan": plan,
+                    })
+        except Exception as e:
+            self.explain_failures += 1
+            print(f"⚠️  Could not capture a plan for slow query {key}: {e}")
+        finally:
+            self.explaining = False
+
+    def snapshot(self, limit: int = 50) -> Dict[str, Any]:
+        with self.lock:
+            entries = sorted(self.entries.values(), key=lambda e: e["total_ms"], reverse=True)[:limit]
+            return {
+                "threshold_ms": self.threshold_ms,
+                "explain_rate": self.explain_rate,
+                "explain_failures": self.explain_failures,
+                "fingerprints": len(self.entries),
+                "queries": [
+                    {
+                        "fingerprint": e["fingerprint"],
+                        "shape": e["shape"],
+                        "count": e["count"],
+                        "total_ms": round(e["total_ms"], 1),
+                        "mean_ms": round(e["total_ms"] / e["count"], 1),
+                        "max_ms": round(e["max_ms"], 1),
+                        "routes": dict(e["routes"].most_common(5)),
+                        "parameter_types": e["parameter_types"],
+                        "first_seen": e["first_seen"].isoformat(),
+                        "last_seen": e["last_seen"].isoformat(),
+                        "plans": [{**p, "captured_at": p["captured_at"].isoformat()} for p in e["plans"]],
+                    }
+                    for e in entries
+                ],
+            }
+
+    def reset(self):
+        with self.lock:
+            self.entries.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+class RouteContextMiddleware:
+    """Pure ASGI middleware: exposes the request scope to the query hooks via current_scope."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
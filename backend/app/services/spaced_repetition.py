@@ -28,3 +28,12 @@ class SpacedRepetitionService:
         ease_factor = max(1.3, ease_factor) # EF never goes below 1.3
         
         return interval, ease_factor, repetitions + 1
+
+    @staticmethod
+    def status_for(repetitions: int, current_status: str = "new") -> str:
+        """Map a repetition count to a progress status (learning, reviewing, mastered)."""
+        if repetitions > 5:
+            return 'mastered'
+        if repetitions > 0:
+            return 'learning' if repetitions < 3 else 'reviewing'
+        return current_status
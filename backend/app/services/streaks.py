@@ -0,0 +1,203 @@
+"""
+Daily solve streaks.
+
+A day counts when daily_stats has a solve for it. daily_stats dates (and
+solve_recorded's solved_on) are the user's local date in users.timezone,
+so a solve at 23:30 in New York lands on the right day.
+
+Incremental (outbox consumer, per solve): users.last_active_date holds the
+last counted day, so a new day is one comparison:
+    same day  -> unchanged
+    next day  -> streak + 1
+    later     -> streak restarts at 1
+and longest_streak follows. A stored streak is only current while
+last_active_date is today or yesterday; current_streak() applies that on
+read, so a lapsed streak shows 0 without a write.
+
+Backfill / repair: streak, longest streak and last active day for every
+user come from daily_stats with one gaps-and-islands query per batch of
+users (consecutive dates minus their row number share an "island" key).
+It runs as a single batched job:
+
+    python -m app.services.streaks --recompute
+
+repair_user() runs the same query for one user, after days are added out of
+order (a history import backdates them).
+"""
+import argparse
+import asyncio
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import select, update, text, bindparam, Uuid, Integer, Date
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import IS_SQLITE
+from app.models import User
+
+RECOMPUTE_BATCH_SIZE = 1000
+
+
+@lru_cache(maxsize=512)
+def _zone(name: Optional[str]):
+    try:
+        return ZoneInfo(name) if name else timezone.utc
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def is_valid_timezone(name: str) -> bool:
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+def local_date(tz_name: Optional[str], at: Optional[datetime] = None) -> date:
+    """The calendar date in the user's timezone at a naive-UTC instant (default: now)."""
+    at = at or datetime.utcnow()
+    return at.replace(tzinfo=timezone.utc).astimezone(_zone(tz_name)).date()
+
+
+def advance(streak: int, longest: int, last_active: Optional[date], day: date) -> Tuple[int, int, Optional[date]]:
+    """(streak, longest, last_active_date) after activity on `day`."""
+    if last_active is not None and day <= last_active:
+        return streak, longest, last_active  # already counted (or out of order: --recompute repairs)
+    if last_active is not None and day == last_active + timedelta(days=1):
+        streak += 1
+    else:
+        streak = 1
+    return streak, max(longest, streak), day
+
+
+def current_streak(user: User) -> int:
+    """The stored streak while it is still alive (active today or yesterday in the user's timezone)."""
+    if not user.last_active_date or not user.streak_count:
+        return 0
+    if user.last_active_date < local_date(user.timezone) - timedelta(days=1):
+        return 0
+    return user.streak_count
+
+
+async def apply_active_days(db: AsyncSession, user_id: uuid.UUID, days) -> None:
+    """Advance a user's streak through newly active days (caller commits; one consumer per user at a time)."""
+    user = (await db.execute(
+        select(User.streak_count, User.longest_streak, User.last_active_date).where(User.id == user_id)
+    )).one_or_none()
+    if user is None:
+        return
+    streak, longest, last_active = user.streak_count or 0, user.longest_streak or 0, user.last_active_date
+    for day in sorted(days):
+        streak, longest, last_active = advance(streak, longest, last_active, day)
+    if last_active != user.last_active_date:
+        await db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(streak_count=streak, longest_streak=longest, last_active_date=last_active)
+            .execution_options(synchronize_session=False)
+        )
+
+
+# Gaps and islands: within a user's active days ordered by date, date minus row number
+# is constant along a run of consecutive days, so it keys the run.
+_ISLAND_KEY = (
+    "julianday(date) - ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY date)"
+    if IS_SQLITE else
+    "date - CAST(ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY date) AS INTEGER)"
+)
+
+_STREAKS = text(f"""
+    WITH days AS (
+        SELECT user_id, date, {_ISLAND_KEY} AS island
+        FROM daily_stats
+        WHERE user_id IN :user_ids AND problems_solved > 0
+    ),
+    islands AS (
+        SELECT user_id, MAX(date) AS last_day, COUNT(*) AS length
+        FROM days
+        GROUP BY user_id, island
+    ),
+    ranked AS (
+        SELECT user_id, last_day, length,
+               MAX(length) OVER (PARTITION BY user_id) AS longest,
+               ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY last_day DESC) AS recency
+        FROM islands
+    )
+    SELECT user_id, length AS streak, longest, last_day
+    FROM ranked
+    WHERE recency = 1
+""").bindparams(
+    bindparam("user_ids", type_=Uuid, expanding=True)
+).columns(user_id=Uuid, streak=Integer, longest=Integer, last_day=Date)
+
+
+_STREAK_COLUMNS = (User.id, User.streak_count, User.longest_streak, User.last_active_date)
+
+
+async def _rewrite_streaks(db: AsyncSession, users) -> int:
+    """Update the given (id, streak_count, longest_streak, last_active_date) rows that differ from daily_stats."""
+    computed = {
+        row.user_id: (row.streak, row.longest, row.last_day)
+        for row in await db.execute(_STREAKS, {"user_ids": [user.id for user in users]})
+    }
+    changes = []
+    for user in users:
+        streak, longest, last_day = computed.get(user.id, (0, 0, None))
+        if (user.streak_count, user.longest_streak, user.last_active_date) != (streak, longest, last_day):
+            changes.append({"id": user.id, "streak_count": streak, "longest_streak": longest,
+                            "last_active_date": last_day})
+    if changes:
+        # Bulk UPDATE by primary key (executemany)
+        await db.execute(update(User), changes)
+    return len(changes)
+
+
+async def repair_user(db: AsyncSession, user_id: uuid.UUID) -> bool:
+    """Rewrite one user's streak columns from daily_stats after backdated activity, e.g. an import (caller commits)."""
+    users = (await db.execute(select(*_STREAK_COLUMNS).where(User.id == user_id))).all()
+    return bool(users) and bool(await _rewrite_streaks(db, users))
+
+
+async def recompute(db: AsyncSession, batch_size: int = RECOMPUTE_BATCH_SIZE) -> Dict[str, int]:
+    """Rewrite every user's streak columns from daily_stats, one keyset batch of users per transaction."""
+    stats = {"users": 0, "changed": 0}
+    last_id = None
+    while True:
+        query = select(*_STREAK_COLUMNS).order_by(User.id).limit(batch_size)
+        if last_id is not None:
+            query = query.where(User.id > last_id)
+        users = (await db.execute(query)).all()
+        if not users:
+            break
+
+        changed = await _rewrite_streaks(db, users)
+        await db.commit()
+
+        stats["users"] += len(users)
+        stats["changed"] += changed
+        last_id = users[-1].id
+    return stats
+
+
+async def main():
+    from app.database import AsyncSessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Recompute daily solve streaks from daily_stats.")
+    parser.add_argument("--recompute", action="store_true", help="Rewrite every user's streak columns")
+    parser.add_argument("--batch-size", type=int, default=RECOMPUTE_BATCH_SIZE)
+    args = parser.parse_args()
+    if not args.recompute:
+        parser.error("nothing to do (use --recompute)")
+
+    async with AsyncSessionLocal() as db:
+        stats = await recompute(db, args.batch_size)
+    print(f"✅ Streak recompute finished: {stats}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,164 @@
+"""
+Delta sync for the extension's local replica (GET /sync).
+
+The extension keeps the user's progress rows, daily stats and the metadata
+of their tracked problems in chrome.storage and asks only for what changed
+since its last cursor:
+
+- progress / daily_stats: rows with updated_at after the cursor, found
+  through the (user_id, updated_at) indexes
+- problems: tracked problems whose own row or progress row changed
+- deleted: tombstones (sync_tombstones) written where rows are removed,
+  currently the duplicate merge in services/problem_identity.py
+
+A cursor is the server's clock when the response was built, minus
+SYNC_OVERLAP_SECONDS: updated_at is stamped when a row is written, not when
+its transaction commits (or reaches the read replica), so each delta
+re-sends the last few seconds. Rows are upserts, so repeats are harmless.
+
+Without a cursor, with one the server cannot read, or with one older than
+the tombstone retention window, the response is a full snapshot
+("full": true) and the client replaces its replica.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select, delete, insert, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import IS_SQLITE
+from app.models import Problem, UserProblemProgress, DailyStats, SyncTombstone
+
+OVERLAP_SECONDS = float(os.getenv("SYNC_OVERLAP_SECONDS", "60"))
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+
+CURSOR_VERSION = "1"  # bump to send every client a full snapshot
+
+# Tombstone entities
+PROBLEM = "problem"
+PROGRESS = "progress"
+DAILY_STATS = "daily_stats"
+
+
+def encode_cursor(at: datetime) -> str:
+    """Opaque to clients: version and epoch milliseconds (UTC)."""
+    millis = int(at.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return f"{CURSOR_VERSION}.{millis}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[datetime]:
+    """The cursor's naive UTC time, or None when a full snapshot is needed."""
+    version, _, millis = (cursor or "").partition(".")
+    if version != CURSOR_VERSION or not millis.isdigit():
+        return None
+    since = datetime.fromtimestamp(int(millis) / 1000, tz=timezone.utc).replace(tzinfo=None)
+    if since < datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+        return None  # tombstones it would need may already be pruned
+    return since
+
+
+def _bind_time(at: datetime) -> datetime:
+    # The Postgres columns are TIMESTAMPTZ; compare with an aware value there
+    return at if IS_SQLITE else at.replace(tzinfo=timezone.utc)
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _problem_row(problem: Problem) -> Dict[str, Any]:
+    patterns = problem.patterns if isinstance(problem.patterns, list) else []
+    return {
+        "id": str(problem.id),
+        "title": problem.title,
+        "difficulty": problem.difficulty,
+        "url": problem.url,
+        "patterns": [p.get("name", p) if isinstance(p, dict) else p for p in patterns],
+    }
+
+
+def _progress_row(progress: UserProblemProgress) -> Dict[str, Any]:
+    return {
+        "id": str(progress.id),
+        "problem_id": str(progress.problem_id),
+        "status": progress.status,
+        "next_review": _iso(progress.next_review_date),
+        "last_reviewed_at": _iso(progress.last_reviewed_at),
+        "easiness_factor": progress.easiness_factor,
+        "interval": progress.interval,
+        "repetitions": progress.repetitions,
+        "times_solved": progress.times_solved,
+        "notes": progress.personal_notes,
+    }
+
+
+def _daily_stats_row(day: DailyStats) -> Dict[str, Any]:
+    return {
+        "date": day.date.isoformat(),
+        "problems_solved": day.problems_solved,
+        "problems_reviewed": day.problems_reviewed,
+        "total_time_minutes": day.total_time_minutes,
+    }
+
+
+async def changes_since(db: AsyncSession, user_id: uuid.UUID, cursor: Optional[str]) -> Dict[str, Any]:
+    """Everything in the user's replica that changed after cursor, plus the next cursor."""
+    next_cursor = encode_cursor(datetime.utcnow() - timedelta(seconds=OVERLAP_SECONDS))
+    since = decode_cursor(cursor)
+
+    progress_query = select(UserProblemProgress).where(UserProblemProgress.user_id == user_id)
+    stats_query = select(DailyStats).where(DailyStats.user_id == user_id)
+    problems_query = (
+        select(Problem)
+        .join(UserProblemProgress, UserProblemProgress.problem_id == Problem.id)
+        .where(UserProblemProgress.user_id == user_id)
+    )
+    deleted = {PROBLEM: [], PROGRESS: [], DAILY_STATS: []}
+    if since is not None:
+        bound = _bind_time(since)
+        progress_query = progress_query.where(UserProblemProgress.updated_at > bound)
+        stats_query = stats_query.where(DailyStats.updated_at > bound)
+        problems_query = problems_query.where(
+            or_(Problem.updated_at > bound, UserProblemProgress.updated_at > bound)
+        )
+        tombstones = await db.execute(
+            select(SyncTombstone.entity, SyncTombstone.entity_id)
+            .where(SyncTombstone.user_id == user_id, SyncTombstone.deleted_at > bound)
+            .order_by(SyncTombstone.id)
+        )
+        for entity, entity_id in tombstones.all():
+            deleted.setdefault(entity, []).append(entity_id)
+
+    problems = (await db.execute(problems_query)).scalars().all()
+    progress = (await db.execute(progress_query)).scalars().all()
+    daily_stats = (await db.execute(stats_query.order_by(DailyStats.date))).scalars().all()
+    return {
+        "cursor": next_cursor,
+        "full": since is None,
+        "problems": [_problem_row(problem) for problem in problems],
+        "progress": [_progress_row(row) for row in progress],
+        "daily_stats": [_daily_stats_row(day) for day in daily_stats],
+        "deleted": {
+            "problems": deleted[PROBLEM],
+            "progress": deleted[PROGRESS],
+            "daily_stats": deleted[DAILY_STATS],
+        },
+    }
+
+
+async def record_deletions(db: AsyncSession, deletions: Iterable[Tuple[uuid.UUID, str, Any]]):
+    """
+    Tombstone (user_id, entity, entity id) triples in the caller's transaction,
+    pruning tombstones past the retention window (cursors that old get a full snapshot).
+    """
+    rows = [
+        {"user_id": user_id, "entity": entity, "entity_id": str(entity_id), "deleted_at": datetime.utcnow()}
+        for user_id, entity, entity_id in deletions
+    ]
+    if not rows:
+        return
+    cutoff = datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS + 1)
+    await db.execute(delete(SyncTombstone).where(SyncTombstone.deleted_at < _bind_time(cutoff)))
+    await db.execute(insert(SyncTombstone), rows)
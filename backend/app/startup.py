@@ -0,0 +1,90 @@
+"""
+Startup helpers: timing breakdown for cold starts and a one-query schema check.
+
+Imported first by app.main so BOOT_STARTED is as close to process start as
+we can get from inside the app.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from sqlalchemy import select, inspect
+from sqlalchemy.exc import DBAPIError
+
+BOOT_STARTED = time.perf_counter()
+
+# version: compare against schema_version and only run create_all on mismatch (default)
+# create_all: always run Base.metadata.create_all (previous behaviour)
+# skip: trust the database, no schema round trips at all
+SCHEMA_MODE = os.getenv("STARTUP_SCHEMA_MODE", "version").lower()
+
+
+class StartupTimings:
+    """Collects named durations (in ms) for the startup report."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    def record(self, name: str, seconds: float):
+        self.timings[name] = round(seconds * 1000, 1)
+
+    @contextmanager
+    def measure(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def mark_since_boot(self, name: str):
+        self.record(name, time.perf_counter() - BOOT_STARTED)
+
+    def report(self) -> Dict[str, float]:
+        return dict(self.timings)
+
+
+timings = StartupTimings()
+
+
+async def ensure_schema(engine, metadata) -> str:
+    """
+    Make sure the tables exist without paying a round trip per table on every boot.
+    Returns a short description of what was done, for the startup log.
+    """
+    from app.database import SCHEMA_VERSION
+    from app.models import SchemaVersion
+
+    if SCHEMA_MODE == "skip":
+        return "skipped"
+
+    current = None
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                select(SchemaVersion.version).order_by(SchemaVersion.version.desc()).limit(1)
+            )
+            current = result.scalar_one_or_none()
+    except DBAPIError:
+        pass  # First boot: the version table does not exist yet
+
+    if current == SCHEMA_VERSION and SCHEMA_MODE != "create_all":
+        return f"schema v{current} is current"
+
+    recorded = current
+    async with engine.begin() as conn:
+        if current is None:
+            # Tables from before versioning existed are treated as the v1 baseline
+            legacy = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table("users"))
+        await conn.run_sync(metadata.create_all)
+        if current is None:
+            current = 1 if legacy else SCHEMA_VERSION
+            await conn.execute(SchemaVersion.__table__.insert().values(version=current))
+
+    if current < SCHEMA_VERSION:
+        # create_all only adds missing tables; column/index changes live in migrations/
+        print(f"⚠️  Database is at schema v{current}, code expects v{SCHEMA_VERSION}. "
+              f"Apply the pending files in backend/migrations/.")
+    if recorded is None:
+        return f"create_all ran, schema v{current} recorded"
+    return f"create_all ran (schema v{current})"
@@ -0,0 +1,180 @@
+"""
+Microbenchmark for the hot-path statements in app/queries.py.
+
+Times each hot query per call, executed through an AsyncSession like the
+endpoints do:
+- no cache:  inline select() with SQLAlchemy's compiled cache disabled
+             (full compile on every call)
+- before:    inline select() as the endpoints built it, compiled cache on
+- after:     the cached lambda statement from app/queries.py
+- unprepared (Postgres only): "after" with DB_PREPARED_STATEMENT_CACHE_SIZE=0,
+             so the server parses and plans every statement again
+
+"no cache" - "before" is the per-request compile cost the compiled cache
+saves; "before" - "after" is statement construction and cache-key
+generation; "unprepared" - "after" is parse + plan.
+
+Usage:
+    python benchmark_queries.py                          # throwaway SQLite database
+    DATABASE_URL=postgresql://... python benchmark_queries.py
+    BENCH_ITERATIONS=5000 BENCH_USER_ID=<uuid> python benchmark_queries.py
+"""
+import asyncio
+import os
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+from sqlalchemy import select, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import queries
+from app.database import engine, Base, DATABASE_URL, IS_SQLITE, _create_engine
+from app.models import User, Problem, UserProblemProgress
+
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "1000"))
+WARMUP = 50
+CYAN = "\033[96m"
+RESET = "\033[0m"
+
+
+# The statements as the endpoints built them before app/queries.py
+def inline_user(user_id, problem_id, today):
+    return [select(User).where(User.id == user_id)]
+
+def inline_due(user_id, problem_id, today):
+    return [
+        select(Problem, UserProblemProgress)
+        .join(UserProblemProgress, Problem.id == UserProblemProgress.problem_id)
+        .where(
+            and_(
+                UserProblemProgress.user_id == user_id,
+                UserProblemProgress.next_review_date <= today,
+                UserProblemProgress.status.in_(['learning', 'reviewing'])
+            )
+        )
+    ]
+
+def inline_stats(user_id, problem_id, today):
+    return [
+        select(func.count()).select_from(UserProblemProgress).where(
+            and_(
+                UserProblemProgress.user_id == user_id,
+                UserProblemProgress.next_review_date <= today,
+                UserProblemProgress.status.in_(['learning', 'reviewing'])
+            )
+        ),
+        select(func.count()).select_from(UserProblemProgress).where(UserProblemProgress.user_id == user_id),
+        select(func.count()).select_from(UserProblemProgress).where(
+            and_(UserProblemProgress.user_id == user_id, UserProblemProgress.status == 'mastered')
+        ),
+    ]
+
+def inline_problems(user_id, problem_id, today):
+    return [
+        select(Problem, UserProblemProgress)
+        .join(UserProblemProgress, Problem.id == UserProblemProgress.problem_id)
+        .where(UserProblemProgress.user_id == user_id)
+        .order_by(UserProblemProgress.last_reviewed_at.desc())
+    ]
+
+def inline_progress(user_id, problem_id, today):
+    return [
+        select(UserProblemProgress).where(
+            and_(UserProblemProgress.user_id == user_id, UserProblemProgress.problem_id == problem_id)
+        )
+    ]
+
+
+CASES = [
+    ("user by id (every request)", inline_user, lambda u, p, t: [queries.user_by_id(u)]),
+    ("/today", inline_due, lambda u, p, t: [queries.due_problems(u, t)]),
+    ("/stats", inline_stats, lambda u, p, t: [queries.progress_counts(u, t)]),
+    ("/problems", inline_problems, lambda u, p, t: [queries.user_problems(u)]),
+    ("/solve progress lookup", inline_progress, lambda u, p, t: [queries.progress_for(u, p)]),
+]
+
+
+async def seed_sqlite():
+    """Schema plus one user with 50 tracked problems, a third of them due."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    user_id = uuid.uuid4()
+    today = datetime.utcnow().date()
+    async with AsyncSession(engine) as db:
+        db.add(User(id=user_id, email="bench@example.com", username="bench"))
+        for i in range(50):
+            problem = Problem(id=uuid.uuid4(), title=f"Benchmark Problem {i}", slug=f"benchmark-problem-{i}",
+                              difficulty="Medium", patterns=[{"name": "Sliding Window", "confidence": 0.9}])
+            db.add(problem)
+            db.add(UserProblemProgress(
+                user_id=user_id, problem_id=problem.id, status="learning" if i % 3 else "reviewing",
+                next_review_date=today + timedelta(days=i % 3 - 1), last_reviewed_at=datetime.utcnow(),
+                easiness_factor=2.5, interval=1, repetitions=1, times_solved=1,
+            ))
+        await db.commit()
+    return user_id
+
+
+async def pick_user():
+    """BENCH_USER_ID, else any user with progress (read-only against a real database)."""
+    if os.getenv("BENCH_USER_ID"):
+        return uuid.UUID(os.getenv("BENCH_USER_ID"))
+    async with AsyncSession(engine) as db:
+        user_id = (await db.execute(select(UserProblemProgress.user_id).limit(1))).scalar_one_or_none()
+    return user_id or uuid.uuid4()
+
+
+async def time_per_call(bind, build, args) -> float:
+    """Median microseconds for building and executing one request's statements."""
+    samples = []
+    async with AsyncSession(bind) as db:
+        for i in range(WARMUP + ITERATIONS):
+            start = time.perf_counter()
+            for stmt in build(*args):
+                (await db.execute(stmt)).all()
+            if i >= WARMUP:
+                samples.append(time.perf_counter() - start)
+            db.expunge_all()
+    return statistics.median(samples) * 1e6
+
+
+async def main():
+    engine.echo = False
+    user_id = await seed_sqlite() if IS_SQLITE else await pick_user()
+    async with AsyncSession(engine) as db:
+        problem_id = (await db.execute(
+            select(UserProblemProgress.problem_id).where(UserProblemProgress.user_id == user_id).limit(1)
+        )).scalar_one_or_none() or uuid.uuid4()
+    args = (user_id, problem_id, datetime.utcnow().date())
+
+    uncached = engine.execution_options(compiled_cache=None)
+    unprepared = None
+    if not IS_SQLITE:
+        unprepared = _create_engine(DATABASE_URL, prepared_statement_cache_size=0)
+        unprepared.echo = False
+
+    print(f"{CYAN}{engine.dialect.name}, {ITERATIONS} iterations, median µs per request{RESET}\n")
+    header = f"{'query':<28}{'no cache':>10}{'before':>10}{'after':>10}"
+    print(header + (f"{'unprepared':>12}" if unprepared else ""))
+    for name, before, after in CASES:
+        row = [
+            await time_per_call(uncached, before, args),
+            await time_per_call(engine, before, args),
+            await time_per_call(engine, after, args),
+        ]
+        if unprepared:
+            row.append(await time_per_call(unprepared, after, args))
+        print(f"{name:<28}" + "".join(f"{value:>10.0f}" for value in row[:3])
+              + (f"{row[3]:>12.0f}" if unprepared else ""))
+
+    if unprepared:
+        await unprepared.dispose()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
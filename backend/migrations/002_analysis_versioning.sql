@@ -0,0 +1,9 @@
+-- Tag cached analyses with the model and prompt that produced them.
+-- Existing analyses stay NULL-tagged, so the background refresher treats them as outdated.
+ALTER TABLE problems ADD COLUMN IF NOT EXISTS analysis_model VARCHAR(100);
+ALTER TABLE problems ADD COLUMN IF NOT EXISTS analysis_prompt_hash VARCHAR(32);
+ALTER TABLE problems ADD COLUMN IF NOT EXISTS analyzed_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS idx_problems_analysis_version ON problems(analysis_model, analysis_prompt_hash);
+
+INSERT INTO schema_version (version) VALUES (2) ON CONFLICT DO NOTHING;
@@ -0,0 +1,13 @@
+-- Gemini RPM/TPM window shared by all API workers (see app/services/quota.py).
+CREATE TABLE IF NOT EXISTS quota_buckets (
+    name VARCHAR(50) PRIMARY KEY,
+    window_start DOUBLE PRECISION NOT NULL DEFAULT 0, -- epoch seconds
+    requests INTEGER NOT NULL DEFAULT 0,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    last_request_at DOUBLE PRECISION NOT NULL DEFAULT 0 -- epoch seconds
+);
+
+-- Internal: RLS with no policies keeps it away from PostgREST (backend only)
+ALTER TABLE quota_buckets ENABLE ROW LEVEL SECURITY;
+
+INSERT INTO schema_version (version) VALUES (3) ON CONFLICT DO NOTHING;
@@ -0,0 +1,101 @@
+-- Range-partition review_sessions by month and add per-user monthly rollups.
+-- Rewrites review_sessions: run in a quiet period (it locks the table while copying).
+BEGIN;
+
+ALTER TABLE review_sessions RENAME TO review_sessions_legacy;
+-- Index names are schema-wide: free the primary key's name for the new table
+ALTER TABLE review_sessions_legacy RENAME CONSTRAINT review_sessions_pkey TO review_sessions_legacy_pkey;
+
+CREATE TABLE review_sessions (
+    id UUID DEFAULT uuid_generate_v4(),
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    problem_id UUID REFERENCES problems(id) ON DELETE CASCADE,
+    progress_id UUID REFERENCES user_problem_progress(id) ON DELETE CASCADE,
+    quality_rating INTEGER CHECK (quality_rating BETWEEN 0 AND 5),
+    time_spent_minutes INTEGER,
+    solved_successfully BOOLEAN,
+    ef_before DECIMAL(4,2),
+    ef_after DECIMAL(4,2),
+    interval_before INTEGER,
+    interval_after INTEGER,
+    session_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (id, session_date)
+) PARTITION BY RANGE (session_date);
+
+CREATE TABLE review_sessions_default PARTITION OF review_sessions DEFAULT;
+
+-- Existing rows land in the default partition first...
+INSERT INTO review_sessions
+SELECT id, user_id, problem_id, progress_id, quality_rating, time_spent_minutes, solved_successfully,
+       ef_before, ef_after, interval_before, interval_after,
+       COALESCE(session_date, created_at::date, CURRENT_DATE), created_at
+FROM review_sessions_legacy;
+
+DROP TABLE review_sessions_legacy;
+
+-- Creates monthly partitions from the oldest month present in the default partition
+-- (or the current month) through months_ahead months from now. Rows in the default
+-- partition are moved into their month's partition. Run by services/session_rollups.py.
+CREATE OR REPLACE FUNCTION ensure_review_session_partitions(months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    part_month DATE;
+    last_month DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    SELECT LEAST(date_trunc('month', MIN(session_date)), date_trunc('month', CURRENT_DATE))::date
+    INTO part_month FROM review_sessions_default;
+    part_month := COALESCE(part_month, date_trunc('month', CURRENT_DATE)::date);
+    last_month := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+
+    WHILE part_month <= last_month LOOP
+        partition_name := 'review_sessions_' || to_char(part_month, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE review_sessions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM review_sessions_default WHERE session_date >= %L AND session_date < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                part_month, (part_month + INTERVAL '1 month')::date, partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE review_sessions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, part_month, (part_month + INTERVAL '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        part_month := (part_month + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ...and are moved into monthly partitions here
+SELECT ensure_review_session_partitions(3);
+
+CREATE INDEX idx_review_sessions_user_date ON review_sessions(user_id, session_date);
+
+ALTER TABLE review_sessions ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Users can view own sessions" ON review_sessions
+    FOR ALL USING (auth.uid() = user_id);
+
+CREATE TABLE IF NOT EXISTS review_session_rollups (
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    reviews INTEGER NOT NULL DEFAULT 0,
+    successful_reviews INTEGER NOT NULL DEFAULT 0,
+    problems_reviewed INTEGER NOT NULL DEFAULT 0,
+    average_quality DOUBLE PRECISION,
+    ef_drift DOUBLE PRECISION NOT NULL DEFAULT 0,
+    computed_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, month)
+);
+
+ALTER TABLE review_session_rollups ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Users can view own rollups" ON review_session_rollups
+    FOR ALL USING (auth.uid() = user_id);
+
+INSERT INTO schema_version (version) VALUES (4) ON CONFLICT DO NOTHING;
+
+COMMIT;
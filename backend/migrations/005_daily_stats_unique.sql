@@ -0,0 +1,49 @@
+-- One daily_stats row per user and day, so /solve can upsert atomically
+-- (INSERT ... ON CONFLICT (user_id, date) DO UPDATE). Databases created from
+-- an older schema may lack the constraint and hold duplicate rows written by
+-- concurrent solves; fold those into the oldest row first.
+BEGIN;
+
+-- Block new solves until the constraint exists, so no duplicate slips in between
+LOCK TABLE daily_stats IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TEMP TABLE daily_stats_keepers ON COMMIT DROP AS
+SELECT id,
+       FIRST_VALUE(id) OVER (
+           PARTITION BY user_id, date ORDER BY created_at NULLS LAST, id
+       ) AS keeper_id
+FROM daily_stats;
+
+UPDATE daily_stats d
+SET problems_solved = t.problems_solved,
+    problems_reviewed = t.problems_reviewed,
+    total_time_minutes = t.total_time_minutes
+FROM (
+    SELECT k.keeper_id,
+           SUM(COALESCE(s.problems_solved, 0)) AS problems_solved,
+           SUM(COALESCE(s.problems_reviewed, 0)) AS problems_reviewed,
+           SUM(COALESCE(s.total_time_minutes, 0)) AS total_time_minutes
+    FROM daily_stats s
+    JOIN daily_stats_keepers k ON k.id = s.id
+    GROUP BY k.keeper_id
+    HAVING COUNT(*) > 1
+) t
+WHERE d.id = t.keeper_id;
+
+DELETE FROM daily_stats d
+USING daily_stats_keepers k
+WHERE k.id = d.id AND k.keeper_id <> d.id;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'daily_stats'::regclass AND conname = 'daily_stats_user_id_date_key'
+    ) THEN
+        ALTER TABLE daily_stats ADD CONSTRAINT daily_stats_user_id_date_key UNIQUE (user_id, date);
+    END IF;
+END $$;
+
+INSERT INTO schema_version (version) VALUES (5) ON CONFLICT DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,19 @@
+-- Transactional outbox for /solve (see app/services/outbox.py).
+CREATE TABLE IF NOT EXISTS outbox_events (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    event_type VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    processed_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_events_pending ON outbox_events(user_id, id) WHERE processed_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_outbox_events_processed ON outbox_events(processed_at) WHERE processed_at IS NOT NULL;
+
+-- Internal: RLS with no policies keeps it away from PostgREST (backend only)
+ALTER TABLE outbox_events ENABLE ROW LEVEL SECURITY;
+
+INSERT INTO schema_version (version) VALUES (6) ON CONFLICT DO NOTHING;
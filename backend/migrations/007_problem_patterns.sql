@@ -0,0 +1,39 @@
+-- Normalized problem -> pattern rows (see app/services/problem_patterns.py).
+CREATE TABLE IF NOT EXISTS problem_patterns (
+    problem_id UUID NOT NULL REFERENCES problems(id) ON DELETE CASCADE,
+    pattern_name VARCHAR(100) NOT NULL,
+    confidence REAL,
+    PRIMARY KEY (problem_id, pattern_name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_problem_patterns_pattern ON problem_patterns(pattern_name, problem_id);
+
+ALTER TABLE problem_patterns ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Problem patterns are viewable by all" ON problem_patterns;
+CREATE POLICY "Problem patterns are viewable by all" ON problem_patterns
+    FOR SELECT USING (true);
+
+-- Backfill from problems.patterns ({"name", "confidence"} objects or plain strings,
+-- falling back to cached_analysis->'patterns'); repeated names keep the highest confidence.
+-- The app's startup backfill (PROBLEM_PATTERNS_AUTO_BACKFILL) covers anything missed here.
+INSERT INTO problem_patterns (problem_id, pattern_name, confidence)
+SELECT p.id,
+       LEFT(BTRIM(CASE WHEN jsonb_typeof(elem) = 'object' THEN elem->>'name' ELSE elem #>> '{}' END), 100),
+       MAX(CASE WHEN jsonb_typeof(elem->'confidence') = 'number' THEN (elem->>'confidence')::real END)
+FROM problems p
+CROSS JOIN LATERAL jsonb_array_elements(
+    CASE
+        WHEN jsonb_typeof(p.patterns) = 'array' AND jsonb_array_length(p.patterns) > 0 THEN p.patterns
+        WHEN jsonb_typeof(p.cached_analysis->'patterns') = 'array' THEN p.cached_analysis->'patterns'
+        ELSE '[]'::jsonb
+    END
+) AS elem
+WHERE jsonb_typeof(elem) IN ('object', 'string')
+  AND BTRIM(CASE WHEN jsonb_typeof(elem) = 'object' THEN elem->>'name' ELSE elem #>> '{}' END) <> ''
+GROUP BY 1, 2
+ON CONFLICT DO NOTHING;
+
+-- Nothing filters on the JSON column any more
+DROP INDEX IF EXISTS idx_problems_patterns;
+
+INSERT INTO schema_version (version) VALUES (7) ON CONFLICT DO NOTHING;
@@ -0,0 +1,16 @@
+-- Full-text search for /search (see app/services/search.py).
+-- Generated columns are computed by Postgres on every insert/update; adding them
+-- rewrites both tables once, so run this off-peak on large databases.
+ALTER TABLE problems ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', COALESCE(title, '')), 'A') ||
+    setweight(to_tsvector('english', COALESCE(cached_analysis->>'key_insight', '')), 'B') ||
+    setweight(to_tsvector('english', COALESCE(description, '')), 'C')
+) STORED;
+
+ALTER TABLE user_problem_progress ADD COLUMN IF NOT EXISTS notes_vector TSVECTOR
+    GENERATED ALWAYS AS (to_tsvector('english', COALESCE(personal_notes, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_problems_search ON problems USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_user_progress_notes_search ON user_problem_progress USING GIN (notes_vector);
+
+INSERT INTO schema_version (version) VALUES (8) ON CONFLICT DO NOTHING;
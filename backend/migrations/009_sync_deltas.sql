@@ -0,0 +1,29 @@
+-- Delta sync for the extension's local replica (see app/services/sync.py).
+-- daily_stats gains updated_at (existing rows start at created_at), and the
+-- (user_id, updated_at) indexes serve GET /sync?since=<cursor>.
+ALTER TABLE daily_stats ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+UPDATE daily_stats SET updated_at = created_at WHERE created_at IS NOT NULL;
+
+DROP TRIGGER IF EXISTS update_daily_stats_updated_at ON daily_stats;
+CREATE TRIGGER update_daily_stats_updated_at
+    BEFORE UPDATE ON daily_stats
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    entity VARCHAR(20) NOT NULL, -- problem, progress or daily_stats
+    entity_id VARCHAR(64) NOT NULL,
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE sync_tombstones ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Users can view own tombstones" ON sync_tombstones;
+CREATE POLICY "Users can view own tombstones" ON sync_tombstones
+    FOR SELECT USING (auth.uid() = user_id);
+
+CREATE INDEX IF NOT EXISTS idx_user_progress_updated ON user_problem_progress(user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_daily_stats_updated ON daily_stats(user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_user ON sync_tombstones(user_id, deleted_at);
+
+INSERT INTO schema_version (version) VALUES (9) ON CONFLICT DO NOTHING;
@@ -0,0 +1,17 @@
+-- Idempotency-Key responses for /solve and /analyze (see app/services/idempotency.py).
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    key VARCHAR(255) NOT NULL,
+    request_hash CHAR(64) NOT NULL, -- sha256 of endpoint + body
+    response JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (user_id, key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at);
+
+-- Internal: RLS with no policies keeps it away from PostgREST (backend only)
+ALTER TABLE idempotency_keys ENABLE ROW LEVEL SECURITY;
+
+INSERT INTO schema_version (version) VALUES (10) ON CONFLICT DO NOTHING;
@@ -0,0 +1,32 @@
+-- Incremental streaks (see app/services/streaks.py): the outbox consumer compares
+-- each solve day with users.last_active_date instead of counting every first solve.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS last_active_date DATE;
+
+-- Backfill streak_count, longest_streak and last_active_date from daily_stats with
+-- gaps and islands: consecutive dates minus their row number share one island key.
+-- Same computation as `python -m app.services.streaks --recompute`.
+WITH days AS (
+    SELECT user_id, date,
+           date - CAST(ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY date) AS INTEGER) AS island
+    FROM daily_stats
+    WHERE problems_solved > 0
+),
+islands AS (
+    SELECT user_id, MAX(date) AS last_day, COUNT(*) AS length
+    FROM days
+    GROUP BY user_id, island
+),
+ranked AS (
+    SELECT user_id, last_day, length,
+           MAX(length) OVER (PARTITION BY user_id) AS longest,
+           ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY last_day DESC) AS recency
+    FROM islands
+)
+UPDATE users u
+SET streak_count = r.length,
+    longest_streak = r.longest,
+    last_active_date = r.last_day
+FROM ranked r
+WHERE r.user_id = u.id AND r.recency = 1;
+
+INSERT INTO schema_version (version) VALUES (11) ON CONFLICT DO NOTHING;
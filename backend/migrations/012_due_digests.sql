@@ -0,0 +1,20 @@
+-- Daily due digest per user (see app/services/due_digest.py), written in
+-- keyset chunks by `python -m app.services.due_digest`.
+CREATE TABLE IF NOT EXISTS due_digests (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    digest_date DATE NOT NULL,
+    due_count INTEGER NOT NULL, -- due on or before digest_date
+    overdue_count INTEGER NOT NULL, -- due before digest_date
+    top_overdue JSONB NOT NULL DEFAULT '[]', -- most overdue first
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, digest_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_due_digests_date ON due_digests(digest_date);
+
+ALTER TABLE due_digests ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Users can view own digests" ON due_digests;
+CREATE POLICY "Users can view own digests" ON due_digests
+    FOR SELECT USING (auth.uid() = user_id);
+
+INSERT INTO schema_version (version) VALUES (12) ON CONFLICT DO NOTHING;
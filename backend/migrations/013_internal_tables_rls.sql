@@ -0,0 +1,8 @@
+-- Internal tables get RLS with no policies: only the backend (table owner /
+-- service role) can read or write them, PostgREST clients with the anon key
+-- cannot. For databases that ran the earlier migrations before they did this.
+ALTER TABLE quota_buckets ENABLE ROW LEVEL SECURITY;
+ALTER TABLE outbox_events ENABLE ROW LEVEL SECURITY;
+ALTER TABLE idempotency_keys ENABLE ROW LEVEL SECURITY;
+
+INSERT INTO schema_version (version) VALUES (13) ON CONFLICT DO NOTHING;
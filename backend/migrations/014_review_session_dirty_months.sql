@@ -0,0 +1,22 @@
+-- Closed months that received review_sessions (e.g. backdated by /import); the
+-- next rollup run redoes them (see app/services/session_rollups.py). Before this,
+-- imported months were never rolled up.
+CREATE TABLE IF NOT EXISTS review_session_dirty_months (
+    month DATE PRIMARY KEY, -- first day of the month
+    generation INTEGER NOT NULL DEFAULT 1, -- bumped on every mark
+    marked_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Internal: RLS with no policies keeps it away from PostgREST (backend only)
+ALTER TABLE review_session_dirty_months ENABLE ROW LEVEL SECURITY;
+
+-- Redo every month already holding sessions once, to pick up earlier imports.
+-- Months past SESSION_RETENTION_MONTHS have their remaining raw rows added to
+-- their rollups: if retention is being turned on now, run the rollup job once
+-- with the old setting first.
+INSERT INTO review_session_dirty_months (month)
+SELECT DISTINCT date_trunc('month', session_date)::date FROM review_sessions
+WHERE session_date < date_trunc('month', CURRENT_DATE)
+ON CONFLICT DO NOTHING;
+
+INSERT INTO schema_version (version) VALUES (14) ON CONFLICT DO NOTHING;
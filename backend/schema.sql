@@ -18,6 +18,7 @@ CREATE TABLE users (
     daily_goal INTEGER DEFAULT 5,
     streak_count INTEGER DEFAULT 0,
     longest_streak INTEGER DEFAULT 0,
+    last_active_date DATE, -- last day (in timezone) counted toward the streak
     total_problems_solved INTEGER DEFAULT 0,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
@@ -41,11 +42,21 @@ CREATE TABLE problems (
     complexity_analysis JSONB DEFAULT '{}'::jsonb,
     key_insights JSONB DEFAULT '[]'::jsonb,
     similar_problems JSONB DEFAULT '[]'::jsonb,
+    analysis_model VARCHAR(100), -- Gemini model that produced cached_analysis
+    analysis_prompt_hash VARCHAR(32), -- Hash of the prompt template used
+    analyzed_at TIMESTAMPTZ,
     
     -- Metadata
     topics JSONB DEFAULT '[]'::jsonb,
     companies JSONB DEFAULT '[]'::jsonb,
     
+    -- Full-text search (/search): title > key insight > description
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', COALESCE(title, '')), 'A') ||
+        setweight(to_tsvector('english', COALESCE(cached_analysis->>'key_insight', '')), 'B') ||
+        setweight(to_tsvector('english', COALESCE(description, '')), 'C')
+    ) STORED,
+    
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
@@ -79,6 +90,7 @@ CREATE TABLE user_problem_progress (
     
     -- Notes
     personal_notes TEXT,
+    notes_vector TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', COALESCE(personal_notes, ''))) STORED,
     code_snippets JSONB DEFAULT '[]'::jsonb,
     
     created_at TIMESTAMPTZ DEFAULT NOW(),
@@ -91,7 +103,7 @@ CREATE TABLE user_problem_progress (
 -- 4. REVIEW_SESSIONS TABLE (History)
 -- ============================================
 CREATE TABLE review_sessions (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID DEFAULT uuid_generate_v4(),
     user_id UUID REFERENCES users(id) ON DELETE CASCADE,
     problem_id UUID REFERENCES problems(id) ON DELETE CASCADE,
     progress_id UUID REFERENCES user_problem_progress(id) ON DELETE CASCADE,
@@ -107,9 +119,54 @@ CREATE TABLE review_sessions (
     interval_before INTEGER,
     interval_after INTEGER,
     
-    session_date DATE DEFAULT CURRENT_DATE,
-    created_at TIMESTAMPTZ DEFAULT NOW()
-);
+    session_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    
+    PRIMARY KEY (id, session_date)
+) PARTITION BY RANGE (session_date);
+
+-- Monthly partitions (review_sessions_YYYY_MM) are created ahead of time by
+-- ensure_review_session_partitions(); the default partition catches anything else
+CREATE TABLE review_sessions_default PARTITION OF review_sessions DEFAULT;
+
+-- Creates monthly partitions from the oldest month present in the default partition
+-- (or the current month) through months_ahead months from now. Rows in the default
+-- partition are moved into their month's partition. Run by services/session_rollups.py.
+CREATE OR REPLACE FUNCTION ensure_review_session_partitions(months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    part_month DATE;
+    last_month DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    SELECT LEAST(date_trunc('month', MIN(session_date)), date_trunc('month', CURRENT_DATE))::date
+    INTO part_month FROM review_sessions_default;
+    part_month := COALESCE(part_month, date_trunc('month', CURRENT_DATE)::date);
+    last_month := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+
+    WHILE part_month <= last_month LOOP
+        partition_name := 'review_sessions_' || to_char(part_month, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE review_sessions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM review_sessions_default WHERE session_date >= %L AND session_date < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                part_month, (part_month + INTERVAL '1 month')::date, partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE review_sessions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, part_month, (part_month + INTERVAL '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        part_month := (part_month + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_review_session_partitions(3);
 
 -- ============================================
 -- 5. DAILY_STATS TABLE (For Heatmap/Streaks)
@@ -125,6 +182,7 @@ CREATE TABLE daily_stats (
     patterns_practiced JSONB DEFAULT '[]'::jsonb,
     
     created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
     
     UNIQUE(user_id, date)
 );
@@ -149,6 +207,129 @@ CREATE TABLE pattern_mastery (
     UNIQUE(user_id, pattern_name)
 );
 
+-- ============================================
+-- 7. SCHEMA_VERSION TABLE
+-- ============================================
+-- Checked once at startup instead of running create_all on every boot.
+-- Every file in migrations/ inserts its own version row.
+CREATE TABLE schema_version (
+    version INTEGER PRIMARY KEY,
+    applied_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+INSERT INTO schema_version (version) VALUES (14);
+
+-- ============================================
+-- 8. QUOTA_BUCKETS TABLE
+-- ============================================
+-- Gemini RPM/TPM window shared by all API workers (row-locked per call).
+CREATE TABLE quota_buckets (
+    name VARCHAR(50) PRIMARY KEY,
+    window_start DOUBLE PRECISION NOT NULL DEFAULT 0, -- epoch seconds
+    requests INTEGER NOT NULL DEFAULT 0,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    last_request_at DOUBLE PRECISION NOT NULL DEFAULT 0 -- epoch seconds
+);
+
+-- ============================================
+-- 9. REVIEW_SESSION_ROLLUPS TABLE
+-- ============================================
+-- Per-user monthly summaries of review_sessions; analytics read these instead of raw rows
+CREATE TABLE review_session_rollups (
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    month DATE NOT NULL, -- First day of the month
+    reviews INTEGER NOT NULL DEFAULT 0,
+    successful_reviews INTEGER NOT NULL DEFAULT 0,
+    problems_reviewed INTEGER NOT NULL DEFAULT 0,
+    average_quality DOUBLE PRECISION,
+    ef_drift DOUBLE PRECISION NOT NULL DEFAULT 0, -- Sum of ef_after - ef_before
+    computed_at TIMESTAMPTZ DEFAULT NOW(),
+    
+    PRIMARY KEY (user_id, month)
+);
+
+-- ============================================
+-- 10. OUTBOX_EVENTS TABLE
+-- ============================================
+-- Written in the same transaction as /solve's progress update; the outbox
+-- consumer applies sessions, daily stats, streaks and pattern mastery from it
+CREATE TABLE outbox_events (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    event_type VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    processed_at TIMESTAMPTZ
+);
+
+-- ============================================
+-- 11. PROBLEM_PATTERNS TABLE
+-- ============================================
+-- One row per pattern in problems.patterns; pattern filters and counts join
+-- this table instead of unpacking the JSON array
+CREATE TABLE problem_patterns (
+    problem_id UUID NOT NULL REFERENCES problems(id) ON DELETE CASCADE,
+    pattern_name VARCHAR(100) NOT NULL,
+    confidence REAL,
+    PRIMARY KEY (problem_id, pattern_name)
+);
+
+-- ============================================
+-- 12. SYNC_TOMBSTONES TABLE
+-- ============================================
+-- Rows deleted from a user's /sync replica, served as deletions to clients
+-- whose cursor predates them; pruned after SYNC_TOMBSTONE_RETENTION_DAYS
+CREATE TABLE sync_tombstones (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    entity VARCHAR(20) NOT NULL, -- problem, progress or daily_stats
+    entity_id VARCHAR(64) NOT NULL,
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- ============================================
+-- 13. IDEMPOTENCY_KEYS TABLE
+-- ============================================
+-- Response stored under a client's Idempotency-Key for /solve and /analyze,
+-- written in the request's own transaction; retries replay it
+CREATE TABLE idempotency_keys (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    key VARCHAR(255) NOT NULL,
+    request_hash CHAR(64) NOT NULL, -- sha256 of endpoint + body
+    response JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (user_id, key)
+);
+
+-- ============================================
+-- 14. DUE_DIGESTS TABLE
+-- ============================================
+-- Each user's due and overdue review counts and most overdue problems for a
+-- day, written by the daily batch job; kept for DUE_DIGEST_RETENTION_DAYS
+CREATE TABLE due_digests (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    digest_date DATE NOT NULL,
+    due_count INTEGER NOT NULL, -- due on or before digest_date
+    overdue_count INTEGER NOT NULL, -- due before digest_date
+    top_overdue JSONB NOT NULL DEFAULT '[]', -- most overdue first
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, digest_date)
+);
+
+-- ============================================
+-- 15. REVIEW_SESSION_DIRTY_MONTHS TABLE
+-- ============================================
+-- Closed months that received review_sessions (e.g. backdated by /import);
+-- the next rollup run redoes them (see app/services/session_rollups.py)
+CREATE TABLE review_session_dirty_months (
+    month DATE PRIMARY KEY, -- first day of the month
+    generation INTEGER NOT NULL DEFAULT 1, -- bumped on every mark
+    marked_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
 -- ============================================
 -- INDEXES FOR PERFORMANCE
 -- ============================================
@@ -157,9 +338,19 @@ CREATE INDEX idx_user_progress_next_review ON user_problem_progress(user_id, nex
 CREATE INDEX idx_user_progress_status ON user_problem_progress(user_id, status);
 CREATE INDEX idx_problems_slug ON problems(slug);
 CREATE INDEX idx_problems_title ON problems(title);
-CREATE INDEX idx_problems_patterns ON problems USING GIN (patterns);
+CREATE INDEX idx_problems_analysis_version ON problems(analysis_model, analysis_prompt_hash);
+CREATE INDEX idx_problems_search ON problems USING GIN (search_vector);
+CREATE INDEX idx_user_progress_notes_search ON user_problem_progress USING GIN (notes_vector);
 CREATE INDEX idx_review_sessions_user_date ON review_sessions(user_id, session_date);
 CREATE INDEX idx_daily_stats_user_date ON daily_stats(user_id, date);
+CREATE INDEX idx_outbox_events_pending ON outbox_events(user_id, id) WHERE processed_at IS NULL;
+CREATE INDEX idx_outbox_events_processed ON outbox_events(processed_at) WHERE processed_at IS NOT NULL;
+CREATE INDEX idx_problem_patterns_pattern ON problem_patterns(pattern_name, problem_id);
+CREATE INDEX idx_user_progress_updated ON user_problem_progress(user_id, updated_at);
+CREATE INDEX idx_daily_stats_updated ON daily_stats(user_id, updated_at);
+CREATE INDEX idx_sync_tombstones_user ON sync_tombstones(user_id, deleted_at);
+CREATE INDEX idx_idempotency_keys_expires ON idempotency_keys(expires_at);
+CREATE INDEX idx_due_digests_date ON due_digests(digest_date);
 
 -- ============================================
 -- UPDATED_AT TRIGGER FUNCTION
@@ -189,14 +380,21 @@ CREATE TRIGGER update_pattern_mastery_updated_at
     BEFORE UPDATE ON pattern_mastery
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+CREATE TRIGGER update_daily_stats_updated_at
+    BEFORE UPDATE ON daily_stats
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
 -- ============================================
 -- ROW LEVEL SECURITY (RLS) POLICIES
 -- ============================================
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE user_problem_progress ENABLE ROW LEVEL SECURITY;
 ALTER TABLE review_sessions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE review_session_rollups ENABLE ROW LEVEL SECURITY;
 ALTER TABLE daily_stats ENABLE ROW LEVEL SECURITY;
 ALTER TABLE pattern_mastery ENABLE ROW LEVEL SECURITY;
+ALTER TABLE sync_tombstones ENABLE ROW LEVEL SECURITY;
+ALTER TABLE due_digests ENABLE ROW LEVEL SECURITY;
 
 -- Users can only access their own data
 CREATE POLICY "Users can view own data" ON users
@@ -208,12 +406,28 @@ CREATE POLICY "Users can manage own progress" ON user_problem_progress
 CREATE POLICY "Users can view own sessions" ON review_sessions
     FOR ALL USING (auth.uid() = user_id);
 
+CREATE POLICY "Users can view own rollups" ON review_session_rollups
+    FOR ALL USING (auth.uid() = user_id);
+
 CREATE POLICY "Users can view own stats" ON daily_stats
     FOR ALL USING (auth.uid() = user_id);
 
 CREATE POLICY "Users can view own mastery" ON pattern_mastery
     FOR ALL USING (auth.uid() = user_id);
 
+CREATE POLICY "Users can view own tombstones" ON sync_tombstones
+    FOR SELECT USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can view own digests" ON due_digests
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- Internal tables: RLS on and no policies, so only the backend (table owner /
+-- service role) can reach them; PostgREST clients with the anon key cannot
+ALTER TABLE idempotency_keys ENABLE ROW LEVEL SECURITY;
+ALTER TABLE review_session_dirty_months ENABLE ROW LEVEL SECURITY;
+ALTER TABLE outbox_events ENABLE ROW LEVEL SECURITY;
+ALTER TABLE quota_buckets ENABLE ROW LEVEL SECURITY;
+
 -- Problems are public (cached LeetCode data)
 ALTER TABLE problems ENABLE ROW LEVEL SECURITY;
 CREATE POLICY "Problems are viewable by all" ON problems
@@ -222,3 +436,7 @@ CREATE POLICY "Problems can be inserted by authenticated" ON problems
     FOR INSERT WITH CHECK (auth.role() = 'authenticated');
 CREATE POLICY "Problems can be updated by authenticated" ON problems
     FOR UPDATE USING (auth.role() = 'authenticated');
+
+ALTER TABLE problem_patterns ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Problem patterns are viewable by all" ON problem_patterns
+    FOR SELECT USING (true);
@@ -0,0 +1,89 @@
+"""
+Concurrency check for /solve and daily_stats.
+Fires parallel solves for one user and verifies that today's heatmap count
+went up by exactly the number of solves (no duplicate rows, no lost updates).
+Daily stats are applied by the outbox consumer, so the check waits for it.
+They are keyed by the user's local date, so the solves pin the test user's
+timezone (TEST_TIMEZONE, UTC by default) and "today" is read in that zone.
+
+Run against a local server:
+    python test_concurrent_solves.py
+    AUTH_TOKEN=<supabase access token> python test_concurrent_solves.py
+"""
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import requests
+
+# Configuration
+BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+AUTH_TOKEN = os.getenv("AUTH_TOKEN")
+PARALLEL_SOLVES = int(os.getenv("PARALLEL_SOLVES", "20"))
+OUTBOX_WAIT_SECONDS = float(os.getenv("OUTBOX_WAIT_SECONDS", "15"))
+TEST_TIMEZONE = os.getenv("TEST_TIMEZONE", "UTC")
+RED = "\033[91m"
+GREEN = "\033[92m"
+CYAN = "\033[96m"
+RESET = "\033[0m"
+
+HEADERS = {"Authorization": f"Bearer {AUTH_TOKEN}"} if AUTH_TOKEN else {}
+
+def log_test(name, result, detail=None):
+    if result:
+        print(f"{GREEN}[PASS] {name}{RESET}")
+    else:
+        print(f"{RED}[FAIL] {name}{RESET}")
+        if detail:
+            print(f"{RED}Error: {detail}{RESET}")
+
+def solves_on(day):
+    res = requests.get(f"{BASE_URL}/heatmap", headers=HEADERS)
+    res.raise_for_status()
+    return res.json().get(day, 0)
+
+def solve(index, run_id):
+    # Distinct problems, so the only shared row is today's daily_stats
+    payload = {
+        "title": f"Concurrency Check {run_id} #{index}",
+        "difficulty": "Easy",
+        "quality": 4,
+        "url": f"https://leetcode.com/problems/concurrency-check-{run_id}-{index}/",
+        "timezone": TEST_TIMEZONE,
+    }
+    return requests.post(f"{BASE_URL}/solve", json=payload, headers=HEADERS)
+
+def test_concurrent_solves():
+    print(f"{CYAN}Firing {PARALLEL_SOLVES} parallel solves at {BASE_URL}...{RESET}\n")
+
+    # The local day the solves land on; a run that straddles midnight there can miscount
+    today = datetime.now(ZoneInfo(TEST_TIMEZONE)).strftime("%Y-%m-%d")
+    try:
+        # Also makes sure the user row exists before the burst
+        before = solves_on(today)
+    except Exception as e:
+        print(f"{RED}[FAIL] Server not reachable or not authorized: {e}{RESET}")
+        return
+
+    run_id = uuid.uuid4().hex[:8]
+    with ThreadPoolExecutor(max_workers=PARALLEL_SOLVES) as pool:
+        responses = list(pool.map(lambda i: solve(i, run_id), range(PARALLEL_SOLVES)))
+
+    failed = [r for r in responses if r.status_code != 200]
+    log_test("All parallel solves succeeded", not failed, failed[0].text if failed else None)
+
+    expected = before + (PARALLEL_SOLVES - len(failed))
+    deadline = time.time() + OUTBOX_WAIT_SECONDS
+    after = solves_on(today)
+    while after < expected and time.time() < deadline:
+        time.sleep(0.5)
+        after = solves_on(today)
+    print(f"   > Solves today: {before} -> {after} (expected {expected})")
+    log_test("Daily count matches the number of solves", after == expected,
+             f"{after - expected:+d} solves lost or double-counted")
+
+if __name__ == "__main__":
+    test_concurrent_solves()
@@ -0,0 +1,82 @@
+"""
+Shared setup for the unit tests (pytest, run from backend/: python -m pytest tests).
+
+The tests run against a throwaway in-memory SQLite database unless
+DATABASE_URL is already set; app.database reads it at import time.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+# Tests drive the outbox consumer and the background jobs themselves
+os.environ.setdefault("OUTBOX_CONSUMER", "external")
+os.environ.setdefault("ANALYSIS_REFRESH_DAILY_BUDGET", "0")
+os.environ.setdefault("SIMILARITY_INDEX_DIR", tempfile.mkdtemp(prefix="similarity-test-"))
+
+
+@pytest.fixture
+def run_db():
+    """
+    run_db(scenario) runs `async def scenario(db)` on freshly created tables and returns
+    its result. Each call gets its own event loop, so the engine's pool is disposed after it.
+    """
+    from app.database import engine, AsyncSessionLocal, Base
+    import app.models  # noqa: F401  (registers the tables)
+
+    engine.echo = False
+
+    def run(scenario):
+        async def go():
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+                await conn.run_sync(Base.metadata.create_all)
+            try:
+                async with AsyncSessionLocal() as db:
+                    return await scenario(db)
+            finally:
+                await engine.dispose()
+        return asyncio.run(go())
+
+    return run
+
+
+@pytest.fixture
+def client():
+    """TestClient for the app, signed in as a fresh user (client.user_id)."""
+    from fastapi.testclient import TestClient
+    from app import main
+    from app.database import engine
+
+    engine.echo = False
+    user_id = str(uuid.uuid4())
+    main.app.dependency_overrides[main.get_authenticated_user] = lambda: {"id": user_id, "email": f"{user_id}@example.com"}
+    try:
+        with TestClient(main.app) as test_client:
+            test_client.user_id = user_id
+            yield test_client
+    finally:
+        main.app.dependency_overrides.clear()
+
+
+async def add_user(db, **fields):
+    from app.models import User
+
+    user = User(id=uuid.uuid4(), email=f"{uuid.uuid4().hex}@example.com", **fields)
+    db.add(user)
+    await db.commit()
+    return user
+
+
+async def add_problem(db, title="Two Sum", **fields):
+    from app.models import Problem
+
+    problem = Problem(id=uuid.uuid4(), title=title, difficulty="Easy", **fields)
+    db.add(problem)
+    await db.commit()
+    return problem
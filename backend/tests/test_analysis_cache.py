@@ -0,0 +1,87 @@
+"""The background refresher backs off failing problems and spends no budget while Gemini is down."""
+from sqlalchemy import update
+
+from app.models import QuotaBucket
+from app.services import analysis_cache
+from app.services.analysis_cache import BUDGET_BUCKET, AnalysisRefresher
+from app.services.circuit_breaker import CircuitOpenError
+from conftest import add_problem
+
+
+class _FailingGemini:
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    async def analyze_problem(self, description):
+        self.calls += 1
+        raise self.error
+
+
+def _outdated(title):
+    return dict(title=title, description=f"{title} statement", cached_analysis={"patterns": []},
+                analysis_model="old-model", analysis_prompt_hash="old")
+
+
+def test_failed_refresh_backs_off(run_db, monkeypatch):
+    gemini = _FailingGemini(ValueError("bad JSON"))
+    monkeypatch.setattr(analysis_cache, "get_gemini_service", lambda: gemini)
+
+    async def scenario(db):
+        bad = await add_problem(db, **_outdated("Bad"))
+        good = await add_problem(db, **_outdated("Good"))
+        refresher = AnalysisRefresher(daily_budget=10)
+        assert set(await refresher.next_outdated(db)) == {bad.id, good.id}
+
+        await refresher._take_budget()
+        await refresher._refresh_one(bad.id)
+        return refresher, bad, good, await refresher.next_outdated(db)
+
+    refresher, bad, good, after = run_db(scenario)
+    assert gemini.calls == 1
+    assert after == [good.id]  # the failed one is not picked again on the next pass
+    failures, _ = refresher.cooldowns[bad.id]
+    assert failures == 1
+    refresher._record_failure(bad.id)
+    assert refresher.cooldowns[bad.id][0] == 2
+    assert refresher.snapshot()["backing_off"] == 1
+
+
+def test_rejected_call_returns_its_budget(run_db, monkeypatch):
+    monkeypatch.setattr(analysis_cache, "get_gemini_service", lambda: _FailingGemini(CircuitOpenError("open")))
+
+    async def scenario(db):
+        problem = await add_problem(db, **_outdated("Any"))
+        refresher = AnalysisRefresher(daily_budget=1)
+        await refresher._take_budget()
+        await refresher._refresh_one(problem.id)
+        used = refresher.used_today
+        return refresher, problem, used, await refresher._take_budget()
+
+    refresher, problem, used, shared = run_db(scenario)
+    assert used == 0
+    assert shared is True  # the returned unit is available to the next caller
+    assert problem.id not in refresher.cooldowns  # an outage is not the problem's fault
+
+
+def test_schedule_skips_while_circuit_is_open(monkeypatch):
+    monkeypatch.setattr(analysis_cache.breaker, "state", "open")
+    monkeypatch.setattr(analysis_cache.breaker, "opened_at", float("inf"))
+    refresher = AnalysisRefresher(daily_budget=5)
+    refresher.schedule(object())
+    assert refresher.used_today == 0 and not refresher.in_flight
+
+
+def test_workers_share_one_daily_budget(run_db):
+    async def scenario(db):
+        first, second = AnalysisRefresher(daily_budget=3), AnalysisRefresher(daily_budget=3)
+        taken = [await refresher._take_budget() for refresher in (first, second, first, second, first)]
+        # A new UTC day starts a new count
+        await db.execute(update(QuotaBucket).where(QuotaBucket.name == BUDGET_BUCKET).values(window_start=0.0))
+        await db.commit()
+        return taken, await second._take_budget(), first, second
+
+    taken, next_day, first, second = run_db(scenario)
+    assert taken == [True, True, True, False, False]
+    assert next_day is True
+    assert (first.used_today, second.used_today, first.db_errors) == (2, 2, 0)
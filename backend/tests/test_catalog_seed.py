@@ -0,0 +1,70 @@
+"""Catalog upserts survive title / leetcode_id collisions with other slugs."""
+import argparse
+
+import pytest
+from sqlalchemy import select
+
+from app.models import Problem
+from app.services import pattern_catalog
+from app.services.analysis_cache import store_analysis
+from app.services.catalog_seed import upsert_catalog_batch, _positive_rate
+from app.services.pattern_catalog import catalog_pattern_totals
+from app.services.problem_patterns import backfill
+from conftest import add_problem
+
+
+def _row(slug, title, leetcode_id=None, topics=()):
+    return {"slug": slug, "title": title, "leetcode_id": leetcode_id, "difficulty": "Easy", "topics": list(topics),
+            "description": None, "url": f"https://leetcode.com/problems/{slug}/"}
+
+
+def test_collisions_are_skipped_or_resolved(run_db):
+    async def scenario(db):
+        await add_problem(db, title="Two Sum", slug="two-sum-old", leetcode_id=1)
+        await add_problem(db, title="Added By Analyze")  # no slug yet
+        skipped = []
+        upserted = await upsert_catalog_batch(db, [
+            _row("two-sum", "Two Sum", 1),             # title owned by another slug: skipped
+            _row("three-sum", "3Sum", 1),              # leetcode_id owned by another slug: stored without it
+            _row("added-by-analyze", "Added By Analyze", 7),  # gets its slug, then upserted
+            _row("four-sum", "4Sum", 18),
+            _row("four-sum-ii", "4Sum", 454),          # same title as a row earlier in the batch
+        ], skipped)
+        problems = {p.slug: p for p in (await db.execute(select(Problem))).scalars()}
+        return upserted, skipped, problems
+
+    upserted, skipped, problems = run_db(scenario)
+    assert upserted == 3
+    assert [row["slug"] for row in skipped] == ["two-sum", "four-sum-ii"]
+    assert problems["three-sum"].leetcode_id is None
+    assert problems["two-sum-old"].leetcode_id == 1
+    assert problems["added-by-analyze"].leetcode_id == 7
+    assert problems["four-sum"].leetcode_id == 18
+
+
+def test_unanalyzed_catalog_problems_count_toward_pattern_totals(run_db, monkeypatch):
+    monkeypatch.setattr(pattern_catalog, "_cached_at", 0.0)
+
+    async def scenario(db):
+        await upsert_catalog_batch(db, [
+            _row("two-sum", "Two Sum", 1, ["Array", "Hash Table"]),
+            _row("contains-duplicate", "Contains Duplicate", 217, ["Array", "Hash Table", "Sorting"]),
+            _row("valid-anagram", "Valid Anagram", 242, ["Hash Table", "String", "Sorting"]),
+        ])
+        # An analysis replaces the topic rows; re-seeding does not bring them back
+        problem = (await db.execute(select(Problem).where(Problem.slug == "valid-anagram"))).scalar_one()
+        await store_analysis(db, problem, {"patterns": [{"name": "Frequency Counting", "confidence": 0.9}]})
+        await db.commit()
+        await upsert_catalog_batch(db, [_row("valid-anagram", "Valid Anagram", 242, ["Hash Table", "Sorting"])])
+        return await catalog_pattern_totals(db), await backfill(db)
+
+    totals, backfilled = run_db(scenario)
+    assert totals == {"Array": 2, "Hash Map": 2, "Sorting": 1, "Frequency Counting": 1}
+    assert backfilled == {"problems": 0, "rows": 0}
+
+
+def test_rate_must_be_positive():
+    assert _positive_rate("2.5") == 2.5
+    for value in ("0", "-1"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            _positive_rate(value)
@@ -0,0 +1,78 @@
+"""History import: oldest-first SM-2 replay for any file order, counted like /solve."""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from app.models import DailyStats, ReviewSession, User, UserProblemProgress
+from app.services.history_import import HistoryImporter
+from conftest import add_user, add_problem
+
+DAY = datetime(2026, 3, 2, 15, 0)
+
+
+def _export(days, slug="two-sum"):
+    """LeetCode's order: newest submission first."""
+    return [{"slug": slug, "status": "Accepted", "quality": 5,
+             "timestamp": (DAY + timedelta(days=offset)).isoformat() + "Z"} for offset in reversed(days)]
+
+
+async def _state(db, user_id):
+    db.expire_all()
+    user = await db.get(User, user_id)
+    progress = {row.times_solved: (row.repetitions, row.interval)
+                for row in (await db.execute(select(UserProblemProgress))).scalars()}
+    stats = {row.date: row.problems_solved for row in (await db.execute(select(DailyStats))).scalars()}
+    sessions = (await db.execute(select(ReviewSession.session_date, ReviewSession.interval_before)
+                                 .order_by(ReviewSession.session_date, ReviewSession.problem_id))).all()
+    return user, progress, stats, sessions
+
+
+def test_descending_file_larger_than_a_batch(run_db):
+    async def scenario(db):
+        user_id = (await add_user(db)).id
+        # 7 daily solves of one problem, plus one of another on day 2, newest first across 3 batches
+        records = _export(range(7)) + _export([2], slug="valid-parentheses")
+        stats = await HistoryImporter(db, user_id, batch_size=3).run(records)
+        again = await HistoryImporter(db, user_id, batch_size=3).run(records)
+        return stats, again, await _state(db, user_id)
+
+    stats, again, (user, progress, daily, sessions) = run_db(scenario)
+    assert (stats.rows_read, stats.reviews_applied, stats.rows_skipped) == (8, 8, 0)
+    assert (again.reviews_applied, again.rows_skipped) == (0, 8)  # re-imports are a no-op
+    assert progress[7][0] == 7  # every solve replayed: 7 repetitions, not 1
+    assert [interval for day, interval in sessions[:2]] == [0, 1]  # the oldest solve came first
+    days = [DAY.date() + timedelta(days=offset) for offset in range(7)]
+    assert daily == {day: (2 if day == days[2] else 1) for day in days}
+    assert user.total_problems_solved == 7  # one per solve day, as /solve counts
+    assert (user.streak_count, user.longest_streak, user.last_active_date) == (7, 7, days[-1])
+
+
+def test_days_follow_the_users_timezone(run_db):
+    async def scenario(db):
+        user_id = (await add_user(db, timezone="America/New_York")).id
+        # 03:30 UTC on Mar 3 is still Mar 2 in New York, as is 15:00 UTC on Mar 2
+        records = [{"slug": "two-sum", "timestamp": "2026-03-03T03:30:00Z"},
+                   {"slug": "two-sum", "timestamp": "2026-03-02T15:00:00Z"}]
+        stats = await HistoryImporter(db, user_id).run(records)
+        return stats, await _state(db, user_id)
+
+    stats, (user, progress, daily, sessions) = run_db(scenario)
+    assert (stats.reviews_applied, stats.rows_skipped) == (1, 1)
+    assert daily == {date(2026, 3, 2): 1}
+    assert [day for day, _ in sessions] == [date(2026, 3, 2)]
+
+
+def test_rows_match_an_existing_problem_by_leetcode_id(run_db):
+    async def scenario(db):
+        user_id = (await add_user(db)).id
+        # Stored under another slug and title: the insert would conflict on leetcode_id
+        problem_id = (await add_problem(db, title="Two Sum (legacy)", slug="two-sum-legacy", leetcode_id=1)).id
+        stats = await HistoryImporter(db, user_id).run(
+            [{"slug": "two-sum", "title": "Two Sum", "leetcode_id": "1", "timestamp": "2026-03-02T12:00:00Z"}]
+        )
+        tracked = (await db.execute(select(UserProblemProgress.problem_id))).scalars().all()
+        return stats, tracked, problem_id
+
+    stats, tracked, problem_id = run_db(scenario)
+    assert (stats.reviews_applied, stats.rows_skipped, stats.problems_created) == (1, 0, 0)
+    assert tracked == [problem_id]
@@ -0,0 +1,89 @@
+"""The outbox consumer applies queued solves: sessions, daily stats, streaks, counters, pattern mastery."""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from app.models import (
+    DailyStats, OutboxEvent, PatternMastery, ProblemPattern, ReviewSession, User, UserProblemProgress,
+)
+from app.services.outbox import SOLVE_RECORDED, OutboxConsumer, enqueue
+from conftest import add_user, add_problem
+
+DAY = date(2026, 3, 2)
+
+
+def _solve(problem_id, progress_id, day, quality):
+    return {
+        "problem_id": str(problem_id), "progress_id": str(progress_id), "quality": quality,
+        "ef_before": 2.5, "ef_after": 2.6, "interval_before": 1, "interval_after": 6,
+        "solved_at": datetime.combine(day, datetime.min.time()).replace(hour=12).isoformat(),
+        "solved_on": day.isoformat(),
+    }
+
+
+async def _tracked(db, user_id, title, pattern):
+    problem = await add_problem(db, title=title)
+    problem_id = problem.id
+    progress = UserProblemProgress(user_id=user_id, problem_id=problem_id)
+    db.add_all([progress, ProblemPattern(problem_id=problem_id, pattern_name=pattern)])
+    await db.commit()
+    return problem_id, progress.id
+
+
+def test_drain_applies_a_users_solves(run_db):
+    async def scenario(db):
+        user_id = (await add_user(db, streak_count=2, longest_streak=2,
+                                  last_active_date=DAY - timedelta(days=1))).id
+        two_sum = await _tracked(db, user_id, "Two Sum", "Hash Map")
+        three_sum = await _tracked(db, user_id, "3Sum", "Two Pointers")
+        enqueue(db, user_id, SOLVE_RECORDED, _solve(*two_sum, DAY, 4))
+        enqueue(db, user_id, SOLVE_RECORDED, _solve(*three_sum, DAY, 2))
+        enqueue(db, user_id, SOLVE_RECORDED, _solve(*two_sum, DAY + timedelta(days=1), 5))
+        await db.commit()
+
+        consumer = OutboxConsumer(batch_size=10)
+        applied = await consumer.drain()
+        again = await consumer.drain()
+
+        db.expire_all()
+        user = await db.get(User, user_id)
+        stats = {row.date: row.problems_solved for row in (await db.execute(select(DailyStats))).scalars()}
+        sessions = (await db.execute(select(ReviewSession.quality_rating, ReviewSession.solved_successfully)
+                                     .order_by(ReviewSession.quality_rating))).all()
+        mastery = {row.pattern_name: (row.problems_solved, row.average_quality)
+                   for row in (await db.execute(select(PatternMastery))).scalars()}
+        pending = (await db.execute(select(OutboxEvent).where(OutboxEvent.processed_at.is_(None)))).all()
+        return applied, again, user, stats, sessions, mastery, pending
+
+    applied, again, user, stats, sessions, mastery, pending = run_db(scenario)
+    assert (applied, again) == (3, 0)
+    assert pending == []
+    assert stats == {DAY: 2, DAY + timedelta(days=1): 1}
+    assert sessions == [(2, False), (4, True), (5, True)]
+    assert mastery == {"Hash Map": (2, 4.5), "Two Pointers": (1, 2.0)}
+    assert (user.streak_count, user.longest_streak, user.last_active_date) == (4, 4, DAY + timedelta(days=1))
+    assert user.total_problems_solved == 2  # days with a first solve
+
+
+def test_failing_event_holds_back_the_users_later_events(run_db):
+    async def scenario(db):
+        user_id = (await add_user(db)).id
+        other_id = (await add_user(db)).id
+        two_sum = await _tracked(db, user_id, "Two Sum", "Hash Map")
+        other = await _tracked(db, other_id, "3Sum", "Two Pointers")
+        enqueue(db, user_id, "no_such_event", {})
+        enqueue(db, user_id, SOLVE_RECORDED, _solve(*two_sum, DAY, 4))
+        enqueue(db, other_id, SOLVE_RECORDED, _solve(*other, DAY, 4))
+        await db.commit()
+
+        consumer = OutboxConsumer(batch_size=10)
+        applied = await consumer.process_pending()
+        db.expire_all()
+        events = (await db.execute(select(OutboxEvent).order_by(OutboxEvent.id))).scalars().all()
+        return applied, consumer.failures, [(e.processed_at is not None, e.attempts, e.last_error) for e in events]
+
+    applied, failures, events = run_db(scenario)
+    assert (applied, failures) == (1, 1)
+    assert events[0][:2] == (False, 1) and "unknown outbox event type" in events[0][2]
+    assert events[1] == (False, 0, None)  # queued behind the failure, in order
+    assert events[2] == (True, 0, None)  # other users are unaffected
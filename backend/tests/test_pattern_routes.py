@@ -0,0 +1,37 @@
+"""Pattern routes accept names containing "/"."""
+import asyncio
+import uuid
+
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal, engine
+from app.models import Problem, ProblemPattern
+
+
+def _tag(problem_title, pattern_name):
+    async def go():
+        async with AsyncSessionLocal() as db:
+            problem_id = (await db.execute(select(Problem.id).where(Problem.title == problem_title))).scalar_one()
+            db.add(ProblemPattern(problem_id=problem_id, pattern_name=pattern_name))
+            await db.commit()
+        await engine.dispose()
+    asyncio.run(go())
+
+
+def test_pattern_name_with_a_slash(client):
+    solve = {"title": "Contains Duplicate", "difficulty": "Easy", "quality": 4,
+             "url": "https://leetcode.com/problems/contains-duplicate/"}
+    assert client.post("/solve", json=solve).status_code == 200
+    _tag("Contains Duplicate", "Hash Map/Set")
+
+    for name in ("Hash Map/Set", "Hash Map%2FSet"):
+        problems = client.get(f"/patterns/{name}/problems")
+        assert problems.status_code == 200
+        assert problems.json()["pattern"] == "Hash Map/Set"
+        assert [p["title"] for p in problems.json()["problems"]] == ["Contains Duplicate"]
+
+        due = client.get(f"/patterns/{name}/due")
+        assert due.status_code == 200
+        assert due.json()["pattern"] == "Hash Map/Set"
+
+    assert client.get("/patterns/Sliding Window/problems").json()["total"] == 0
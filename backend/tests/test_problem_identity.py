@@ -0,0 +1,53 @@
+"""Duplicate merge: queued solves for a merged-away problem still apply."""
+from datetime import date
+
+from sqlalchemy import select
+
+from app.models import OutboxEvent, ReviewSession, UserProblemProgress
+from app.services.outbox import SOLVE_RECORDED, OutboxConsumer, enqueue
+from app.services.problem_identity import merge_duplicates
+from conftest import add_user, add_problem
+
+URL = "https://leetcode.com/problems/two-sum/"
+
+
+def _solve(problem_id, progress_id):
+    return {
+        "problem_id": str(problem_id), "progress_id": str(progress_id), "quality": 4,
+        "ef_before": 2.5, "ef_after": 2.5, "interval_before": 0, "interval_after": 1,
+        "solved_at": "2026-03-02T12:00:00", "solved_on": "2026-03-02",
+    }
+
+
+def test_pending_events_follow_the_merge(run_db):
+    async def scenario(db):
+        keeper = (await add_problem(db, title="Two Sum", slug="two-sum", url=URL)).id
+        duplicate = (await add_problem(db, title=" Two  Sum", url=URL)).id
+        # One user tracks only the duplicate (row moved), one tracks both (rows combined)
+        moved_user = (await add_user(db)).id
+        both_user = (await add_user(db)).id
+        moved = UserProblemProgress(user_id=moved_user, problem_id=duplicate)
+        combined = UserProblemProgress(user_id=both_user, problem_id=duplicate)
+        kept = UserProblemProgress(user_id=both_user, problem_id=keeper)
+        db.add_all([moved, combined, kept])
+        await db.commit()
+        moved_id, combined_id, kept_id = moved.id, combined.id, kept.id
+        enqueue(db, moved_user, SOLVE_RECORDED, _solve(duplicate, moved_id))
+        enqueue(db, both_user, SOLVE_RECORDED, _solve(duplicate, combined_id))
+        await db.commit()
+
+        stats = await merge_duplicates(db)
+        consumer = OutboxConsumer(batch_size=10)
+        applied = await consumer.drain()
+        db.expire_all()
+        sessions = (await db.execute(
+            select(ReviewSession.user_id, ReviewSession.problem_id, ReviewSession.progress_id)
+        )).all()
+        pending = (await db.execute(select(OutboxEvent).where(OutboxEvent.processed_at.is_(None)))).all()
+        expected = {(moved_user, keeper, moved_id), (both_user, keeper, kept_id)}
+        return stats, applied, consumer.failures, set(sessions), expected, pending
+
+    stats, applied, failures, sessions, expected, pending = run_db(scenario)
+    assert (stats["problems_removed"], stats["progress_combined"], stats["events_remapped"]) == (1, 1, 2)
+    assert (applied, failures, pending) == (2, 0, [])
+    assert sessions == expected
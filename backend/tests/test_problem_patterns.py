@@ -0,0 +1,49 @@
+"""problem_patterns backfill: fills analyzed problems once, then stays read-only."""
+from sqlalchemy import event, select
+
+from app.database import engine
+from app.models import ProblemPattern
+from app.services.problem_patterns import backfill
+from conftest import add_problem
+
+
+def _count_writes():
+    writes = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(None, 1)[0].upper() in ("INSERT", "UPDATE", "DELETE"):
+            writes.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return writes, lambda: event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_second_backfill_issues_no_writes(run_db):
+    async def scenario(db):
+        analyzed = await add_problem(db, title="Two Sum", patterns=["Hash Map"],
+                                     cached_analysis={"patterns": ["Hash Map"]})
+        # Older rows: the pattern list only in cached_analysis, objects with confidences
+        legacy = await add_problem(db, title="3Sum", cached_analysis={"patterns": [
+            {"name": "Two Pointers", "confidence": 0.9}, {"name": "Sorting", "confidence": 0.4},
+        ]})
+        await add_problem(db, title="Catalog Only")  # seeded, never analyzed: patterns == []
+        await add_problem(db, title="No Patterns", cached_analysis={"patterns": []})
+        ids = {analyzed.id: "Two Sum", legacy.id: "3Sum"}
+
+        writes, stop = _count_writes()
+        try:
+            first = await backfill(db, batch_size=2)
+            first_writes = len(writes)
+            writes.clear()
+            second = await backfill(db, batch_size=2)
+        finally:
+            stop()
+        rows = (await db.execute(select(ProblemPattern.problem_id, ProblemPattern.pattern_name))).all()
+        return first, first_writes, second, writes, sorted((ids[p], name) for p, name in rows)
+
+    first, first_writes, second, second_writes, rows = run_db(scenario)
+    assert first == {"problems": 2, "rows": 3}
+    assert first_writes == 4  # one DELETE + one INSERT per filled problem
+    assert second == {"problems": 0, "rows": 0}
+    assert second_writes == []
+    assert rows == [("3Sum", "Sorting"), ("3Sum", "Two Pointers"), ("Two Sum", "Hash Map")]
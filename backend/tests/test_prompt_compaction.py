@@ -0,0 +1,39 @@
+"""Description normalization keeps the statement intact (plain innerText and HTML)."""
+from app.services.prompt_compaction import normalize_description, compact_description
+
+CONSTRAINTS = """Return the number of pairs (i, j) where 0 <= i < j < n and nums[i] > 3 * nums[j].
+
+Constraints:
+1 <= nums.length <= 10^5
+-2^31 <= nums[i] <= 2^31 - 1
+a < b
+and b > c."""
+
+
+def test_comparisons_in_plain_text_survive():
+    assert normalize_description(CONSTRAINTS) == CONSTRAINTS
+
+
+def test_comparisons_survive_compaction():
+    compacted = compact_description(CONSTRAINTS)
+    assert "0 <= i < j < n and nums[i] > 3 * nums[j]" in compacted
+    assert "1 <= nums.length <= 10^5" in compacted
+
+
+def test_html_tags_are_stripped():
+    text = "<p>Given <code>nums</code>, return i &lt; j.</p><ul><li>x &gt; 0</li></ul>"
+    assert normalize_description(text) == "Given nums, return i < j.\n\nx > 0"
+
+
+def test_example_outputs_are_kept():
+    text = "Example 1:\nInput: nums = [1,2]\nOutput:\n2\n\nExample 2:\nInput: s = \"ab\"\nOutput:\nYes"
+    assert normalize_description(text) == text
+
+
+def test_page_chrome_is_dropped():
+    text = (
+        "Two Sum\nAccepted\n12.3M\nSubmissions\n24.1M\nAcceptance Rate\n51.2%\n"
+        "Seen this question in a real interview before?\nYes\nNo\nTopics\nCompanies\n"
+        "Given an array of integers."
+    )
+    assert normalize_description(text) == "Two Sum\nGiven an array of integers."
@@ -0,0 +1,70 @@
+"""Full-text search over a user's tracked problems (SQLite FTS5)."""
+from app.database import engine
+from app.models import UserProblemProgress
+from app.services.search import ensure_search_index, fts5_query, query_terms, search_problems, tsquery
+from conftest import add_user, add_problem
+
+
+def test_query_terms_and_syntax():
+    assert query_terms("Slid  WIN-dow?") == ["slid", "win", "dow"]
+    assert query_terms(None) == []
+    assert fts5_query(["slid", "win"]) == '"slid"* AND "win"*'
+    assert tsquery(["slid", "win"]) == "slid:* & win:*"
+
+
+def _search(run_db, queries, notes=None):
+    """Three tracked problems plus one untracked; returns {query: [titles]} (or full pages for tuples)."""
+    async def scenario(db):
+        await ensure_search_index(engine)
+        user_id = (await add_user(db)).id
+        other_id = (await add_user(db)).id
+        tracked = [
+            await add_problem(db, title="Sliding Window Maximum", description="Use a monotonic deque."),
+            await add_problem(db, title="Longest Substring Without Repeating Characters",
+                              description="Grow and shrink a window over the string.",
+                              cached_analysis={"key_insight": "Sliding window with a last-seen map"}),
+            await add_problem(db, title="Two Sum", description="Find two numbers adding up to target."),
+        ]
+        untracked = await add_problem(db, title="Sliding Puzzle", description="Breadth-first search.")
+        for problem in tracked:
+            db.add(UserProblemProgress(user_id=user_id, problem_id=problem.id,
+                                       personal_notes=(notes or {}).get(problem.title)))
+        db.add(UserProblemProgress(user_id=other_id, problem_id=untracked.id, personal_notes="sliding"))
+        await db.commit()
+
+        results = {}
+        for query in queries:
+            if isinstance(query, tuple):
+                results[query] = await search_problems(db, user_id, *query)
+            else:
+                page = await search_problems(db, user_id, query)
+                results[query] = [row["title"] for row in page["results"]]
+        return results
+
+    return run_db(scenario)
+
+
+def test_prefix_terms_must_all_match(run_db):
+    results = _search(run_db, ["slid", "slid win", "window deque", "sliding puzzle", "", "?!"])
+    # Title matches outrank the key insight match; the other user's problem never shows up
+    assert results["slid"] == ["Sliding Window Maximum", "Longest Substring Without Repeating Characters"]
+    assert results["slid win"] == results["slid"]
+    assert results["window deque"] == ["Sliding Window Maximum"]
+    assert results["sliding puzzle"] == []
+    assert results[""] == results["?!"] == []
+
+
+def test_notes_are_searched_per_user(run_db):
+    results = _search(run_db, ["hashmap", "complement"],
+                      notes={"Two Sum": "One pass with a hashmap of complements"})
+    assert results["hashmap"] == ["Two Sum"]
+    assert results["complement"] == ["Two Sum"]  # porter stemming: complements
+
+
+def test_pagination(run_db):
+    results = _search(run_db, [("slid", 1, 0), ("slid", 1, 1), ("slid", 2, 0)])
+    first, second, both = results[("slid", 1, 0)], results[("slid", 1, 1)], results[("slid", 2, 0)]
+    assert first["has_more"] and second["has_more"] is False and both["has_more"] is False
+    assert [row["title"] for row in first["results"] + second["results"]] == \
+        [row["title"] for row in both["results"]]
+    assert second["offset"] == 1 and second["limit"] == 1
@@ -0,0 +1,75 @@
+"""Rollups pick up backdated sessions (/import) through dirty months."""
+import uuid
+from datetime import datetime
+
+from sqlalchemy import select, func
+
+from app.models import ReviewSession, ReviewSessionRollup, ReviewSessionDirtyMonth
+from app.services import session_rollups
+from app.services.session_rollups import (
+    roll_up, mark_dirty_months, user_review_totals, month_start, add_months,
+)
+from conftest import add_user, add_problem
+
+
+def _session(user, problem, day, quality=4):
+    return ReviewSession(
+        id=uuid.uuid4(), user_id=user.id, problem_id=problem.id, quality_rating=quality,
+        solved_successfully=quality >= 3, ef_before=2.5, ef_after=2.6, interval_before=1, interval_after=6,
+        session_date=day, created_at=datetime.combine(day, datetime.min.time()),  # backdated, as /import does
+    )
+
+
+def test_backdated_import_is_rolled_up(run_db):
+    async def scenario(db):
+        user, problem = await add_user(db), await add_problem(db)
+        month = add_months(month_start(datetime.utcnow().date()), -3)
+        db.add_all([_session(user, problem, month), _session(user, problem, month.replace(day=2))])
+        await db.commit()
+        await roll_up(db, retention_months=0)
+
+        # An import after that run lands in the same, already rolled-up month
+        db.add(_session(user, problem, month.replace(day=3), quality=1))
+        await mark_dirty_months(db, [month.replace(day=3)])
+        await db.commit()
+        before = (await user_review_totals(db, user.id))["total_reviews"]
+
+        report = await roll_up(db, retention_months=0)
+        rollup = (await db.execute(select(ReviewSessionRollup))).scalar_one()
+        dirty = (await db.execute(select(func.count()).select_from(ReviewSessionDirtyMonth))).scalar()
+        after = (await user_review_totals(db, user.id))["total_reviews"]
+        return before, report, rollup, dirty, after, month
+
+    before, report, rollup, dirty, after, month = run_db(scenario)
+    assert before == 3  # counted from raw rows until the rollup is redone
+    assert report["months_rolled_up"] == [month.strftime("%Y-%m")]
+    assert (rollup.reviews, rollup.successful_reviews) == (3, 2)
+    assert dirty == 0
+    assert after == 3
+
+
+def test_import_past_retention_is_added_to_the_rollup(run_db, monkeypatch):
+    async def scenario(db):
+        user, problem = await add_user(db), await add_problem(db)
+        month = add_months(month_start(datetime.utcnow().date()), -6)
+        # Rolled up long ago; its raw rows were dropped by retention since
+        db.add(ReviewSessionRollup(user_id=user.id, month=month, reviews=5, successful_reviews=4,
+                                   problems_reviewed=1, average_quality=4.0, ef_drift=0.5))
+        db.add(_session(user, problem, month.replace(day=10), quality=2))
+        await mark_dirty_months(db, [month.replace(day=10)])
+        await db.commit()
+
+        report = await roll_up(db, retention_months=2)
+        await db.commit()
+        rollup = (await db.execute(select(ReviewSessionRollup))).scalar_one()
+        raw = (await db.execute(select(func.count()).select_from(ReviewSession))).scalar()
+        total = (await user_review_totals(db, user.id))["total_reviews"]
+        return report, rollup, raw, total, month
+
+    monkeypatch.setattr(session_rollups, "RETENTION_MONTHS", 2)
+    report, rollup, raw, total, month = run_db(scenario)
+    assert report["months_merged"] == [month.strftime("%Y-%m")]
+    assert (rollup.reviews, rollup.successful_reviews) == (6, 4)
+    assert rollup.average_quality == (4.0 * 5 + 2) / 6
+    assert raw == 0  # merged rows are deleted with the merge
+    assert total == 6
@@ -0,0 +1,81 @@
+"""Similarity index shared by several processes, and fed by the catalog seed."""
+import multiprocessing
+import uuid
+
+import numpy as np
+import pytest
+
+from app.services import similarity_index as module
+from app.services.catalog_seed import upsert_catalog_batch
+from app.services.similarity_index import INITIAL_CAPACITY, NUM_PERM, SimilarityIndex, rebuild, signature
+from conftest import add_problem
+
+SLIDING = "Given an array of integers nums and a window of size k sliding from the left, return the max of each window."
+PARENS = "Given a string containing just the characters ( ) { } [ ], determine if the input string is valid."
+
+
+def _signatures(count, seed):
+    rng = np.random.RandomState(seed)
+    return [(uuid.UUID(bytes=rng.bytes(16)), rng.randint(0, 2**32 - 1, size=NUM_PERM).astype(np.uint32))
+            for _ in range(count)]
+
+
+def test_other_processes_writes_are_picked_up(tmp_path):
+    reader, writer = SimilarityIndex(tmp_path).load(), SimilarityIndex(tmp_path).load()
+    first = uuid.uuid4()
+    writer.add(first, SLIDING)
+    assert reader.query(SLIDING, limit=1) == [(first, 1.0)]
+
+    # Growing replaces the matrix file; the reader remaps it
+    rows = _signatures(INITIAL_CAPACITY + 10, seed=1)
+    writer.add_many(rows)
+    assert len(reader.query(SLIDING, limit=3)) == 1
+    last_id, last_sig = rows[-1]
+    assert np.array_equal(reader.signature_for(last_id), last_sig)
+    assert len(reader) == len(writer) == INITIAL_CAPACITY + 11
+
+
+def _add_from_process(directory, seed):
+    index = SimilarityIndex(directory).load()
+    for start in range(0, 300, 20):
+        index.add_many(_signatures(300, seed)[start:start + 20])
+
+
+@pytest.mark.skipif(module.fcntl is None, reason="no advisory locks on this platform")
+def test_concurrent_writer_processes(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_add_from_process, args=(tmp_path, seed)) for seed in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    index = SimilarityIndex(tmp_path).load()
+    expected = dict(row for seed in range(4) for row in _signatures(300, seed))
+    assert len(index) == len(set(index.ids)) == len(expected) == 1200
+    assert all(np.array_equal(index.signature_for(problem_id), sig) for problem_id, sig in expected.items())
+
+
+def test_seeded_problems_are_indexed(run_db, tmp_path, monkeypatch):
+    index = SimilarityIndex(tmp_path).load()
+    monkeypatch.setattr("app.services.catalog_seed.similarity_index", index)
+
+    async def scenario(db):
+        row = {"slug": "sliding-window-maximum", "title": "Sliding Window Maximum", "leetcode_id": 239,
+               "difficulty": "Hard", "topics": [], "description": SLIDING,
+               "url": "https://leetcode.com/problems/sliding-window-maximum/"}
+        await upsert_catalog_batch(db, [row, {**row, "slug": "no-text", "title": "No Text", "leetcode_id": None,
+                                              "description": None}])
+        # Seeded by a process with another index directory: caught up at the next boot
+        missed = (await add_problem(db, title="Valid Parentheses", description=PARENS)).id
+        fresh = SimilarityIndex(tmp_path / "other").load()
+        caught_up = await rebuild(fresh, missing_only=True)
+        again = await rebuild(fresh, missing_only=True)
+        return missed, caught_up, again, fresh
+
+    missed, caught_up, again, fresh = run_db(scenario)
+    assert len(index) == 1 and index.query(SLIDING, limit=1)[0][1] == 1.0
+    assert (caught_up, again) == (2, 0)
+    assert fresh.query(PARENS, limit=1) == [(missed, 1.0)]
+    assert signature("") is None
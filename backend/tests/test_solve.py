@@ -0,0 +1,37 @@
+"""/solve responds with the streak the outbox consumer is about to record."""
+import asyncio
+import uuid
+from datetime import timedelta
+
+from app.database import AsyncSessionLocal, engine
+from app.models import User
+from app.services.streaks import local_date
+
+TWO_SUM = {"title": "Two Sum", "difficulty": "Easy", "quality": 4, "url": "https://leetcode.com/problems/two-sum/"}
+VALID_PARENTHESES = {"title": "Valid Parentheses", "difficulty": "Easy", "quality": 4,
+                     "url": "https://leetcode.com/problems/valid-parentheses/"}
+
+
+def _set_streak(user_id, streak, last_active):
+    async def go():
+        async with AsyncSessionLocal() as db:
+            user = await db.get(User, uuid.UUID(user_id))
+            user.streak_count, user.longest_streak, user.last_active_date = streak, streak, last_active
+            await db.commit()
+        await engine.dispose()
+    asyncio.run(go())
+
+
+def test_first_solve_of_a_day_counts(client):
+    first = client.post("/solve", json=TWO_SUM)
+    assert first.status_code == 200
+    assert first.json()["streak"] == 1
+
+    # Still pending in the outbox: a second solve the same day does not count twice
+    assert client.post("/solve", json=VALID_PARENTHESES).json()["streak"] == 1
+
+
+def test_solve_extends_yesterdays_streak(client):
+    client.get("/stats")  # creates the user
+    _set_streak(client.user_id, 3, local_date(None) - timedelta(days=1))
+    assert client.post("/solve", json=TWO_SUM).json()["streak"] == 4
@@ -0,0 +1,94 @@
+"""Streak arithmetic, local dates, and the gaps-and-islands recompute on SQLite."""
+from datetime import date, datetime, timedelta
+
+from app.models import DailyStats, User
+from app.services.streaks import advance, apply_active_days, current_streak, local_date, recompute
+from conftest import add_user
+
+MONDAY = date(2026, 3, 2)
+
+
+def test_advance_next_day_extends():
+    assert advance(3, 5, MONDAY, MONDAY + timedelta(days=1)) == (4, 5, MONDAY + timedelta(days=1))
+    assert advance(5, 5, MONDAY, MONDAY + timedelta(days=1)) == (6, 6, MONDAY + timedelta(days=1))
+
+
+def test_advance_gap_restarts():
+    assert advance(4, 4, MONDAY, MONDAY + timedelta(days=2)) == (1, 4, MONDAY + timedelta(days=2))
+    assert advance(0, 0, None, MONDAY) == (1, 1, MONDAY)
+
+
+def test_advance_same_day_and_out_of_order_are_ignored():
+    assert advance(2, 3, MONDAY, MONDAY) == (2, 3, MONDAY)
+    assert advance(2, 3, MONDAY, MONDAY - timedelta(days=1)) == (2, 3, MONDAY)
+
+
+def test_local_date_follows_the_users_timezone():
+    at = datetime(2026, 1, 1, 3, 30)  # naive UTC
+    assert local_date(None, at) == date(2026, 1, 1)
+    assert local_date("America/New_York", at) == date(2025, 12, 31)
+    assert local_date("Asia/Tokyo", datetime(2025, 12, 31, 16, 0)) == date(2026, 1, 1)
+    assert local_date("Not/AZone", at) == date(2026, 1, 1)  # unknown zones fall back to UTC
+
+
+def test_current_streak_lapses_after_a_missed_day():
+    today = local_date("Asia/Kolkata")
+    user = User(streak_count=4, timezone="Asia/Kolkata")
+    user.last_active_date = today - timedelta(days=1)
+    assert current_streak(user) == 4
+    user.last_active_date = today - timedelta(days=2)
+    assert current_streak(user) == 0
+    assert current_streak(User(streak_count=None, last_active_date=today)) == 0
+
+
+def test_apply_active_days_sorts_a_batch(run_db):
+    async def scenario(db):
+        user = await add_user(db, streak_count=2, longest_streak=2, last_active_date=MONDAY)
+        days = {MONDAY + timedelta(days=3), MONDAY + timedelta(days=1), MONDAY + timedelta(days=2), MONDAY}
+        await apply_active_days(db, user.id, days)
+        await db.commit()
+        await db.refresh(user)
+        return user.streak_count, user.longest_streak, user.last_active_date
+
+    assert run_db(scenario) == (5, 5, MONDAY + timedelta(days=3))
+
+
+def test_recompute_from_daily_stats(run_db):
+    def active(user_id, *offsets, solved=1):
+        return [DailyStats(user_id=user_id, date=MONDAY + timedelta(days=offset),
+                           problems_solved=solved, problems_reviewed=solved) for offset in offsets]
+
+    async def scenario(db):
+        # Islands of 3 (longest) then 2 (current)
+        two_runs = (await add_user(db)).id
+        # A zero-solve row does not bridge the gap between day 1 and day 3
+        bridged = (await add_user(db)).id
+        # Stale streak columns and no activity at all
+        idle = (await add_user(db, streak_count=7, longest_streak=9, last_active_date=MONDAY)).id
+        # Latest island is the longest; rows inserted out of date order
+        latest = (await add_user(db)).id
+        db.add_all(
+            active(two_runs, 0, 1, 2, 5, 6)
+            + active(bridged, 0, 1, 3) + active(bridged, 2, solved=0)
+            + active(latest, 9, 3, 8, 10, 7)
+        )
+        await db.commit()
+
+        first = await recompute(db, batch_size=2)
+        second = await recompute(db, batch_size=2)
+        db.expire_all()
+        streaks = {}
+        for name, user_id in (("two_runs", two_runs), ("bridged", bridged), ("idle", idle), ("latest", latest)):
+            user = await db.get(User, user_id)
+            streaks[name] = (user.streak_count, user.longest_streak, user.last_active_date)
+        return first, second, streaks
+
+    first, second, streaks = run_db(scenario)
+    assert first == {"users": 4, "changed": 4}
+    assert second == {"users": 4, "changed": 0}
+    assert streaks == {
+        "two_runs": (2, 3, MONDAY + timedelta(days=6)),
+        "bridged": (1, 2, MONDAY + timedelta(days=3)),
+        "idle": (0, 0, None),
+        "latest": (4, 4, MONDAY + timedelta(days=10)),
+    }
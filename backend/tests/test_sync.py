@@ -0,0 +1,41 @@
+"""/sync deltas include rows changed by bulk upserts (ON CONFLICT skips the ORM's onupdate)."""
+import time
+from datetime import datetime, timedelta
+
+from app.models import UserProblemProgress
+from app.services import sync
+from app.services.history_import import HistoryImporter
+from app.services.sync import changes_since, encode_cursor
+from conftest import add_user, add_problem
+
+
+def test_import_update_shows_up_in_the_next_delta(run_db, monkeypatch):
+    monkeypatch.setattr(sync, "OVERLAP_SECONDS", 0)
+
+    async def scenario(db):
+        user = await add_user(db)
+        problem = await add_problem(db, title="Two Sum", slug="two-sum")
+        two_days_ago = datetime.utcnow() - timedelta(days=2)
+        db.add(UserProblemProgress(user_id=user.id, problem_id=problem.id, status="learning",
+                                   last_reviewed_at=two_days_ago, updated_at=two_days_ago))
+        await db.commit()
+
+        cursor = (await changes_since(db, user.id, None))["cursor"]
+        assert (await changes_since(db, user.id, cursor))["progress"] == []
+        time.sleep(0.01)  # cursors are milliseconds
+
+        stats = await HistoryImporter(db, user.id).run([{"slug": "two-sum", "quality": 5}])
+        return stats, await changes_since(db, user.id, cursor), problem
+
+    stats, delta, problem = run_db(scenario)
+    assert stats.reviews_applied == 1
+    assert [row["problem_id"] for row in delta["progress"]] == [str(problem.id)]
+    assert delta["progress"][0]["times_solved"] == 1
+
+
+def test_cursor_round_trip():
+    at = datetime(2026, 1, 2, 3, 4, 5, 678000)
+    assert sync.decode_cursor(encode_cursor(at)) is None  # older than the tombstone window
+    now = datetime.utcnow().replace(microsecond=0)
+    assert sync.decode_cursor(encode_cursor(now)) == now
+    assert sync.decode_cursor("garbage") is None
@@ -4,6 +4,15 @@ function getText(selector) {
     return el ? el.innerText.trim() : null;
 }
 
+// Collapse non-breaking spaces and blank-line runs; the backend does the full compaction
+function normalizeText(text) {
+    return text
+        .replace(/\u00a0/g, ' ')
+        .replace(/[ \t]+\n/g, '\n')
+        .replace(/\n{3,}/g, '\n\n')
+        .trim();
+}
+
 // Helper to get meta content
 function getMeta(name) {
     const meta = document.querySelector(`meta[name="${name}"]`);
@@ -38,7 +47,7 @@ function scrapeProblemData() {
             document.querySelector('div.elfjS') ||
             document.querySelector('div.problem-statement'); // classic UI
 
-        const description = (descElement && descElement.innerText.trim()) ? descElement.innerText.trim() : 'Description not found. Please ensure you are on the Description tab.';
+        const description = (descElement && descElement.innerText.trim()) ? normalizeText(descElement.innerText) : 'Description not found. Please ensure you are on the Description tab.';
 
         const url = window.location.href;
 
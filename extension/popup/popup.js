@@ -80,7 +80,7 @@ async function checkAuth() {
     } catch (error) {
         console.log('Auth check failed:', error);
         // Token invalid - clear and show login
-        await chrome.storage.local.remove(['token', 'refreshToken', 'user']);
+        await chrome.storage.local.remove(['token', 'refreshToken', 'user', REPLICA_KEY]);
         navigateTo(PAGES.AUTH);
     } finally {
         isAuthChecking = false;
@@ -215,7 +215,7 @@ async function handleLogout() {
     }
 
     // Clear local storage
-    await chrome.storage.local.remove(['token', 'refreshToken', 'user']);
+    await chrome.storage.local.remove(['token', 'refreshToken', 'user', REPLICA_KEY]);
     currentUser = null;
 
     // Show auth page
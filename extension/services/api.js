@@ -95,15 +95,20 @@ async function refreshAccessToken() {
         return data.access_token;
     } catch (error) {
         // Refresh failed - clear tokens and force login
-        await chrome.storage.local.remove(['token', 'refreshToken', 'user']);
+        await chrome.storage.local.remove(['token', 'refreshToken', 'user', REPLICA_KEY]);
         throw error;
     }
 }
 
 /**
  * Generic fetch wrapper with authentication and error handling
+ * Writes pass { idempotent: true }: every retry then carries the same
+ * Idempotency-Key, so a retried request whose response was lost is not
+ * applied twice (the server replays the first response)
  */
 async function fetchWithAuth(endpoint, options = {}, maxRetries = 3) {
+    const { idempotent, ...fetchOptions } = options;
+    const idempotencyKey = idempotent ? crypto.randomUUID() : null;
     let { token } = await getTokens();
 
     // Check if token needs refresh
@@ -126,7 +131,7 @@ async function fetchWithAuth(endpoint, options = {}, maxRetries = 3) {
 
             const headers = {
                 'Content-Type': 'application/json',
-                ...options.headers
+                ...fetchOptions.headers
             };
 
             // Add Authorization header if token exists
@@ -134,14 +139,18 @@ async function fetchWithAuth(endpoint, options = {}, maxRetries = 3) {
                 headers['Authorization'] = `Bearer ${token}`;
             }
 
+            if (idempotencyKey) {
+                headers['Idempotency-Key'] = idempotencyKey;
+            }
+
             // Create abort controller for timeout
             const controller = new AbortController();
             const timeoutId = setTimeout(() => controller.abort(), 15000); // 15 second timeout
 
             const response = await fetch(url, {
+                ...fetchOptions,
                 headers,
-                signal: controller.signal,
-                ...options
+                signal: controller.signal
             });
 
             clearTimeout(timeoutId);
@@ -149,7 +158,7 @@ async function fetchWithAuth(endpoint, options = {}, maxRetries = 3) {
             // Handle 401 Unauthorized - token expired or invalid
             if (response.status === 401) {
                 // Clear tokens and redirect to login
-                await chrome.storage.local.remove(['token', 'refreshToken', 'user']);
+                await chrome.storage.local.remove(['token', 'refreshToken', 'user', REPLICA_KEY]);
                 throw new Error('Session expired. Please log in again.');
             }
 
@@ -192,6 +201,72 @@ async function fetchWithAuth(endpoint, options = {}, maxRetries = 3) {
     throw lastError;
 }
 
+/**
+ * Local replica kept in chrome.storage by GET /sync
+ * The server sends only rows changed since our cursor (plus tombstones for
+ * deleted ones), so steady-state popup opens transfer almost nothing.
+ */
+const REPLICA_KEY = 'syncReplica';
+
+function emptyReplica() {
+    return { cursor: null, problems: {}, progress: {}, dailyStats: {} };
+}
+
+/**
+ * Apply one /sync response to the replica (rows are upserts, so repeats are harmless)
+ */
+function applySync(replica, changes) {
+    if (changes.full) {
+        replica = emptyReplica();
+    }
+
+    changes.problems.forEach(problem => { replica.problems[problem.id] = problem; });
+    changes.progress.forEach(row => { replica.progress[row.id] = row; });
+    changes.daily_stats.forEach(day => { replica.dailyStats[day.date] = day; });
+
+    changes.deleted.problems.forEach(id => { delete replica.problems[id]; });
+    changes.deleted.progress.forEach(id => { delete replica.progress[id]; });
+    changes.deleted.daily_stats.forEach(date => { delete replica.dailyStats[date]; });
+
+    replica.cursor = changes.cursor;
+    return replica;
+}
+
+let syncInFlight = null;
+
+/**
+ * Bring the replica up to date; concurrent callers share one request
+ */
+function syncReplica() {
+    if (!syncInFlight) {
+        syncInFlight = (async () => {
+            const stored = (await chrome.storage.local.get(REPLICA_KEY))[REPLICA_KEY] || emptyReplica();
+            const query = stored.cursor ? `?since=${encodeURIComponent(stored.cursor)}` : '';
+            const changes = await fetchWithAuth(`/sync${query}`);
+            const replica = applySync(stored, changes);
+            await chrome.storage.local.set({ [REPLICA_KEY]: replica });
+            return replica;
+        })().finally(() => { syncInFlight = null; });
+    }
+    return syncInFlight;
+}
+
+/**
+ * Tracked problems joined with their progress, as (problem, progress) pairs
+ */
+function trackedProblems(replica) {
+    return Object.values(replica.progress)
+        .filter(progress => replica.problems[progress.problem_id])
+        .map(progress => [replica.problems[progress.problem_id], progress]);
+}
+
+/**
+ * Today's date as the backend computes it (UTC)
+ */
+function utcToday() {
+    return new Date().toISOString().slice(0, 10);
+}
+
 /**
  * API Endpoints
  */
@@ -289,6 +364,7 @@ const API = {
     async analyze(problemData) {
         return fetchWithAuth('/analyze', {
             method: 'POST',
+            idempotent: true,
             body: JSON.stringify({
                 title: problemData.title,
                 description: problemData.description,
@@ -304,11 +380,14 @@ const API = {
     async solve(solveData) {
         return fetchWithAuth('/solve', {
             method: 'POST',
+            idempotent: true,
             body: JSON.stringify({
                 title: solveData.title,
                 difficulty: solveData.difficulty,
                 quality: solveData.quality,
-                url: solveData.url
+                url: solveData.url,
+                // Streak days are counted in the user's own timezone
+                timezone: Intl.DateTimeFormat().resolvedOptions().timeZone
             })
         });
     },
@@ -321,17 +400,36 @@ const API = {
     },
 
     /**
-     * Get today's review problems
+     * Get today's review problems (from the synced replica, same shape as /today)
      */
     async getToday() {
-        return fetchWithAuth('/today');
+        const replica = await syncReplica();
+        const today = utcToday();
+        const problems = trackedProblems(replica)
+            .filter(([, progress]) => ['learning', 'reviewing'].includes(progress.status)
+                && progress.next_review && progress.next_review <= today)
+            .map(([problem, progress]) => ({
+                title: problem.title,
+                difficulty: problem.difficulty,
+                url: problem.url,
+                next_review: progress.next_review,
+                status: progress.status
+            }));
+        return { due_count: problems.length, problems };
     },
 
     /**
-     * Get activity heatmap data
+     * Get activity heatmap data (from the synced replica, same shape as /heatmap)
      */
     async getHeatmap() {
-        return fetchWithAuth('/heatmap');
+        const replica = await syncReplica();
+        const since = new Date(Date.now() - 365 * 24 * 60 * 60 * 1000).toISOString().slice(0, 10);
+        const data = {};
+        Object.values(replica.dailyStats)
+            .filter(day => day.date >= since)
+            .sort((a, b) => a.date.localeCompare(b.date))
+            .forEach(day => { data[day.date] = day.problems_solved; });
+        return data;
     },
 
     /**
@@ -342,10 +440,25 @@ const API = {
     },
 
     /**
-     * Get all tracked problems with progress
+     * Get all tracked problems with progress (from the synced replica, same shape as /problems)
      */
     async getProblems() {
-        return fetchWithAuth('/problems');
+        const replica = await syncReplica();
+        const problems = trackedProblems(replica)
+            .sort(([, a], [, b]) => (b.last_reviewed_at || '').localeCompare(a.last_reviewed_at || ''))
+            .map(([problem, progress]) => ({
+                id: problem.id,
+                title: problem.title,
+                difficulty: problem.difficulty,
+                url: problem.url,
+                status: progress.status,
+                next_review: progress.next_review,
+                patterns: problem.patterns,
+                times_solved: progress.times_solved,
+                easiness_factor: progress.easiness_factor,
+                last_reviewed: progress.last_reviewed_at ? progress.last_reviewed_at.slice(0, 10) : null
+            }));
+        return { problems, total: problems.length };
     },
 
     /**